@@ -0,0 +1,410 @@
+# banter.py
+
+"""
+Banter Generation
+Writes the banter DMs: one OpenAI request per event, one request for a whole
+batch of events, or pre-written fallback messages when OpenAI is off,
+unconfigured or unhealthy.
+- Kept apart from goal_scraper.py so the demo, fan-out and replay tools can
+  generate banter without loading the API-Football poller and its
+  dependencies.
+- The openai package is only imported when a request is actually made.
+- Every message is remembered with the template that wrote it and its
+  rivalry, so engagement.py can measure replies per template.
+"""
+
+import hashlib
+import json
+import os
+import random
+import threading
+from collections import OrderedDict
+
+from dotenv import load_dotenv
+
+from banter_cache import BanterCache, cache_key
+from circuit_breaker import CircuitBreaker
+
+load_dotenv()
+
+# OpenAI Configuration - Add your OpenAI API key to .env file
+OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")  # Will load from .env file
+USE_OPENAI = True  # Set to False to use only fallback messages
+OPENAI_MODEL = "gpt-3.5-turbo"
+OPENAI_MAX_TOKENS = 150
+OPENAI_TEMPERATURE = 0.8
+OPENAI_TIMEOUT = 15
+
+BATCH_MAX_ITEMS = 25    # Messages requested per batch completion
+BATCH_MAX_CHARS = 280   # Longer batch items are rejected and fall back
+
+BANTER_PROMPT = """Generate a fun, playful, and banterous social media message for football/soccer fans. 
+
+Context:
+- {scorer_name} just scored a {activity_singular} (now has {current_count} {activity} this season)
+- This message is being sent to fans of {supported_entity} (the rival team/player){context_line}{headline_line}
+- Keep it light-hearted, funny, and engaging - good-natured trolling
+- Use emojis and make it social media friendly
+- Include relevant hashtags
+- Maximum 280 characters to fit social media limits
+- Don't be mean-spirited, keep it playful and fun
+- The tone should be like friendly banter between football fans at a pub - cheeky but not nasty
+
+Generate ONLY the message text, no explanations or quotes around it."""
+
+BATCH_PROMPT = """Generate fun, playful, and banterous social media messages for football/soccer fans, one per item below.
+
+For every item:
+- The scorer just got a new goal/win and now has season_total this season
+- The message is sent to the audience; if a recipient is given, address them personally
+- If season_stats are given, work them in
+- If a headline is given (e.g. a brace, or several rivals winning at once), lead with it
+- Keep it light-hearted, funny, and engaging - good-natured trolling
+- Use emojis and make it social media friendly
+- Include relevant hashtags
+- Maximum {max_chars} characters per message
+- Don't be mean-spirited, keep it playful and fun
+- Make every message different from the others
+
+Items:
+{items}
+
+Respond with JSON only, in the form {{"messages": [{{"id": 0, "message": "..."}}]}}, with one entry per item."""
+
+# Part of every cache key, so editing a prompt stops serving banter written for the old one
+PROMPT_FINGERPRINT = hashlib.sha256((BANTER_PROMPT + BATCH_PROMPT).encode("utf-8")).hexdigest()[:16]
+
+# Generated messages, keyed by prompt inputs, prompt text and model parameters
+BANTER_CACHE = BanterCache()
+
+# While OpenAI is unhealthy, cached or fallback messages are used instead
+OPENAI_BREAKER = CircuitBreaker("openai", reset_timeout=300)
+
+# message text -> {"template", "rivalry"} for the recently written messages
+MESSAGE_ORIGINS = OrderedDict()
+MESSAGE_ORIGINS_MAX = 2000
+_origins_lock = threading.Lock()   # Fan-out and batch requests write from several threads
+
+
+def remember_origin(message, template, scorer_name, supported_entity):
+    """Records which template ("openai", "fallback-player-2", ...) wrote message. Returns message."""
+    if message:
+        with _origins_lock:
+            MESSAGE_ORIGINS[message] = {"template": template, "rivalry": f"{scorer_name} vs {supported_entity}"}
+            MESSAGE_ORIGINS.move_to_end(message)
+            while len(MESSAGE_ORIGINS) > MESSAGE_ORIGINS_MAX:
+                MESSAGE_ORIGINS.popitem(last=False)
+    return message
+
+
+def share_origin(message, original):
+    """Gives a message derived from original (e.g. with a greeting added) the same origin. Returns message."""
+    with _origins_lock:
+        origin = MESSAGE_ORIGINS.get(original)
+        if origin and message:
+            MESSAGE_ORIGINS[message] = origin
+            while len(MESSAGE_ORIGINS) > MESSAGE_ORIGINS_MAX:
+                MESSAGE_ORIGINS.popitem(last=False)
+    return message
+
+
+def message_origin(message):
+    """{"template", "rivalry"} of a message written here recently, or None."""
+    with _origins_lock:
+        return MESSAGE_ORIGINS.get(message)
+
+
+def _openai_class():
+    """
+    The OpenAI client class, or None if the package is not installed. Checked
+    before asking the breaker for a request, so a missing package never holds
+    the half-open probe.
+    """
+    try:
+        from openai import OpenAI
+    except ImportError:
+        print("  - OpenAI package not installed. Using fallback messages.")
+        return None
+    return OpenAI
+
+
+def banter_cache_key(scorer_name, supported_entity, current_count, entity_type, context=None, headline=None):
+    """Cache key for one prompt with the current model parameters."""
+    return cache_key(scorer_name, supported_entity, current_count, entity_type, context=context, headline=headline,
+                     prompt=PROMPT_FINGERPRINT, model=OPENAI_MODEL, max_tokens=OPENAI_MAX_TOKENS, temperature=OPENAI_TEMPERATURE)
+
+
+def generate_banter_message(scorer_name, supported_entity, current_count, entity_type, use_cache=True, context=None,
+                            headline=None):
+    """
+    Generate a dynamic banter message using OpenAI API.
+    Serves a cached variant once enough have been generated for the same prompt,
+    unless use_cache is False (e.g. when a fresh message is needed).
+    context is an optional phrase with season stats (e.g. "now 4 goals ahead of Lionel Messi").
+    headline is an optional burst to lead with (e.g. "Hat-trick", see coalescer.py).
+    Falls back to pre-written messages if API fails.
+    """
+    # Check if we should use OpenAI and if API key is configured
+    if not USE_OPENAI or not OPENAI_API_KEY:
+        print("  - Using fallback messages (OpenAI not configured)")
+        return generate_fallback_message(scorer_name, supported_entity, current_count, entity_type, context, headline)
+
+    key = banter_cache_key(scorer_name, supported_entity, current_count, entity_type, context, headline)
+    if use_cache and BANTER_CACHE.is_full(key):
+        print("  - Using cached OpenAI message")
+        return remember_origin(BANTER_CACHE.get(key), "openai", scorer_name, supported_entity)
+
+    OpenAI = _openai_class()
+    if OpenAI is None:
+        return generate_fallback_message(scorer_name, supported_entity, current_count, entity_type, context, headline)
+
+    # Don't pay for a request that is likely to fail while OpenAI is unhealthy
+    if not OPENAI_BREAKER.allow_request():
+        print("  - OpenAI circuit is open. Using cached or fallback message.")
+        return (remember_origin(BANTER_CACHE.get(key), "openai", scorer_name, supported_entity)
+                or generate_fallback_message(scorer_name, supported_entity, current_count, entity_type, context, headline))
+    
+    try:
+        # No client-side retries: the circuit breaker decides when to try again
+        client = OpenAI(api_key=OPENAI_API_KEY, timeout=OPENAI_TIMEOUT, max_retries=0)
+        
+        activity = "goals" if entity_type == "player" else "wins"
+        activity_singular = "goal" if entity_type == "player" else "win"
+        context_line = f"\n- Season stats to work in: {context}" if context else ""
+        headline_line = f"\n- Lead with this: {headline}" if headline else ""
+        
+        prompt = BANTER_PROMPT.format(scorer_name=scorer_name, activity_singular=activity_singular,
+                                      current_count=current_count, activity=activity,
+                                      supported_entity=supported_entity, context_line=context_line,
+                                      headline_line=headline_line)
+
+        response = client.chat.completions.create(
+            model=OPENAI_MODEL,
+            messages=[{"role": "user", "content": prompt}],
+            max_tokens=OPENAI_MAX_TOKENS,
+            temperature=OPENAI_TEMPERATURE
+        )
+        
+        OPENAI_BREAKER.record_success()
+        message_content = response.choices[0].message.content
+        if message_content:
+            message = message_content.strip()
+            print(f"  - Generated OpenAI message: {message[:50]}...")
+            BANTER_CACHE.add(key, message)
+            return remember_origin(message, "openai", scorer_name, supported_entity)
+        else:
+            print("  - OpenAI returned empty response. Using fallback message.")
+            return generate_fallback_message(scorer_name, supported_entity, current_count, entity_type, context, headline)
+        
+    except Exception as e:
+        OPENAI_BREAKER.record_failure()
+        print(f"  - OpenAI API failed: {e}. Using fallback message.")
+        return (remember_origin(BANTER_CACHE.get(key), "openai", scorer_name, supported_entity)
+                or generate_fallback_message(scorer_name, supported_entity, current_count, entity_type, context, headline))
+
+
+def generate_banter_batch(events, fallback=True):
+    """
+    Generate banter for many events in a single OpenAI request.
+    Each event is a dict with scorer_name, supported_entity, current_count,
+    entity_type and an optional recipient (Instagram username) to address.
+    Returns one message per event, in order. Items the model got wrong fall back
+    to pre-written messages, or are None when fallback is False.
+    """
+    messages = [None] * len(events)
+    if not events:
+        return messages
+
+    if USE_OPENAI and OPENAI_API_KEY:
+        # Impersonal events whose cache key is full are served from the cache
+        pending = []
+        for i, event in enumerate(events):
+            if not event.get("recipient"):
+                key = banter_cache_key(event["scorer_name"], event["supported_entity"], event["current_count"],
+                                       event["entity_type"], event.get("context"), event.get("headline"))
+                if BANTER_CACHE.is_full(key):
+                    messages[i] = remember_origin(BANTER_CACHE.get(key), "openai", event["scorer_name"],
+                                                  event["supported_entity"])
+                    continue
+            pending.append(i)
+
+        # Large batches are split into chunks that are requested concurrently
+        chunks = [pending[i:i + BATCH_MAX_ITEMS] for i in range(0, len(pending), BATCH_MAX_ITEMS)]
+        if chunks:
+            from concurrent.futures import ThreadPoolExecutor
+            with ThreadPoolExecutor(max_workers=len(chunks)) as pool:
+                for chunk, results in zip(chunks, pool.map(lambda c: _request_banter_batch([events[i] for i in c]), chunks)):
+                    for i, message in zip(chunk, results):
+                        messages[i] = message
+    else:
+        print("  - Using fallback messages (OpenAI not configured)")
+
+    invalid = sum(1 for m in messages if m is None)
+    if invalid:
+        print(f"  - {invalid} of {len(events)} batch items need a fallback message")
+    if fallback:
+        for i, event in enumerate(events):
+            if messages[i] is None:
+                messages[i] = generate_fallback_message(event["scorer_name"], event["supported_entity"],
+                                                        event["current_count"], event["entity_type"], event.get("context"),
+                                                        event.get("headline"))
+    return messages
+
+
+def _request_banter_batch(events):
+    """Sends one chat completion for a chunk of events. Returns a list with None for invalid items."""
+    results = [None] * len(events)
+    OpenAI = _openai_class()
+    if OpenAI is None:
+        return results
+    if not OPENAI_BREAKER.allow_request():
+        print("  - OpenAI circuit is open. Skipping batch request.")
+        return results
+
+    items = []
+    for i, event in enumerate(events):
+        player = event["entity_type"] == "player"
+        items.append({
+            "id": i,
+            "scorer": event["scorer_name"],
+            "event": "goal" if player else "win",
+            "season_total": event["current_count"],
+            "audience": f"fans of {event['supported_entity']} (the rival team/player)",
+            "recipient": f"@{event['recipient']}" if event.get("recipient") else None,
+            "season_stats": event.get("context"),
+            "headline": event.get("headline"),
+        })
+
+    prompt = BATCH_PROMPT.format(max_chars=BATCH_MAX_CHARS, items=json.dumps(items, ensure_ascii=False))
+
+    try:
+        client = OpenAI(api_key=OPENAI_API_KEY, timeout=OPENAI_TIMEOUT * 2, max_retries=0)
+        response = client.chat.completions.create(
+            model=OPENAI_MODEL,
+            messages=[{"role": "user", "content": prompt}],
+            max_tokens=min(4096, OPENAI_MAX_TOKENS * len(events)),
+            temperature=OPENAI_TEMPERATURE,
+            response_format={"type": "json_object"}
+        )
+        OPENAI_BREAKER.record_success()
+    except Exception as e:
+        OPENAI_BREAKER.record_failure()
+        print(f"  - OpenAI batch request failed: {e}")
+        return results
+    try:
+        data = json.loads(response.choices[0].message.content or "{}")
+    except ValueError as e:
+        print(f"  - OpenAI batch response was not valid JSON: {e}")
+        return results
+
+    # Validate each item on its own so one bad entry doesn't sink the batch
+    for item in data.get("messages", []) if isinstance(data, dict) else []:
+        if not isinstance(item, dict):
+            continue
+        i, message = item.get("id"), item.get("message")
+        if not isinstance(i, int) or not 0 <= i < len(events) or results[i] is not None:
+            continue
+        if not isinstance(message, str) or not message.strip() or len(message.strip()) > BATCH_MAX_CHARS:
+            continue
+        event = events[i]
+        results[i] = remember_origin(message.strip(), "openai", event["scorer_name"], event["supported_entity"])
+        if not event.get("recipient"):
+            BANTER_CACHE.add(banter_cache_key(event["scorer_name"], event["supported_entity"], event["current_count"],
+                                              event["entity_type"], event.get("context"), event.get("headline")), results[i])
+    print(f"  - Generated {sum(1 for r in results if r)} of {len(events)} OpenAI messages in one request")
+    return results
+
+
+def generate_fallback_message(scorer_name, supported_entity, current_count, entity_type, context=None, headline=None):
+    """
+    Enhanced fallback messages with more variety and randomness.
+    Season stats context, if given, is added as a stats line, and a headline
+    (e.g. "Hat-trick") goes on top.
+    """
+    if entity_type == "team":
+        # Team banter messages with more variety
+        banter_templates = [
+            "🔥 {scorer} just bagged WIN #{count}! 📈\n\nMeanwhile {rival} fans are probably {action} 😅\n\nTime to step up! 💪⚽\n\n{hashtags}",
+            
+            "🚨 BREAKING: {scorer} Alert! 🚨\n\n{scorer}: {count} wins ✅\n{rival} fans: {status} ⏰\n\n{encouragement} 😂🏆\n\n{hashtags}",
+            
+            "📊 STATS UPDATE 📊\n\n{scorer} wins: {count} 🔥\n{rival} fans' {emotion}: {trend} 📉\n\n{consolation} 💙❤️\n\n{hashtags}",
+            
+            "🎯 {scorer} just hit WIN #{count}! 🎉\n\n{rival} fans are probably {reaction} 📱💔\n\n{message} ⚽✨\n\n{hashtags}"
+        ]
+        
+        # Random elements for variety
+        actions = ["stress-eating", "refreshing the table", "checking if VAR exists", "googling 'how to support a winning team'"]
+        statuses = ["Still waiting...", "Still dreaming...", "Still hoping...", "Still believing..."]
+        encouragements = ["Don't worry, there's always next season!", "At least you tried!", "Better luck next time!", "The hope is admirable!"]
+        emotions = ["hopes", "dreams", "confidence", "expectations"]
+        trends = ["Declining", "Fading", "Vanishing", "Disappearing"]
+        consolations = ["But hey, at least you've got passion!", "At least the memes are good!", "The banter makes it worth it!", "You'll always have the memories!"]
+        reactions = ["googling 'how to delete Twitter'", "checking if this is a simulation", "wondering if they're still dreaming", "looking for the unsubscribe button"]
+        messages = ["Stay strong, rivals! Football is beautiful!", "The banter makes football amazing!", "Rivalry makes the game special!", "This is why we love football!"]
+        
+    else:
+        # Player banter messages
+        banter_templates = [
+            "🐐 {scorer} just scored GOAL #{count}! 🔥⚽\n\n{rival} fans are like '{reaction}' 😂\n\n{message} ☕⚽\n\n{hashtags}",
+            
+            "🚀 {scorer} STRIKES AGAIN! 🚀\n\n{scorer}: {count} goals 📈\n{rival} fans: {excuse} 🤷‍♂️\n\n{comment} 😄⚽\n\n{hashtags}",
+            
+            "📈 STONKS! 📈\n\n{scorer} goals: {count} ↗️\n{rival} confidence: {status} ↘️\n\n{suggestion} 🎮😂\n\n{hashtags}",
+            
+            "🎪 {scorer} goal #{count}! 🎯\n\n{rival} fans: {gymnastics} 🤸‍♂️\n\n{quote} 😂\n\nLove you really! ❤️⚽\n\n{hashtags}"
+        ]
+        
+        reactions = ["Wait, football is still happening?", "Is this real life?", "Did someone say football?", "Oh right, there's a game on!"]
+        excuses = ["Still making excuses", "Blaming the weather", "Questioning the referee", "Checking the offside rule"]
+        comments = ["Football is beautiful, isn't it?", "The beautiful game continues!", "This is why we love football!", "Poetry in motion!"]
+        statuses = ["Declining", "Fading", "Evaporating", "In freefall"]
+        suggestions = ["Don't worry, there's always FIFA!", "At least you have video games!", "YouTube highlights are free!", "There's always next season!"]
+        gymnastics = ["Performing mental gymnastics", "Doing backflips to explain this", "In full denial mode", "Rewriting the rulebook"]
+        quotes = ['"It was offside!" "The grass was too long!"', '"The ball was too round!"', '"It\'s all rigged!"', '"That doesn\'t count because..."']
+        
+        actions = reactions
+        encouragements = comments
+        consolations = suggestions
+        messages = comments
+    
+    # Select random template and elements
+    template_index = random.randrange(len(banter_templates))
+    template = banter_templates[template_index]
+    
+    # Common hashtags
+    hashtags_options = [
+        "#Football #Banter #Rivalry",
+        "#BanterFC #Football #Reality", 
+        "#FootballBanter #Rivalry #Love",
+        "#Goals #Football #BanterTime",
+        "#ManchesterDerby #Football #Banter" if "Manchester" in scorer_name or "Manchester" in supported_entity else "#Football #Banter #Rivalry"
+    ]
+    
+    # Fill in the template
+    message = template.format(
+        scorer=scorer_name,
+        rival=supported_entity,
+        count=current_count,
+        action=random.choice(actions) if 'action' in template else '',
+        status=random.choice(statuses) if 'status' in template else '',
+        encouragement=random.choice(encouragements) if 'encouragement' in template else '',
+        emotion=random.choice(emotions) if 'emotion' in template else '',
+        trend=random.choice(trends) if 'trend' in template else '',
+        consolation=random.choice(consolations) if 'consolation' in template else '',
+        reaction=random.choice(reactions) if 'reaction' in template else '',
+        message=random.choice(messages) if 'message' in template else '',
+        excuse=random.choice(excuses) if 'excuse' in template else '',
+        comment=random.choice(comments) if 'comment' in template else '',
+        suggestion=random.choice(suggestions) if 'suggestion' in template else '',
+        gymnastics=random.choice(gymnastics) if 'gymnastics' in template else '',
+        quote=random.choice(quotes) if 'quote' in template else '',
+        hashtags=random.choice(hashtags_options)
+    )
+
+    if context:
+        message += f"\n\n📊 {scorer_name}: {context}"
+    if headline:
+        message = f"💥 {headline.upper()}! 💥\n\n{message}"
+    
+    return remember_origin(message, f"fallback-{entity_type}-{template_index + 1}", scorer_name, supported_entity)
@@ -0,0 +1,109 @@
+# banter_cache.py
+
+"""
+Banter Cache
+Content-addressed cache of LLM-generated banter.
+- The key is a hash of the normalized prompt inputs (scorer, supported entity,
+  count, entity type, season stats context, burst headline), a fingerprint of
+  the prompt text and the model parameters, so any change to the prompt or the
+  model gives a new key.
+- Each key keeps a few message variants; once a key is full a cached variant
+  is served instead of calling the API again.
+- The least recently used keys are evicted beyond MAX_KEYS.
+- The cache is persisted to a JSON file so replays and restarts reuse it.
+"""
+
+import hashlib
+import json
+import os
+import random
+import threading
+
+import clock
+
+CACHE_FILE = os.getenv("BANTER_CACHE_FILE", "banter_cache.json")
+VARIANTS_PER_KEY = 3
+MAX_KEYS = 500
+
+
+def _normalize(value):
+    return " ".join(str(value).split()).casefold()
+
+
+def cache_key(scorer_name, supported_entity, current_count, entity_type, context=None, headline=None, **model_params):
+    """
+    Returns the content address for one prompt and set of model parameters.
+    Pass the prompt text's fingerprint as a model parameter (banter.py uses
+    prompt=PROMPT_FINGERPRINT), so editing the prompt changes every key.
+    """
+    material = {
+        "scorer": _normalize(scorer_name),
+        "supported": _normalize(supported_entity),
+        "count": int(current_count),
+        "type": _normalize(entity_type),
+        "context": _normalize(context) if context else None,
+        "model": {k: model_params[k] for k in sorted(model_params)},
+    }
+    if headline:
+        material["headline"] = _normalize(headline)  # Only when set, so existing keys stay valid
+    return hashlib.sha256(json.dumps(material, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+class BanterCache:
+    def __init__(self, path=CACHE_FILE, variants_per_key=VARIANTS_PER_KEY, max_keys=MAX_KEYS):
+        self.path = path
+        self.variants_per_key = variants_per_key
+        self.max_keys = max_keys
+        self.entries = {}   # key -> {"variants": [...], "last_used": timestamp}
+        self.lock = threading.Lock()
+        self._load()
+
+    def _load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r") as f:
+                self.entries = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"  - Warning: Could not read banter cache ({e}). Starting fresh.")
+            self.entries = {}
+
+    def _save(self):
+        if not self.path:
+            return
+        try:
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(self.entries, f)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            print(f"  - Warning: Could not save banter cache: {e}")
+
+    def is_full(self, key):
+        """True once a key has enough variants that the API need not be called."""
+        with self.lock:
+            entry = self.entries.get(key)
+            return entry is not None and len(entry["variants"]) >= self.variants_per_key
+
+    def get(self, key):
+        """Returns a random cached variant for key, or None."""
+        with self.lock:
+            entry = self.entries.get(key)
+            if not entry or not entry["variants"]:
+                return None
+            entry["last_used"] = clock.now()
+            return random.choice(entry["variants"])
+
+    def add(self, key, message):
+        """Stores a new variant for key and evicts the least recently used keys."""
+        with self.lock:
+            entry = self.entries.setdefault(key, {"variants": [], "last_used": 0})
+            if message not in entry["variants"]:
+                entry["variants"].append(message)
+                entry["variants"] = entry["variants"][-self.variants_per_key:]
+            entry["last_used"] = clock.now()
+            if len(self.entries) > self.max_keys:
+                by_age = sorted(self.entries, key=lambda k: self.entries[k]["last_used"])
+                for old_key in by_age[:len(self.entries) - self.max_keys]:
+                    del self.entries[old_key]
+            self._save()
@@ -0,0 +1,160 @@
+# card_renderer.py
+
+"""
+Image Cards
+Renders a goal/win event as a shareable image card to send next to the banter DM.
+- Everything that only depends on the rivalry (background, team colours,
+  "X vs Y" branding, footer) is drawn once into a base layer and cached.
+- Per event only the overlay (scorer name, count, activity) is drawn on a copy
+  of the base layer, so a card takes a few milliseconds.
+- Finished cards are kept in an LRU (in memory and on disk under CARD_DIR), so
+  a fan-out sends the same file to every subscriber without re-rendering.
+- Rivalries may set "colors": ["#6CABDD", "#DA291C"] in rivals.py/rivals.json;
+  otherwise colours are derived from the name.
+"""
+
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+from PIL import Image, ImageDraw, ImageFont
+
+CARD_DIR = os.getenv("CARD_DIR", "cards")
+CARD_SIZE = 720             # Square cards, as Instagram shows them
+CARD_QUALITY = 85           # JPEG quality; PNG would take several times longer to encode
+MAX_CARDS = 256             # Finished cards kept in the LRU
+
+FONT_CANDIDATES = [
+    "DejaVuSans-Bold.ttf",
+    "/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf",
+    "Arial Bold.ttf",
+    "arialbd.ttf",
+]
+
+
+def _color_from_name(name):
+    digest = hashlib.sha256(name.encode("utf-8")).digest()
+    return tuple(40 + b % 160 for b in digest[:3])
+
+
+def _parse_color(value):
+    value = value.lstrip("#")
+    return tuple(int(value[i:i + 2], 16) for i in (0, 2, 4))
+
+
+class CardRenderer:
+    def __init__(self, output_dir=CARD_DIR, size=CARD_SIZE, max_cards=MAX_CARDS):
+        self.output_dir = output_dir
+        self.size = size
+        self.max_cards = max_cards
+        self.bases = {}             # (entity_id, rival name, colours) -> base layer Image
+        self.cards = OrderedDict()  # card key -> file path, least recently used first
+        self.fonts = {}
+        self.lock = threading.Lock()
+        os.makedirs(output_dir, exist_ok=True)
+
+    def _font(self, size):
+        font = self.fonts.get(size)
+        if font is None:
+            for candidate in FONT_CANDIDATES:
+                try:
+                    font = ImageFont.truetype(candidate, size)
+                    break
+                except OSError:
+                    continue
+            else:
+                font = ImageFont.load_default(size=size)
+            self.fonts[size] = font
+        return font
+
+    def _fit_font(self, draw, text, max_size, max_width):
+        """Largest font (in steps of 4px) at which text fits max_width."""
+        size = max_size
+        while size > 16:
+            font = self._font(size)
+            if draw.textlength(text, font=font) <= max_width:
+                return font
+            size -= 4
+        return self._font(size)
+
+    def _colors(self, rivalry):
+        colors = rivalry.get("colors")
+        if colors and len(colors) >= 2:
+            return _parse_color(colors[0]), _parse_color(colors[1])
+        return _color_from_name(rivalry["name"]), _color_from_name(rivalry.get("rival_name") or "rival")
+
+    def _base_layer(self, rivalry):
+        """Returns the cached rivalry background, rendering it on first use."""
+        primary, secondary = self._colors(rivalry)
+        key = (rivalry["id"], rivalry.get("rival_name"), primary, secondary)
+        base = self.bases.get(key)
+        if base is not None:
+            return base
+
+        s = self.size
+        # Diagonal split in the two rivalry colours, darkened towards the bottom
+        base = Image.new("RGB", (s, s), primary)
+        draw = ImageDraw.Draw(base)
+        draw.polygon([(s, 0), (s, s), (0, s)], fill=secondary)
+        shade = Image.linear_gradient("L").resize((s, s)).point(lambda v: v * 3 // 5)
+        base = Image.composite(Image.new("RGB", (s, s), (0, 0, 0)), base, shade)
+        draw = ImageDraw.Draw(base)
+
+        # Centre panel for the overlay
+        margin = s // 12
+        draw.rounded_rectangle([margin, s // 4, s - margin, s * 3 // 4], radius=s // 24, fill=(15, 15, 20))
+
+        title = f"{rivalry['name']} vs {rivalry.get('rival_name') or '?'}".upper()
+        font = self._fit_font(draw, title, s // 16, s - 2 * margin)
+        draw.text((s // 2, s // 8), title, font=font, fill=(255, 255, 255), anchor="mm")
+        draw.text((s // 2, s - s // 12), "DMOTIVATOR", font=self._font(s // 30), fill=(230, 230, 230), anchor="mm")
+
+        self.bases[key] = base
+        return base
+
+    def _overlay(self, base, scorer_name, current_count, entity_type, supported_entity):
+        s = self.size
+        card = base.copy()
+        draw = ImageDraw.Draw(card)
+        margin = s // 12
+        activity = "GOALS" if entity_type == "player" else "WINS"
+        name_font = self._fit_font(draw, scorer_name.upper(), s // 14, s - 4 * margin)
+        draw.text((s // 2, s // 4 + s // 10), scorer_name.upper(), font=name_font, fill=(255, 255, 255), anchor="mm")
+        draw.text((s // 2, s // 2 + s // 40), str(current_count), font=self._font(s // 5), fill=(255, 215, 0), anchor="mm")
+        draw.text((s // 2, s * 3 // 4 - s // 14), f"{activity} THIS SEASON", font=self._font(s // 24),
+                  fill=(200, 200, 200), anchor="mm")
+        if supported_entity:
+            line = f"Your move, {supported_entity}."
+            font = self._fit_font(draw, line, s // 22, s - 2 * margin)
+            draw.text((s // 2, s * 3 // 4 + s // 14), line, font=font, fill=(255, 255, 255), anchor="mm")
+        return card
+
+    def render(self, rivalry, current_count, supported_entity=None):
+        """
+        Returns the path of the card for an event, rendering it if it is not cached.
+        rivalry is the rivalry dict from rivals.py.
+        """
+        scorer_name = rivalry["name"]
+        entity_type = rivalry["type"]
+        key = (rivalry["id"], scorer_name, entity_type, current_count, supported_entity, self._colors(rivalry))
+        with self.lock:
+            path = self.cards.get(key)
+            if path and os.path.exists(path):
+                self.cards.move_to_end(key)
+                return path
+
+            card = self._overlay(self._base_layer(rivalry), scorer_name, current_count, entity_type, supported_entity)
+            digest = hashlib.sha256(repr(key).encode("utf-8")).hexdigest()[:16]
+            path = os.path.join(self.output_dir, f"{rivalry['id']}-{entity_type}-{current_count}-{digest}.jpg")
+            card.save(path, "JPEG", quality=CARD_QUALITY)
+            path = os.path.abspath(path)   # The MCP server opens it from its own process
+
+            self.cards[key] = path
+            while len(self.cards) > self.max_cards:
+                _, old_path = self.cards.popitem(last=False)
+                try:
+                    os.remove(old_path)
+                except OSError:
+                    pass
+            return path
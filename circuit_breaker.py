@@ -0,0 +1,84 @@
+# circuit_breaker.py
+
+"""
+Circuit Breaker
+Stops calling an upstream dependency (API-Football, OpenAI) while it is failing,
+so one degraded service does not make every poll cycle wait on timeouts.
+- closed:    calls go through; the outcome of the last `window` calls is tracked.
+- open:      the failure rate went above `failure_rate`; calls are refused
+             until `reset_timeout` seconds have passed.
+- half_open: one probe call is let through; success closes the breaker,
+             failure opens it again.
+While a call is refused or fails, the last good value for the same key can be
+served instead (stale-while-revalidate).
+"""
+
+import threading
+from collections import deque
+
+import clock
+
+
+class CircuitOpenError(Exception):
+    """Raised when a call is refused because the breaker is open."""
+
+
+class CircuitBreaker:
+    def __init__(self, name, failure_rate=0.5, window=10, min_calls=3, reset_timeout=60):
+        self.name = name
+        self.failure_rate = failure_rate
+        self.min_calls = min_calls
+        self.reset_timeout = reset_timeout
+        self.outcomes = deque(maxlen=window)  # True for success, False for failure
+        self.state = "closed"
+        self.opened_at = 0.0
+        self.probe_in_flight = False
+        self.last_good = {}
+        self.lock = threading.Lock()
+
+    def allow_request(self):
+        """True if a call may be made now. In half-open state only one probe is allowed."""
+        with self.lock:
+            if self.state == "closed":
+                return True
+            if self.state == "open" and clock.now() - self.opened_at >= self.reset_timeout:
+                self.state = "half_open"
+                self.probe_in_flight = False
+                print(f"  - Circuit '{self.name}' half-open: probing upstream")
+            if self.state == "half_open" and not self.probe_in_flight:
+                self.probe_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        with self.lock:
+            self.outcomes.append(True)
+            if self.state != "closed":
+                print(f"  - Circuit '{self.name}' closed: upstream recovered")
+            self.state = "closed"
+            self.probe_in_flight = False
+
+    def record_failure(self):
+        with self.lock:
+            self.outcomes.append(False)
+            if self.state == "half_open":
+                self._open()
+                return
+            failures = self.outcomes.count(False)
+            if len(self.outcomes) >= self.min_calls and failures / len(self.outcomes) >= self.failure_rate:
+                self._open()
+
+    def _open(self):
+        self.state = "open"
+        self.opened_at = clock.now()
+        self.probe_in_flight = False
+        self.outcomes.clear()
+        print(f"  - Circuit '{self.name}' open: pausing calls for {self.reset_timeout}s")
+
+    def remember(self, key, value):
+        """Stores the last good value for key."""
+        self.last_good[key] = value
+
+    def stale(self, key):
+        """Returns the last good value for key, or None."""
+        return self.last_good.get(key)
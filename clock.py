@@ -0,0 +1,110 @@
+# clock.py
+
+"""
+Clock
+The one source of time for the scraper's schedules: poll cycles, the API
+quota, circuit breakers, rate limits, DM deadlines, the coalescing window and
+the duplicate-message history all read and wait through here.
+- RealClock (the default) is the wall clock.
+- SimulatedClock starts at any timestamp and jumps ahead instantly when asked
+  to sleep, so a whole season of polling and send scheduling runs in seconds:
+
+      import clock
+      clock.use(clock.SimulatedClock(start=datetime(2024, 8, 16).timestamp()))
+      import goal_scraper   # After use(), so the season start follows the clock too
+
+- Waiting on real I/O (MCP server responses, process shutdown) and measuring
+  latency stay on the real clock.
+"""
+
+import threading
+import time
+from datetime import date
+
+SIMULATED_WAIT_SLICE = 0.01   # Real seconds a simulated wait() blocks before re-checking the time
+
+
+class RealClock:
+    def time(self):
+        return time.time()
+
+    def sleep(self, seconds):
+        if seconds > 0:
+            time.sleep(seconds)
+
+    def wait(self, condition, timeout=None):
+        """condition.wait(timeout); the caller must hold the condition and re-check the time afterwards."""
+        return condition.wait(timeout)
+
+
+class SimulatedClock:
+    """
+    Virtual time. sleep() moves the time forward instead of blocking; threads
+    sleeping concurrently don't add up, the clock just moves to the latest
+    wake-up time asked for.
+    """
+    def __init__(self, start=None):
+        self.now = time.time() if start is None else float(start)
+        self.lock = threading.Lock()
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        if seconds > 0:
+            self.advance_to(self.now + seconds)
+
+    def advance_to(self, timestamp):
+        with self.lock:
+            self.now = max(self.now, timestamp)
+
+    def advance(self, seconds):
+        self.advance_to(self.now + seconds)
+
+    def wait(self, condition, timeout=None):
+        """
+        Blocks only briefly (in real time): other threads move the virtual
+        time, and the caller re-checks it after every wake-up.
+        """
+        if timeout is None:
+            return condition.wait(SIMULATED_WAIT_SLICE)
+        return condition.wait(min(SIMULATED_WAIT_SLICE, max(0.0, timeout)))
+
+
+_clock = RealClock()
+
+
+def use(new_clock):
+    """Switches every module to new_clock, e.g. a SimulatedClock in a test or benchmark."""
+    global _clock
+    _clock = new_clock
+
+
+def get():
+    return _clock
+
+
+def now():
+    """Current timestamp, like time.time()."""
+    return _clock.time()
+
+
+def today():
+    return date.fromtimestamp(_clock.time())
+
+
+def ctime():
+    return time.ctime(_clock.time())
+
+
+def sleep(seconds):
+    _clock.sleep(seconds)
+
+
+def sleep_until(timestamp):
+    _clock.sleep(timestamp - _clock.time())
+
+
+def wait(condition, timeout=None):
+    """Waits on a held threading.Condition for up to timeout seconds of clock time."""
+    return _clock.wait(condition, timeout)
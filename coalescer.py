@@ -0,0 +1,162 @@
+# coalescer.py
+
+"""
+Event Coalescing
+Holds goal/win events for each fan page for a short window and merges a burst
+into one richer DM, instead of generating and sending one DM per change.
+- Several goals by one player (pushed one by one within the window, or a jump
+  of several goals between two polls) become one event headlined "Brace" or
+  "Hat-trick".
+- Different entities notifying the same fan page within the window become one
+  "Double whammy" event that names all of them.
+- The window opens with a fan page's first event; when it closes the merged
+  events of every fan page that is due are flushed together, so they still
+  share one batch generation request.
+- Pushed events are held for PUSH_COALESCE_WINDOW at most, so a push still
+  reaches the fan page within seconds; a pushed event joining an open window
+  closes it early.
+- COALESCE_WINDOW=0 turns the window off: events are flushed as they come,
+  only a multi-goal jump between two polls still gets its headline.
+"""
+
+import os
+import threading
+
+import clock
+
+COALESCE_WINDOW = float(os.getenv("COALESCE_WINDOW", "10"))  # Seconds
+PUSH_COALESCE_WINDOW = 2   # Seconds; cap on how long a pushed event is held
+
+WHAMMIES = {2: "Double whammy", 3: "Triple whammy"}
+
+
+def burst_headline(event):
+    """Headline for several goals/wins of one entity, or None for a single one."""
+    gained = event.get("gained", 1)
+    if gained < 2:
+        return None
+    if event["entity_type"] == "player":
+        return {2: "Brace", 3: "Hat-trick"}.get(gained, f"{gained}-goal haul")
+    return f"{gained} wins on the bounce"
+
+
+def summary(event):
+    """Short description of what one entity did, e.g. "Lionel Messi scored a hat-trick"."""
+    gained = event.get("gained", 1)
+    if event["entity_type"] == "player":
+        what = {1: "scored", 2: "scored a brace", 3: "scored a hat-trick"}.get(gained, f"scored {gained}")
+    else:
+        what = "won" if gained == 1 else f"won {gained} in a row"
+    return f"{event['scorer_name']} {what}"
+
+
+def merge_entity(earlier, later):
+    """Merges two events of the same entity: the later count, all the new goals/wins."""
+    merged = dict(later)
+    merged["gained"] = earlier.get("gained", 1) + later.get("gained", 1)
+    merged["current_count"] = max(earlier["current_count"], later["current_count"])
+    merged["detected_at"] = min(earlier["detected_at"], later["detected_at"])
+    return merged
+
+
+def coalesce(events):
+    """
+    Merges one fan page's events (one per entity) into a single event.
+    The entity with the most new goals/wins (then the latest) leads the message;
+    the others are named in its headline, and their IDs listed under "members".
+    """
+    events = sorted(events, key=lambda e: (e.get("gained", 1), e["detected_at"]), reverse=True)
+    lead = dict(events[0])
+    lead["detected_at"] = min(e["detected_at"] for e in events)   # The news is as old as its first part
+    lead["members"] = [e["entity_id"] for e in events]
+    if len(events) > 1:
+        whammy = WHAMMIES.get(len(events), f"{len(events)}-fold whammy")
+        lead["headline"] = f"{whammy}: " + ", ".join(summary(e) for e in events[:-1]) + f" and {summary(events[-1])}"
+    else:
+        lead["headline"] = burst_headline(lead)
+    return lead
+
+
+class EventCoalescer:
+    """
+    Buffers events per recipient and calls flush(events) with one merged event
+    per recipient once that recipient's window has closed.
+    flush runs on the coalescer's own thread (or the caller's when the window is off).
+    """
+    def __init__(self, flush, window=COALESCE_WINDOW):
+        self.flush = flush
+        self.window = window
+        self.pending = {}   # recipient -> {"closes_at": timestamp, "events": {entity_id: event}}
+        self.condition = threading.Condition()
+        self.thread = None
+        self.stats = {"received": 0, "flushed": 0}
+
+    def add(self, events, window=None):
+        """
+        Adds newly detected events. Each needs a recipient, entity_id, detected_at and gained.
+        window shortens the hold for these events (and any open window they join).
+        """
+        if not events:
+            return
+        window = self.window if window is None else min(window, self.window)
+        if window <= 0:
+            with self.condition:
+                self.stats["received"] += len(events)
+                self.stats["flushed"] += len(events)
+            self.flush([coalesce([event]) for event in events])
+            return
+
+        with self.condition:
+            for event in events:
+                self.stats["received"] += 1
+                closes_at = clock.now() + window
+                bucket = self.pending.get(event["recipient"])
+                if bucket is None:
+                    bucket = self.pending[event["recipient"]] = {"closes_at": closes_at, "events": {}}
+                    print(f"  - Holding events for {event['recipient']} for {window:.0f}s to merge any burst")
+                bucket["closes_at"] = min(bucket["closes_at"], closes_at)
+                earlier = bucket["events"].get(event["entity_id"])
+                bucket["events"][event["entity_id"]] = event if earlier is None else merge_entity(earlier, event)
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, name="event-coalescer", daemon=True)
+                self.thread.start()
+            self.condition.notify()
+
+    def _due_buckets(self):
+        """Waits until at least one window has closed and removes the closed buckets. Holds the condition."""
+        while True:
+            now = clock.now()
+            due = [recipient for recipient, bucket in self.pending.items() if bucket["closes_at"] <= now]
+            if due:
+                return [self.pending.pop(recipient) for recipient in due]
+            next_close = min((bucket["closes_at"] for bucket in self.pending.values()), default=None)
+            clock.wait(self.condition, None if next_close is None else next_close - now)
+
+    def _run(self):
+        while True:
+            with self.condition:
+                buckets = self._due_buckets()
+            self._flush(buckets)
+
+    def _flush(self, buckets):
+        merged = []
+        for bucket in buckets:
+            event = coalesce(list(bucket["events"].values()))
+            parts = sum(e.get("gained", 1) for e in bucket["events"].values())
+            if parts > 1:
+                print(f"🧩 Merged {parts} goals/wins for {event['recipient']} into one DM: {event['headline']}")
+            merged.append(event)
+        with self.condition:
+            self.stats["flushed"] += len(merged)
+        try:
+            self.flush(merged)
+        except Exception as e:
+            print(f"  - Error sending coalesced events: {e}")
+
+    def flush_all(self):
+        """Flushes every open window right away; goal_scraper calls it when shutting down."""
+        with self.condition:
+            buckets = list(self.pending.values())
+            self.pending.clear()
+        if buckets:
+            self._flush(buckets)
@@ -8,14 +8,27 @@ This script simulates 4 different scenarios:
 4. Manchester City winning a match
 
 Each scenario will trigger a DM to the rival fan page.
+
+Stress mode (--stress) instead synthesizes events at a fixed rate and pushes
+them through generate_banter_message and the dm_sender path against a local
+fake Instagram backend, then reports throughput, latency and error rates:
+
+    python3 demo_simulator.py --stress --rate 5 --concurrency 4 --duration 60
 """
 
+import argparse
+import contextlib
+import queue
+import threading
 import time
 import sys
 import os
 from rivals import RIVALRIES, get_fan_to_notify, get_rival_name, get_supported_entity, is_player, is_team
-from goal_scraper import generate_banter_message
+import banter
+from banter import generate_banter_message
+import clock
 import dm_sender
+from server_stats import percentile
 
 def simulate_scenario(entity_id, entity_name, entity_type, scenario_description):
     """Simulate a single scenario (goal or win)"""
@@ -60,7 +73,7 @@ def simulate_scenario(entity_id, entity_name, entity_type, scenario_description)
         print(f"❌ Error sending DM: {e}")
     
     print(f"⏳ Waiting 10 seconds before next scenario...")
-    time.sleep(10)
+    clock.sleep(10)
 
 def run_demo():
     """Run all 4 demo scenarios"""
@@ -116,8 +129,138 @@ def run_demo():
     print("Check the target Instagram accounts for the DMs.")
     print(f"{'='*60}")
 
+def run_stress(rate, concurrency, duration, fake_latency=0.05, fake_error_rate=0.0, use_openai=False):
+    """
+    Load-generation mode: synthesizes events at `rate` per second for `duration`
+    seconds and sends them through `concurrency` MCP sessions backed by the fake
+    Instagram backend. Returns the report as a dictionary.
+    """
+    from message_history import MessageHistory
+
+    print("🏋️ Starting stress run")
+    print(f"   rate={rate}/s concurrency={concurrency} duration={duration}s "
+          f"fake_latency={fake_latency}s fake_error_rate={fake_error_rate}")
+
+    # Keep the run self-contained: no real OpenAI spend unless asked for,
+    # and no writes to the real duplicate-message history.
+    banter.USE_OPENAI = use_openai
+    dm_sender.MESSAGE_HISTORY = MessageHistory(path=None)
+
+    server_command = dm_sender.build_server_command() + [
+        "--fake-backend",
+        "--fake-latency", str(fake_latency),
+        "--fake-error-rate", str(fake_error_rate),
+    ]
+
+    # Start the sessions up front so server start-up is not counted as send latency
+    startup_started = time.perf_counter()
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        sessions = [dm_sender.DMSession(server_command) for _ in range(concurrency)]
+        ready = [s for s in sessions if s.open()]
+    startup_seconds = time.perf_counter() - startup_started
+    if not ready:
+        print("❌ Could not start any MCP session against the fake backend")
+        return None
+    print(f"✅ {len(ready)} MCP sessions ready in {startup_seconds:.2f}s")
+
+    work_queue = queue.Queue()
+    results = []   # (status, latency_seconds, generation_seconds)
+    results_lock = threading.Lock()
+    total_events = int(rate * duration)
+
+    def produce():
+        start = time.perf_counter()
+        for i in range(total_events):
+            scheduled = start + i / rate
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            work_queue.put((i, scheduled))
+        for _ in ready:
+            work_queue.put(None)
+
+    def consume(session):
+        while True:
+            item = work_queue.get()
+            if item is None:
+                break
+            i, scheduled = item
+            rivalry = RIVALRIES[i % len(RIVALRIES)]
+            try:
+                generation_started = time.perf_counter()
+                message = generate_banter_message(
+                    scorer_name=rivalry["name"],
+                    supported_entity=get_supported_entity(rivalry["id"]),
+                    current_count=i + 1,
+                    entity_type=rivalry["type"]
+                )
+                generation_seconds = time.perf_counter() - generation_started
+                result = session.send(f"stress_fan_{i}", message)
+                status = "ok" if result.get("success") else ("skipped" if result.get("skipped") else "error")
+            except Exception:
+                status, generation_seconds = "error", 0.0
+            with results_lock:
+                results.append((status, time.perf_counter() - scheduled, generation_seconds))
+
+    run_started = time.perf_counter()
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        threads = [threading.Thread(target=consume, args=(s,), daemon=True) for s in ready]
+        for thread in threads:
+            thread.start()
+        produce()
+        for thread in threads:
+            thread.join()
+        for session in ready:
+            session.close()
+    elapsed = time.perf_counter() - run_started
+
+    latencies = sorted(r[1] for r in results if r[0] == "ok")
+    generation = sorted(r[2] for r in results)
+    errors = sum(1 for r in results if r[0] == "error")
+    skipped = sum(1 for r in results if r[0] == "skipped")
+    report = {
+        "events": len(results),
+        "sent": len(latencies),
+        "errors": errors,
+        "skipped": skipped,
+        "error_rate": round(errors / len(results), 4) if results else 0.0,
+        "elapsed_seconds": round(elapsed, 2),
+        "sustained_events_per_second": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        "latency_p50_ms": round(percentile(latencies, 50) * 1000, 1),
+        "latency_p99_ms": round(percentile(latencies, 99) * 1000, 1),
+        "generation_p50_ms": round(percentile(generation, 50) * 1000, 1),
+        "session_startup_seconds": round(startup_seconds, 2),
+    }
+
+    print(f"\n{'='*60}")
+    print("📊 Stress run report")
+    print(f"{'='*60}")
+    for key, value in report.items():
+        print(f"   {key}: {value}")
+    if report["sustained_events_per_second"] < rate * 0.95:
+        print(f"⚠️  Sustained rate is below the offered {rate}/s: the send path is saturated.")
+    return report
+
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--stress", action="store_true", help="Run the non-interactive load-generation mode.")
+    parser.add_argument("--rate", type=float, default=5.0, help="Events per second to synthesize.")
+    parser.add_argument("--concurrency", type=int, default=4, help="Parallel MCP sessions.")
+    parser.add_argument("--duration", type=float, default=30.0, help="Seconds to generate events for.")
+    parser.add_argument("--fake-latency", type=float, default=0.05, help="Fake Instagram send latency in seconds.")
+    parser.add_argument("--fake-error-rate", type=float, default=0.0, help="Fake Instagram send failure rate (0-1).")
+    parser.add_argument("--openai", action="store_true", help="Use the real OpenAI API for messages in stress mode.")
+    parser.add_argument("--simulated-clock", action="store_true",
+                        help="Run the demo on a simulated clock, skipping the pauses between scenarios.")
+    args = parser.parse_args()
+    if args.simulated_clock:
+        clock.use(clock.SimulatedClock())
+
     try:
+        if args.stress:
+            report = run_stress(args.rate, args.concurrency, args.duration,
+                                args.fake_latency, args.fake_error_rate, args.openai)
+            sys.exit(0 if report else 1)
         run_demo()
     except KeyboardInterrupt:
         print("\n\n⏹️  Demo interrupted by user")
@@ -1,19 +1,50 @@
 # dm_sender.py
+import atexit
+import heapq
+import itertools
 import json
+import queue
 import subprocess
 import sys
+import threading
 import time
 import os
 from dotenv import load_dotenv
+import clock
+from message_history import MessageHistory
 
 # Load environment variables
 load_dotenv()
 
+# Fingerprints of recently sent messages, per recipient
+MESSAGE_HISTORY = MessageHistory()
+
+# Called as listener(recipient_username, message, payload) after every DM that was sent
+SEND_LISTENERS = []
+MAX_REGENERATE_ATTEMPTS = 2
+
+# Timeouts for talking to the MCP server, in seconds
+INIT_TIMEOUT = 120        # initialize waits for the Instagram login
+REQUEST_TIMEOUT = 60      # tools/call, e.g. send_message
+PING_TIMEOUT = 10
+PING_INTERVAL = 30        # Supervisor liveness check period
+WARM_STANDBY = os.getenv("MCP_WARM_STANDBY", "1") == "1"
+
+# Outbound priority lanes, most urgent first. When sends back up, a lane is only
+# served once the lanes before it are empty.
+OUTBOUND_LANES = ["derby", "normal"]
+# Seconds a queued message stays worth sending, per lane
+OUTBOUND_TTL = {"derby": 30 * 60, "normal": 30 * 60}
+QUEUE_AGE_SAMPLES = 500   # Recent queue waits kept per lane for the metrics
+OUTBOUND_MAX_REGENERATIONS = 1   # Times a stale DM is rewritten before it is dropped
+OUTBOUND_MAX_AGE = 2             # ...and never once it has waited this many TTLs
+
 class MCPClient:
     def __init__(self, server_command: list):
         self.server_command = server_command
         self.process = None
         self.message_id = 1
+        self.responses = queue.Queue()
 
     def start_server(self):
         try:
@@ -25,13 +56,40 @@ class MCPClient:
                 text=True,
                 bufsize=1
             )
+            self.responses = queue.Queue()
+            # Read both pipes on background threads: a full stderr pipe would
+            # block the server, and a blocking stdout read cannot time out.
+            threading.Thread(target=self._drain_stderr, args=(self.process,), daemon=True).start()
+            threading.Thread(target=self._read_stdout, args=(self.process, self.responses), daemon=True).start()
             print("✅ MCP server started")
             return True
         except Exception as e:
             print(f"❌ Failed to start MCP server: {e}")
             return False
 
-    def send_message(self, message: dict) -> dict:
+    @staticmethod
+    def _drain_stderr(process):
+        for line in process.stderr:
+            line = line.rstrip()
+            if line:
+                print(f"[mcp_server {process.pid}] {line}", file=sys.stderr)
+
+    @staticmethod
+    def _read_stdout(process, responses):
+        for line in process.stdout:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                responses.put(json.loads(line))
+            except ValueError:
+                print(f"[mcp_server {process.pid}] non-JSON output: {line}", file=sys.stderr)
+        responses.put(None)  # EOF: the server exited
+
+    def is_alive(self):
+        return self.process is not None and self.process.poll() is None
+
+    def send_message(self, message: dict, timeout: float = REQUEST_TIMEOUT) -> dict:
         if not self.process:
             return {"success": False, "message": "MCP server not running"}
         try:
@@ -39,17 +97,34 @@ class MCPClient:
             if self.process and self.process.stdin:
                 self.process.stdin.write(message_str)
                 self.process.stdin.flush()
-            if self.process and self.process.stdout:
-                response = self.process.stdout.readline()
-                if response:
-                    return {"success": True, "response": json.loads(response)}
-                else:
-                    return {"success": False, "message": "No response from server"}
             else:
-                return {"success": False, "message": "No stdout available"}
+                return {"success": False, "message": "No stdin available"}
+            # Wait for the response with our id, skipping notifications
+            deadline = time.time() + timeout
+            while True:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    return {"success": False, "timeout": True, "message": f"No response from server within {timeout}s"}
+                try:
+                    response = self.responses.get(timeout=remaining)
+                except queue.Empty:
+                    continue
+                if response is None:
+                    self.responses.put(None)  # Keep the EOF marker for later calls
+                    return {"success": False, "message": "No response from server"}
+                if response.get("id") == message.get("id"):
+                    return {"success": True, "response": response}
         except Exception as e:
             return {"success": False, "message": str(e)}
 
+    def ping(self, timeout: float = PING_TIMEOUT) -> bool:
+        """Sends an MCP ping. True if the server answered in time."""
+        if not self.is_alive():
+            return False
+        result = self.send_message({"jsonrpc": "2.0", "id": self.message_id, "method": "ping"}, timeout=timeout)
+        self.message_id += 1
+        return bool(result.get("success")) and "result" in result.get("response", {})
+
     def initialize_mcp(self):
         # Send initialize request
         init_request = {
@@ -62,7 +137,7 @@ class MCPClient:
                 "clientInfo": {"name": "mcpdmotivator", "version": "1.0.0"}
             }
         }
-        result = self.send_message(init_request)
+        result = self.send_message(init_request, timeout=INIT_TIMEOUT)
         if not result["success"]:
             print(f"❌ Initialize request failed: {result}")
             return False
@@ -119,65 +194,567 @@ class MCPClient:
     def stop_server(self):
         if self.process:
             self.process.terminate()
-            self.process.wait()
+            try:
+                self.process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+                self.process.wait()
             print("✅ MCP server stopped")
 
-def send_rival_dm(recipient_username, message):
+def dedupe_message(recipient_username, message, regenerate=None):
     """
-    Sends a DM via the MCP server using the MCP protocol.
+    Checks the message against what was recently sent to the recipient.
+    Returns a message that is safe to send, or None if it should be skipped.
+    regenerate is an optional callable that produces a fresh message.
     """
-    command = {
-        "tool": "send_message",
-        "args": {
-            "username": recipient_username,
-            "message": message
-        }
-    }
-    print("\n--- Preparing to send DM ---")
-    print(json.dumps(command, indent=2))
-    print("---------------------------\n")
+    attempts = 0
+    while MESSAGE_HISTORY.is_near_duplicate(recipient_username, message):
+        if regenerate is None or attempts >= MAX_REGENERATE_ATTEMPTS:
+            print(f"⏭️  Skipping near-duplicate message to {recipient_username}")
+            return None
+        attempts += 1
+        print(f"♻️  Near-duplicate message for {recipient_username}, regenerating ({attempts}/{MAX_REGENERATE_ATTEMPTS})...")
+        message = regenerate()
+    return message
+
+def build_server_command():
+    """Builds the command that launches the MCP server with the bot's credentials."""
     # Get credentials from environment variables for security
     instagram_username = os.getenv("INSTAGRAM_USERNAME", "your_instagram_username")
     instagram_password = os.getenv("INSTAGRAM_PASSWORD", "your_instagram_password")
-    
-    server_command = [
+
+    return [
         "python3",
         "mcp_server.py",
         "--username", instagram_username,
         "--password", instagram_password
     ]
-    client = MCPClient(server_command)
-    if not client.start_server():
-        print(f"❌ Failed to start MCP server")
-        return
+
+def add_send_listener(listener):
+    """
+    Registers listener(recipient_username, message, payload) to be called after
+    every sent DM, from the thread that sent it. payload is the send_message
+    tool result (direct_message_id, thread_id, user_id) or {}.
+    """
+    SEND_LISTENERS.append(listener)
+
+def _notify_sent(recipient_username, message, payload):
+    for listener in SEND_LISTENERS:
+        try:
+            listener(recipient_username, message, payload)
+        except Exception as e:
+            print(f"  - Warning: Send listener failed: {e}")
+
+def tool_payload(result):
+    """
+    Extracts the dictionary returned by an MCP tool from a call_tool result.
+    FastMCP wraps tool return values as JSON text content.
+    """
+    content = result.get("result", {}).get("content") if isinstance(result.get("result"), dict) else None
+    if not content:
+        return None
     try:
-        print(f"🚀 Attempting to send DM to {recipient_username} via MCP...")
-        time.sleep(2)
-        if not client.initialize_mcp():
+        return json.loads(content[0].get("text", ""))
+    except (ValueError, AttributeError, IndexError):
+        return None
+
+class DMSession:
+    """
+    Keeps one MCP server running and initialized so many DMs can be sent
+    without paying the process start, login and handshake for each one.
+    Not thread-safe: use one session per worker thread.
+    """
+    def __init__(self, server_command=None):
+        self.client = MCPClient(server_command or build_server_command())
+        self.ready = False
+
+    def open(self):
+        if not self.client.start_server():
+            print(f"❌ Failed to start MCP server")
+            return False
+        if not self.client.initialize_mcp():
             print(f"❌ Failed to initialize MCP connection")
-            return
+            self.client.stop_server()
+            return False
         print("✅ MCP connection initialized")
-        result = client.call_tool("send_message", {
-            "username": recipient_username,
-            "message": message
-        })
-        if result.get("success"):
-            print(f"✅ DM sent successfully to {recipient_username} via MCP")
-            if "result" in result:
-                print(f"MCP Response: {result['result']}")
-        else:
-            print(f"❌ Failed to send DM via MCP: {result.get('message', 'Unknown error')}")
-            print(f"📋 MCP Command that was attempted:")
+        self.ready = True
+        return True
+
+    def close(self):
+        if self.ready or self.client.process:
+            self.client.stop_server()
+        self.ready = False
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def send(self, recipient_username, message, regenerate=None):
+        """
+        Sends one DM over the open session.
+        Near-duplicates of recently sent messages are regenerated (when regenerate
+        is given) or skipped.
+        Returns a dictionary with success status and a status message.
+        """
+        message = dedupe_message(recipient_username, message, regenerate)
+        if message is None:
+            return {"success": False, "skipped": True, "message": "Near-duplicate message skipped."}
+        if not self.ready:
+            return {"success": False, "message": "MCP session not initialized"}
+
+        command = {
+            "tool": "send_message",
+            "args": {
+                "username": recipient_username,
+                "message": message
+            }
+        }
+        try:
+            print(f"🚀 Attempting to send DM to {recipient_username} via MCP...")
+            result = self.client.call_tool("send_message", command["args"])
+            payload = tool_payload(result)
+            if payload is not None and not payload.get("success"):
+                result = {"success": False, "message": payload.get("message", "Unknown error")}
+            if result.get("success"):
+                print(f"✅ DM sent successfully to {recipient_username} via MCP")
+                if "result" in result:
+                    print(f"MCP Response: {result['result']}")
+                MESSAGE_HISTORY.record(recipient_username, message)
+                _notify_sent(recipient_username, message, payload or {})
+            else:
+                print(f"❌ Failed to send DM via MCP: {result.get('message', 'Unknown error')}")
+                print(f"📋 MCP Command that was attempted:")
+                print(json.dumps(command, indent=2))
+            return result
+        except Exception as e:
+            print(f"❌ Error sending DM via MCP: {e}")
+            print(f"📋 MCP Command to execute:")
             print(json.dumps(command, indent=2))
-    except Exception as e:
-        print(f"❌ Error sending DM via MCP: {e}")
-        print(f"📋 MCP Command to execute:")
-        print(json.dumps(command, indent=2))
-    finally:
-        client.stop_server()
+            return {"success": False, "message": str(e)}
+
+    def call(self, tool_name, arguments):
+        """
+        Calls any MCP tool (e.g. list_messages) over the open session.
+        Returns the tool's result dictionary, or a failure dictionary.
+        """
+        if not self.ready:
+            return {"success": False, "message": "MCP session not initialized"}
+        try:
+            result = self.client.call_tool(tool_name, arguments)
+        except Exception as e:
+            return {"success": False, "message": str(e)}
+        payload = tool_payload(result)
+        return payload if payload is not None else result
+
+    def send_photo(self, recipient_username, image_path):
+        """
+        Sends an image (e.g. a goal card) over the open session.
+        Returns a dictionary with success status and a status message.
+        """
+        if not self.ready:
+            return {"success": False, "message": "MCP session not initialized"}
+        try:
+            print(f"🖼️  Sending card to {recipient_username} via MCP...")
+            result = self.client.call_tool("send_photo", {"username": recipient_username, "image_path": image_path})
+            payload = tool_payload(result)
+            if payload is not None and not payload.get("success"):
+                result = {"success": False, "message": payload.get("message", "Unknown error")}
+            if result.get("success"):
+                print(f"✅ Card sent successfully to {recipient_username} via MCP")
+            else:
+                print(f"❌ Failed to send card via MCP: {result.get('message', 'Unknown error')}")
+            return result
+        except Exception as e:
+            print(f"❌ Error sending card via MCP: {e}")
+            return {"success": False, "message": str(e)}
+
+class MCPSupervisor:
+    """
+    Keeps a healthy MCP server available for sends.
+    - Pings the active server every PING_INTERVAL seconds and replaces it when it
+      dies or stops answering.
+    - Keeps a second, already logged-in and initialized server on warm standby, so
+      a replacement does not put an Instagram login on the critical path.
+    - A call that times out fails over to the standby. Reads are retried once;
+      sends are not, since Instagram may already have delivered the DM.
+    - Replacing a server (possibly a login) happens outside the session lock;
+      calls made meanwhile wait for the new server, or fail right away with
+      wait=False.
+    """
+    def __init__(self, server_command=None, warm_standby=WARM_STANDBY):
+        self.server_command = server_command
+        self.warm_standby = warm_standby
+        self.active = None
+        self.standby = None
+        self.lock = threading.Lock()          # Guards the active session; held while it runs a call
+        self.failover_lock = threading.Lock() # One replacement at a time
+        self.standby_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._health_thread = None
+
+    def _new_session(self):
+        session = DMSession(self.server_command)
+        return session if session.open() else None
+
+    def _refill_standby(self):
+        if not self.warm_standby:
+            return
+        def build():
+            session = self._new_session()
+            with self.standby_lock:
+                if self.standby is None and not self._stop.is_set():
+                    self.standby = session
+                    session = None
+            if session:
+                session.close()
+        threading.Thread(target=build, name="mcp-standby", daemon=True).start()
+
+    def start(self):
+        with self.lock:
+            self.active = self._new_session()
+        self._refill_standby()
+        self._health_thread = threading.Thread(target=self._health_loop, name="mcp-health", daemon=True)
+        self._health_thread.start()
+        return self.active is not None
+
+    def _failover(self, broken):
+        """Replaces the session broken with the warm standby or a new server, unless another thread already did."""
+        with self.failover_lock:
+            with self.lock:
+                if self.active is not broken:
+                    return
+                self.active = None
+            with self.standby_lock:
+                standby, self.standby = self.standby, None
+            if standby and standby.client.is_alive():
+                print("🔁 Switching to warm-standby MCP server")
+                replacement = standby
+            else:
+                if standby:
+                    standby.close()
+                print("🔁 Restarting MCP server")
+                replacement = self._new_session()
+            with self.lock:
+                self.active = replacement
+            if broken:
+                broken.close()
+            self._refill_standby()
+
+    def _health_loop(self):
+        while not self._stop.wait(PING_INTERVAL):
+            with self.lock:
+                active = self.active
+                healthy = active is not None and active.client.ping()
+            if not healthy and not self._stop.is_set():
+                print("⚠️  MCP server is not responding")
+                self._failover(active)
+            with self.standby_lock:
+                standby = self.standby
+            if standby and not standby.client.is_alive():
+                with self.standby_lock:
+                    self.standby = None
+                standby.close()
+                self._refill_standby()
+
+    def _acquire(self, wait=True):
+        """
+        Returns a live session with self.lock held, failing over first if needed.
+        Returns None (lock not held) if there is no server, or if wait is False and
+        a replacement is under way.
+        """
+        if not wait and self.failover_lock.locked():
+            return None
+        self.lock.acquire()
+        if self.active is None or not self.active.client.is_alive():
+            broken = self.active
+            self.lock.release()
+            if not wait:
+                return None
+            self._failover(broken)
+            self.lock.acquire()
+        if self.active is None:
+            self.lock.release()
+            return None
+        return self.active
+
+    def _run(self, action, idempotent=False, wait=True):
+        """
+        Runs action(session) on a healthy session. A timed-out call fails over to
+        a new server and, if idempotent, is retried there once.
+        """
+        for attempt in range(2 if idempotent else 1):
+            session = self._acquire(wait)
+            if session is None:
+                return {"success": False, "message": "No MCP server available"}
+            try:
+                result = action(session)
+            finally:
+                self.lock.release()
+            broken = result.get("timeout") or not session.client.is_alive()
+            if broken:
+                self._failover(session)  # Don't leave the next call behind a wedged server
+            if not broken or result.get("success"):
+                return result
+        if not idempotent:
+            result = dict(result, message=f"{result.get('message', 'Unknown error')} "
+                                          "(not retried: Instagram may have delivered it)")
+        return result
+
+    def send(self, recipient_username, message, regenerate=None):
+        return self._run(lambda session: session.send(recipient_username, message, regenerate))
 
-def send_rival_dm_sync(recipient_username, message):
+    def send_photo(self, recipient_username, image_path):
+        return self._run(lambda session: session.send_photo(recipient_username, image_path))
+
+    def call(self, tool_name, arguments, wait=False):
+        """
+        Runs a read-only tool such as list_messages. It is retried after a timeout,
+        and by default fails right away while the server is being replaced.
+        """
+        return self._run(lambda session: session.call(tool_name, arguments), idempotent=True, wait=wait)
+
+    def stop(self):
+        self._stop.set()
+        with self.lock:
+            if self.active:
+                self.active.close()
+                self.active = None
+        with self.standby_lock:
+            if self.standby:
+                self.standby.close()
+                self.standby = None
+
+class OutboundMessage:
+    """One queued DM. wait() blocks until it was sent, dropped or failed and returns the result."""
+    def __init__(self, recipient_username, message, lane, ttl, regenerate, card_path, on_expiry):
+        self.recipient_username = recipient_username
+        self.message = message
+        self.lane = lane
+        self.regenerate = regenerate
+        self.card_path = card_path
+        self.on_expiry = on_expiry          # "drop" or "regenerate"
+        self.enqueued_at = clock.now()
+        self.deadline = self.enqueued_at + ttl
+        self.ttl = ttl
+        self.regenerations = 0
+        self.result = None
+        self.done = threading.Event()
+
+    def wait(self, timeout=None):
+        self.done.wait(timeout)
+        return self.result
+
+class OutboundQueue:
+    """
+    Sends queued DMs through the supervisor, most urgent lane first (FIFO within a lane).
+    A message still queued at its deadline is dropped, or regenerated once and
+    given a new deadline if it asked for that, so a backlog is spent on the
+    messages that still matter.
+    """
+    def __init__(self, send, send_photo):
+        self.send = send
+        self.send_photo = send_photo
+        self.heap = []
+        self.order = itertools.count()
+        self.cond = threading.Condition()
+        self.stats = {lane: {"sent": 0, "failed": 0, "dropped": 0, "regenerated": 0, "waits": []}
+                      for lane in OUTBOUND_LANES}
+        self._stop = False
+        self.busy = False   # A popped item is being sent
+        self._thread = threading.Thread(target=self._loop, name="dm-outbound", daemon=True)
+        self._thread.start()
+
+    def submit(self, recipient_username, message, lane="normal", ttl=None, regenerate=None,
+               card_path=None, on_expiry="drop"):
+        """Queues a DM (and an optional image card to follow it). Returns an OutboundMessage."""
+        if lane not in OUTBOUND_TTL:
+            lane = "normal"
+        item = OutboundMessage(recipient_username, message, lane, ttl or OUTBOUND_TTL[lane],
+                               regenerate, card_path, on_expiry)
+        with self.cond:
+            heapq.heappush(self.heap, (OUTBOUND_LANES.index(lane), next(self.order), item))
+            self.cond.notify_all()
+        return item
+
+    def _loop(self):
+        while True:
+            with self.cond:
+                while not self.heap and not self._stop:
+                    self.cond.wait()
+                if self._stop:
+                    return
+                _, _, item = heapq.heappop(self.heap)
+                self.busy = True
+            try:
+                self._process(item)
+            finally:
+                with self.cond:
+                    self.busy = False
+                    self.cond.notify_all()
+
+    def drain(self, timeout=None):
+        """Waits (in real time) until every queued DM was sent, dropped or failed. False if timeout ran out first."""
+        deadline = None if timeout is None else time.time() + timeout
+        with self.cond:
+            while self.heap or self.busy:
+                remaining = None if deadline is None else deadline - time.time()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self.cond.wait(remaining)
+        return True
+
+    def _count(self, lane, key, wait=None):
+        with self.cond:
+            stats = self.stats[lane]
+            stats[key] += 1
+            if wait is not None:
+                stats["waits"].append(wait)
+                del stats["waits"][:-QUEUE_AGE_SAMPLES]
+
+    def _drop(self, item, message, result):
+        print(message)
+        self._count(item.lane, "dropped")
+        item.result = result
+        item.done.set()
+
+    def _process(self, item):
+        now = clock.now()
+        if now > item.deadline:
+            # Rewritten at most OUTBOUND_MAX_REGENERATIONS times and within OUTBOUND_MAX_AGE TTLs,
+            # so a DM stuck behind a slow server is eventually dropped
+            max_age_deadline = item.enqueued_at + OUTBOUND_MAX_AGE * item.ttl
+            if (item.on_expiry == "regenerate" and item.regenerate
+                    and item.regenerations < OUTBOUND_MAX_REGENERATIONS and now < max_age_deadline):
+                print(f"♻️  DM to {item.recipient_username} waited {now - item.enqueued_at:.0f}s, regenerating")
+                self._count(item.lane, "regenerated")
+                item.regenerations += 1
+                item.message = dedupe_message(item.recipient_username, item.regenerate(), item.regenerate)
+                item.deadline = min(now + item.ttl, max_age_deadline)
+                if item.message is None:
+                    self._drop(item, f"⌛ Dropping regenerated DM to {item.recipient_username}: near-duplicate",
+                               {"success": False, "skipped": True, "message": "Near-duplicate message skipped."})
+                    return
+            else:
+                self._drop(item, f"⌛ Dropping stale DM to {item.recipient_username} ({now - item.enqueued_at:.0f}s in queue)",
+                           {"success": False, "skipped": True, "expired": True, "message": "Deadline passed."})
+                return
+
+        wait = now - item.enqueued_at
+        try:
+            result = self.send(item.recipient_username, item.message, item.regenerate)
+            if item.card_path and result.get("success"):
+                self.send_photo(item.recipient_username, item.card_path)
+        except Exception as e:
+            result = {"success": False, "message": str(e)}
+        self._count(item.lane, "sent" if result.get("success") else "failed", wait)
+        item.result = result
+        item.done.set()
+
+    def metrics(self):
+        """Per-lane counters and queue ages (seconds): current depth and oldest, plus p50/p95/max waits."""
+        now = clock.now()
+        with self.cond:
+            queued = [item for _, _, item in self.heap]
+            lane_stats = {lane: dict(stats, waits=list(stats["waits"])) for lane, stats in self.stats.items()}
+        metrics = {}
+        for lane in OUTBOUND_LANES:
+            stats = lane_stats[lane]
+            waits = sorted(stats["waits"])
+            lane_items = [item for item in queued if item.lane == lane]
+            metrics[lane] = {
+                "queued": len(lane_items),
+                "oldest_queued_age": round(max((now - i.enqueued_at for i in lane_items), default=0.0), 1),
+                "wait_p50": round(waits[len(waits) // 2], 2) if waits else 0.0,
+                "wait_p95": round(waits[min(len(waits) - 1, int(len(waits) * 0.95))], 2) if waits else 0.0,
+                "wait_max": round(waits[-1], 2) if waits else 0.0,
+                **{k: stats[k] for k in ("sent", "failed", "dropped", "regenerated")},
+            }
+        return metrics
+
+    def report(self):
+        """Prints a one-line queue summary per lane that has seen traffic."""
+        for lane, m in self.metrics().items():
+            if m["queued"] or m["sent"] or m["failed"] or m["dropped"]:
+                print(f"  - Outbound {lane}: {m['sent']} sent, {m['failed']} failed, {m['dropped']} dropped stale, "
+                      f"{m['queued']} queued (oldest {m['oldest_queued_age']}s); "
+                      f"wait p50 {m['wait_p50']}s, p95 {m['wait_p95']}s")
+
+    def stop(self):
+        with self.cond:
+            self._stop = True
+            self.cond.notify_all()
+
+_supervisor = None
+_supervisor_lock = threading.Lock()
+
+def get_supervisor():
+    """Returns the process-wide MCP supervisor, starting it on first use."""
+    global _supervisor
+    with _supervisor_lock:
+        if _supervisor is None:
+            _supervisor = MCPSupervisor()
+            _supervisor.start()
+            atexit.register(_supervisor.stop)
+        return _supervisor
+
+_outbound = None
+
+def get_outbound():
+    """Returns the process-wide outbound DM queue, starting it on first use."""
+    global _outbound
+    with _supervisor_lock:
+        if _outbound is None:
+            _outbound = OutboundQueue(lambda *args: get_supervisor().send(*args),
+                                      lambda *args: get_supervisor().send_photo(*args))
+        return _outbound
+
+def drain_outbound(timeout=None):
+    """Waits for the outbound queue to empty, if it was ever started. False if timeout ran out first."""
+    return _outbound.drain(timeout) if _outbound is not None else True
+
+def queue_rival_dm(recipient_username, message, regenerate=None, lane="normal", ttl=None,
+                   card_path=None, on_expiry="drop"):
+    """
+    Queues a DM in the given priority lane without waiting for it.
+    Returns an OutboundMessage (call .wait() for the result), or None if the
+    message was a near-duplicate and skipped.
+    """
+    message = dedupe_message(recipient_username, message, regenerate)
+    if message is None:
+        return None
+    print(f"📨 Queued DM to {recipient_username} ({lane} lane)")
+    return get_outbound().submit(recipient_username, message, lane, ttl, regenerate, card_path, on_expiry)
+
+def send_rival_dm(recipient_username, message, regenerate=None, lane="normal"):
+    """
+    Sends a DM via the MCP server using the MCP protocol.
+    The server is kept running by the supervisor between calls; the DM waits
+    its turn in the outbound queue.
+    Returns a dictionary with success status and a status message.
+    """
+    # Check for repeats before touching the server
+    message = dedupe_message(recipient_username, message, regenerate)
+    if message is None:
+        return {"success": False, "skipped": True, "message": "Near-duplicate message skipped."}
+
+    print("\n--- Preparing to send DM ---")
+    print(json.dumps({"tool": "send_message", "args": {"username": recipient_username, "message": message}}, indent=2))
+    print("---------------------------\n")
+
+    return get_outbound().submit(recipient_username, message, lane, regenerate=regenerate).wait()
+
+def send_rival_dm_sync(recipient_username, message, regenerate=None):
     """
     Synchronous wrapper for the send_rival_dm function.
     """
-    send_rival_dm(recipient_username, message)
\ No newline at end of file
+    return send_rival_dm(recipient_username, message, regenerate)
+
+def send_rival_photo_sync(recipient_username, image_path):
+    """
+    Sends an image DM (e.g. a goal card) via the supervised MCP server.
+    Returns a dictionary with success status and a status message.
+    """
+    return get_supervisor().send_photo(recipient_username, image_path)
@@ -0,0 +1,355 @@
+# engagement.py
+
+"""
+Fan Engagement Analytics
+Measures how fans answer the banter: reply rate, reply latency and reactions,
+per rivalry and per message template ("openai", "fallback-player-2", ...).
+- Every sent DM is recorded through a dm_sender send listener, with the
+  template and rivalry banter.py remembered for its text.
+- Each poll reads only the messages that are new since the last one, per
+  thread (list_messages with since_message_id), and only for threads that
+  still have a DM waiting for its reply. The work is proportional to the new
+  messages, not to the conversation history.
+- A reply is the fan's first message after one of our DMs, within
+  REPLY_WINDOW. Reactions are the fan's reactions already on our DMs when they
+  are read back and reaction-like replies (likes, GIFs, emoji-only texts).
+  Reactions added later, once a thread is no longer read, are not seen: that
+  would mean re-reading old messages.
+- The aggregates are streaming counters (sent, replied, reactions, latency sum
+  and a latency histogram) kept in a small JSON file (ENGAGEMENT_FILE) with the
+  per-thread cursors:
+
+      python3 engagement.py           # report from the stored aggregates
+      python3 engagement.py --poll    # read new replies once, then report
+"""
+
+import argparse
+import json
+import os
+import threading
+from datetime import datetime, timezone
+
+import clock
+from banter import message_origin
+
+ENGAGEMENT_FILE = os.getenv("ENGAGEMENT_FILE", "engagement.json")
+ENGAGEMENT_POLL_SECONDS = float(os.getenv("ENGAGEMENT_POLL_SECONDS", "600"))  # 0 = don't poll
+REPLY_WINDOW = 48 * 60 * 60   # A fan message later than this after our DM is not a reply to it
+READ_AMOUNT = 50              # Messages per list_messages call
+MAX_PAGES = 4                 # list_messages calls per thread and poll; older new messages are skipped
+
+# Reply latency histogram: upper bound in seconds and label of each bucket
+LATENCY_BUCKETS = [(60, "<1m"), (5 * 60, "<5m"), (15 * 60, "<15m"), (60 * 60, "<1h"),
+                   (6 * 60 * 60, "<6h"), (24 * 60 * 60, "<24h"), (REPLY_WINDOW, "<48h")]
+
+# Layout of one aggregate row: [sent, replied, reactions, latency sum, histogram...]
+SENT, REPLIED, REACTIONS, LATENCY_SUM, HISTOGRAM = range(5)
+ROW_SIZE = HISTOGRAM + len(LATENCY_BUCKETS)
+
+REACTION_ITEM_TYPES = {"like", "animated_media", "reaction"}
+UNKNOWN = {"rivalry": "unknown", "template": "unknown"}
+
+
+def _timestamp(value):
+    """Message timestamp (ISO string or epoch seconds/microseconds) as epoch seconds, or None."""
+    if value is None:
+        return None
+    if isinstance(value, (int, float)):
+        return value / 1e6 if value > 1e12 else float(value)
+    try:
+        parsed = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+
+def _bucket(latency):
+    for i, (bound, _) in enumerate(LATENCY_BUCKETS):
+        if latency < bound:
+            return i
+    return len(LATENCY_BUCKETS) - 1
+
+
+def _is_reaction(message):
+    """Likes, GIFs and emoji-only texts."""
+    if message.get("item_type") in REACTION_ITEM_TYPES:
+        return True
+    text = (message.get("text") or "").strip()
+    return bool(text) and not any(ch.isalnum() for ch in text)
+
+
+def _reactions_on(message, fan_id):
+    """Reactions of the fan (of anyone, if fan_id is unknown) already on a message."""
+    reactions = message.get("reactions") or {}
+    if not isinstance(reactions, dict):
+        return 0
+    items = list(reactions.get("emojis") or []) + list(reactions.get("likes") or [])
+    return sum(1 for r in items if not fan_id or str(r.get("sender_id", fan_id)) == fan_id)
+
+
+def summarize(row):
+    """Readable figures of one aggregate row (or of several, summed)."""
+    sent, replied = row[SENT], row[REPLIED]
+    histogram = row[HISTOGRAM:]
+    median = None
+    seen = 0
+    for (_, label), count in zip(LATENCY_BUCKETS, histogram):
+        seen += count
+        if replied and seen * 2 >= replied:
+            median = label
+            break
+    return {
+        "sent": sent,
+        "replied": replied,
+        "reply_rate": round(replied / sent, 3) if sent else 0.0,
+        "mean_latency_seconds": round(row[LATENCY_SUM] / replied, 1) if replied else None,
+        "median_latency": median,
+        "reactions": row[REACTIONS],
+        "latency_histogram": {label: count for (_, label), count in zip(LATENCY_BUCKETS, histogram)},
+    }
+
+
+def _add_rows(rows):
+    total = [0] * ROW_SIZE
+    for row in rows:
+        for i, value in enumerate(row):
+            total[i] += value
+    return total
+
+
+class EngagementTracker:
+    """
+    Records sent DMs and folds the fans' new messages into the aggregates.
+    record_sent may be called from any thread (outbound queue, fan-out workers).
+    """
+    def __init__(self, path=ENGAGEMENT_FILE, poll_interval=ENGAGEMENT_POLL_SECONDS):
+        self.path = path
+        self.poll_interval = poll_interval
+        self.state = self._empty()
+        self.lock = threading.Lock()
+        self.dirty = False
+        self.last_poll = None
+        self._load()
+
+    @staticmethod
+    def _empty():
+        return {
+            "threads": {},   # thread_id -> {"recipient", "fan", "cursor", "start", "open"}
+            "sent": {},      # direct_message_id -> [thread_id, rivalry, template, sent_at], until read back
+            "stats": {},     # rivalry -> template -> aggregate row
+        }
+
+    def _load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r") as f:
+                self.state.update(json.load(f))
+        except (OSError, ValueError) as e:
+            print(f"  - Warning: Could not read engagement stats ({e}). Starting fresh.")
+            self.state = self._empty()
+
+    def save(self):
+        """Writes the state if it changed since the last save."""
+        with self.lock:
+            if not self.dirty or not self.path:
+                return
+            data = json.dumps(self.state, separators=(",", ":"))
+            self.dirty = False
+        try:
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "w") as f:
+                f.write(data)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            print(f"  - Warning: Could not save engagement stats: {e}")
+
+    def _row(self, rivalry, template):
+        templates = self.state["stats"].setdefault(rivalry, {})
+        row = templates.get(template)
+        if row is None:
+            row = templates[template] = [0] * ROW_SIZE
+        return row
+
+    def record_sent(self, recipient_username, message, payload):
+        """Send listener (see dm_sender.add_send_listener): counts the DM and waits for its reply."""
+        origin = message_origin(message) or UNKNOWN
+        message_id, thread_id = payload.get("direct_message_id"), payload.get("thread_id")
+        with self.lock:
+            self._row(origin["rivalry"], origin["template"])[SENT] += 1
+            self.dirty = True
+            if not message_id or not thread_id:
+                return   # Counted, but there is no thread to read the reply from
+            thread = self.state["threads"].setdefault(str(thread_id), {
+                "recipient": recipient_username, "fan": None, "cursor": None, "open": None,
+            })
+            if payload.get("user_id"):
+                thread["fan"] = str(payload["user_id"])
+            if thread["cursor"] is None:
+                thread.setdefault("start", str(message_id))   # The first read starts at our first DM
+            self.state["sent"][str(message_id)] = [str(thread_id), origin["rivalry"], origin["template"], clock.now()]
+
+    def _expire(self):
+        """Stops waiting for replies to DMs older than REPLY_WINDOW."""
+        cutoff = clock.now() - REPLY_WINDOW
+        sent = self.state["sent"]
+        for message_id in [m for m, entry in sent.items() if entry[3] < cutoff]:
+            del sent[message_id]
+        for thread in self.state["threads"].values():
+            if thread["open"] and thread["open"][4] < cutoff:
+                thread["open"] = None
+
+    def _read_new(self, call, thread_id, cursor, start):
+        """
+        The thread's messages after cursor (or from our first DM, start, on the
+        first read), oldest first, and the new cursor. (None, None) if reading failed.
+        """
+        arguments = {"thread_id": thread_id, "amount": READ_AMOUNT}
+        if cursor:
+            arguments["since_message_id"] = cursor
+        result = call("list_messages", arguments)
+        if not result.get("success"):
+            print(f"  - Could not read thread {thread_id}: {result.get('message', 'Unknown error')}")
+            return None, None
+        messages = list(result.get("messages") or [])
+        newest = result.get("newest_message_id") or (str(messages[0].get("id")) if messages else cursor)
+        if not cursor:
+            ids = [str(m.get("id")) for m in messages]
+            if start in ids:
+                messages = messages[:ids.index(start) + 1]
+
+        # More new messages than one page: page back until the cursor
+        older = result.get("older_cursor") if result.get("gap") else None
+        pages = 1
+        while older and pages < MAX_PAGES:
+            page = call("list_messages", {"thread_id": thread_id, "amount": READ_AMOUNT, "cursor": older})
+            if not page.get("success"):
+                break
+            pages += 1
+            older = page.get("older_cursor")
+            for m in page.get("messages") or []:
+                if str(m.get("id")) == cursor:
+                    older = None
+                    break
+                messages.append(m)
+        if older:
+            print(f"  - Thread {thread_id}: more than {pages * READ_AMOUNT} new messages, skipped the oldest")
+        return list(reversed(messages)), newest
+
+    def _process(self, thread, messages, newest):
+        """Folds a thread's new messages (oldest first) into the aggregates. Returns the new replies. Holds the lock."""
+        replies = 0
+        fan = thread["fan"]
+        for m in messages:
+            at = _timestamp(m.get("timestamp"))
+            mine = self.state["sent"].pop(str(m.get("id")), None)
+            if mine:
+                # One of our DMs: later fan messages answer this one
+                _, rivalry, template, sent_at = mine
+                thread["open"] = [rivalry, template, at or sent_at, False, clock.now()]
+                self._row(rivalry, template)[REACTIONS] += _reactions_on(m, fan)
+                continue
+            if thread["open"] is None or (fan and str(m.get("user_id")) != fan):
+                continue
+            rivalry, template, sent_at, replied, _ = thread["open"]
+            latency = max(0.0, (at or clock.now()) - sent_at)
+            if latency > REPLY_WINDOW:
+                thread["open"] = None
+                continue
+            row = self._row(rivalry, template)
+            if _is_reaction(m):
+                row[REACTIONS] += 1
+            if not replied:
+                thread["open"][3] = True
+                row[REPLIED] += 1
+                row[LATENCY_SUM] += round(latency)
+                row[HISTOGRAM + _bucket(latency)] += 1
+                replies += 1
+        if newest:
+            thread["cursor"] = str(newest)
+            thread.pop("start", None)
+        return replies
+
+    def poll(self, call):
+        """
+        Reads the new messages of every thread with a DM still waiting for its reply.
+        call(tool_name, arguments) runs an MCP tool, e.g. MCPSupervisor.call.
+        Returns a summary dictionary.
+        """
+        with self.lock:
+            self._expire()
+            waiting = {entry[0] for entry in self.state["sent"].values()}
+            active = [(thread_id, thread["cursor"], thread.get("start"))
+                      for thread_id, thread in self.state["threads"].items()
+                      if (thread["open"] and not thread["open"][3]) or thread_id in waiting]
+        self.last_poll = clock.now()
+
+        summary = {"threads": len(active), "messages": 0, "replies": 0, "failed": 0}
+        for thread_id, cursor, start in active:
+            messages, newest = self._read_new(call, thread_id, cursor, start)
+            if messages is None:
+                summary["failed"] += 1
+                continue
+            with self.lock:
+                summary["messages"] += len(messages)
+                summary["replies"] += self._process(self.state["threads"][thread_id], messages, newest)
+                self.dirty = True
+        if active:
+            print(f"💬 Engagement: {summary['messages']} new messages in {summary['threads']} threads, "
+                  f"{summary['replies']} new replies")
+        self.save()
+        return summary
+
+    def maybe_poll(self, call):
+        """Polls when ENGAGEMENT_POLL_SECONDS have passed since the last poll; saves new sends either way."""
+        if self.poll_interval > 0 and (self.last_poll is None or clock.now() - self.last_poll >= self.poll_interval):
+            return self.poll(call)
+        self.save()
+        return None
+
+    def summary(self):
+        """Aggregates per rivalry and per template: {"rivalries": {name: figures}, "templates": {...}}."""
+        with self.lock:
+            stats = {rivalry: {template: list(row) for template, row in templates.items()}
+                     for rivalry, templates in self.state["stats"].items()}
+        by_template = {}
+        for templates in stats.values():
+            for template, row in templates.items():
+                by_template.setdefault(template, []).append(row)
+        return {
+            "rivalries": {rivalry: summarize(_add_rows(templates.values())) for rivalry, templates in stats.items()},
+            "templates": {template: summarize(_add_rows(rows)) for template, rows in by_template.items()},
+        }
+
+    def report(self, top=10):
+        """Prints the reply figures of the most messaged rivalries and templates."""
+        summary = self.summary()
+        if not summary["rivalries"]:
+            return
+        print(f"📊 Fan engagement (replies within {REPLY_WINDOW // 3600}h of a DM):")
+        for kind, prefix in (("rivalries", ""), ("templates", "template ")):
+            ranked = sorted(summary[kind].items(), key=lambda item: item[1]["sent"], reverse=True)[:top]
+            for name, figures in ranked:
+                latency = f", median reply {figures['median_latency']}" if figures["median_latency"] else ""
+                print(f"  - {prefix}{name}: {figures['sent']} sent, {figures['reply_rate']:.0%} replied{latency}, "
+                      f"{figures['reactions']} reactions")
+
+
+if __name__ == "__main__":
+    import dm_sender
+
+    parser = argparse.ArgumentParser(description="Fan engagement with the banter DMs.")
+    parser.add_argument("--poll", action="store_true", help="Read the new replies once before reporting.")
+    parser.add_argument("--json", action="store_true", help="Print the aggregates as JSON.")
+    args = parser.parse_args()
+
+    tracker = EngagementTracker()
+    if args.poll:
+        with dm_sender.DMSession() as session:
+            tracker.poll(session.call)
+    if args.json:
+        print(json.dumps(tracker.summary(), indent=2))
+    else:
+        tracker.report()
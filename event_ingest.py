@@ -0,0 +1,225 @@
+# event_ingest.py
+
+"""
+Push Event Ingestion
+A small local HTTP endpoint (TCP or Unix socket) through which an external
+source, such as a data provider webhook or another internal service, can push
+goal/win events instead of waiting for goal_scraper's next API-Football poll.
+- Requests must carry `Authorization: Bearer <INGEST_TOKEN>`.
+- Events are JSON objects, e.g.
+      {"event_id": "fx-1234-goal-2", "entity_id": "154", "count": 13}
+  where count is the new season total (see goal_scraper.ingest_event).
+- Repeated event_ids are answered as duplicates without doing anything.
+- Accepted events are queued and processed on a worker thread, so the caller
+  gets its answer right away.
+"""
+
+import hmac
+import json
+import os
+import queue
+import socket
+import socketserver
+import stat
+import threading
+import time
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+INGEST_HOST = os.getenv("INGEST_HOST", "127.0.0.1")
+INGEST_PORT = int(os.getenv("INGEST_PORT", "0"))       # 0 disables the TCP endpoint
+INGEST_SOCKET = os.getenv("INGEST_SOCKET")              # Unix socket path, used instead of TCP
+INGEST_TOKEN = os.getenv("INGEST_TOKEN")
+
+MAX_BODY_BYTES = 64 * 1024
+SEEN_EVENT_IDS = 10000      # Remembered for de-duplication
+
+
+class SeenEvents:
+    """Bounded memory of recently seen event IDs."""
+    def __init__(self, capacity=SEEN_EVENT_IDS):
+        self.capacity = capacity
+        self.ids = OrderedDict()
+        self.lock = threading.Lock()
+
+    def add(self, event_id):
+        """Remembers an event ID. Returns False if it was already seen."""
+        with self.lock:
+            if event_id in self.ids:
+                return False
+            self.ids[event_id] = time.time()
+            while len(self.ids) > self.capacity:
+                self.ids.popitem(last=False)
+            return True
+
+    def discard(self, event_id):
+        with self.lock:
+            self.ids.pop(event_id, None)
+
+
+def _is_socket(path):
+    return stat.S_ISSOCK(os.lstat(path).st_mode)
+
+
+class UnixHTTPServer(ThreadingHTTPServer):
+    address_family = socket.AF_UNIX
+
+    def server_bind(self):
+        # Replace a socket left by an earlier run, but never any other file at a mistyped path
+        if os.path.lexists(self.server_address):
+            if not _is_socket(self.server_address):
+                raise FileExistsError(f"{self.server_address} exists and is not a socket")
+            os.remove(self.server_address)
+        socketserver.TCPServer.server_bind(self)   # HTTPServer's expects a (host, port) address
+        os.chmod(self.server_address, 0o600)   # Only this user may push events
+        self.server_name = "localhost"
+        self.server_port = 0
+
+    def get_request(self):
+        request, _ = super().get_request()
+        return request, ("unix", 0)
+
+
+class EventIngestServer:
+    """
+    Receives pushed events and hands them to goal_scraper.
+    accept(payload) validates an event synchronously and returns a result dict
+    ({"success", "message", optional "status", optional "event"}); any "event"
+    it returns is passed to process(event) on the worker thread.
+    """
+    def __init__(self, accept, process, token=INGEST_TOKEN, host=INGEST_HOST, port=INGEST_PORT,
+                 socket_path=INGEST_SOCKET):
+        self.accept = accept
+        self.process = process
+        self.token = token
+        self.host = host
+        self.port = port
+        self.socket_path = socket_path
+        self.seen = SeenEvents()
+        self.events = queue.Queue()   # Unbounded: accept() has already recorded the new count
+        self.httpd = None
+        self.stats = {"accepted": 0, "duplicates": 0, "rejected": 0, "processed": 0}
+        self.stats_lock = threading.Lock()   # Updated from the handler threads and the worker
+
+    def _count(self, key):
+        with self.stats_lock:
+            self.stats[key] += 1
+
+    def stats_snapshot(self):
+        with self.stats_lock:
+            return dict(self.stats)
+
+    def enabled(self):
+        return bool(self.port or self.socket_path)
+
+    def start(self):
+        """Starts the endpoint and the worker thread. Returns True on success."""
+        if not self.enabled():
+            return False
+        if not self.token:
+            print("❌ Event ingestion not started: set INGEST_TOKEN to authenticate pushed events.")
+            return False
+        handler = self._make_handler()
+        try:
+            if self.socket_path:
+                self.httpd = UnixHTTPServer(self.socket_path, handler)
+                where = self.socket_path
+            else:
+                self.httpd = ThreadingHTTPServer((self.host, self.port), handler)
+                where = f"http://{self.host}:{self.httpd.server_port}/events"
+        except OSError as e:
+            print(f"❌ Event ingestion could not listen: {e}")
+            return False
+        self.httpd.daemon_threads = True
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+        threading.Thread(target=self._work, daemon=True).start()
+        print(f"📥 Event ingestion listening on {where}")
+        return True
+
+    def stop(self):
+        if self.httpd:
+            self.httpd.shutdown()
+            self.httpd.server_close()
+            self.httpd = None
+        if self.socket_path and os.path.lexists(self.socket_path) and _is_socket(self.socket_path):
+            os.remove(self.socket_path)
+
+    def _work(self):
+        while True:
+            event = self.events.get()
+            try:
+                self.process(event)
+                self._count("processed")
+            except Exception as e:
+                print(f"  - Error processing pushed event {event.get('event_id')}: {e}")
+
+    def authorized(self, header):
+        expected = f"Bearer {self.token}"
+        return bool(header) and hmac.compare_digest(header.encode("utf-8"), expected.encode("utf-8"))
+
+    def handle(self, payload):
+        """Dedupes, validates and queues one event. Returns (http_status, result)."""
+        event_id = payload.get("event_id")
+        if event_id is not None:
+            event_id = str(event_id)
+            if not self.seen.add(event_id):
+                self._count("duplicates")
+                return 200, {"success": True, "duplicate": True, "message": f"Event {event_id} already received"}
+
+        result = self.accept(payload)
+        if not result.get("success"):
+            if event_id is not None:
+                self.seen.discard(event_id)  # A fixed retry of a rejected event is welcome
+            self._count("rejected")
+            return result.pop("status", 400), result
+        status = result.pop("status", 200)
+
+        event = result.pop("event", None)
+        if event is None:
+            # Valid but nothing new, e.g. a count we already know about
+            self._count("duplicates")
+            return status, result
+        self.events.put(event)
+        self._count("accepted")
+        return 202, result
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def _reply(self, status, body):
+                data = json.dumps(body).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                if self.path != "/health":
+                    return self._reply(404, {"success": False, "message": "Not found"})
+                self._reply(200, {"success": True, "queued": server.events.qsize(), **server.stats_snapshot()})
+
+            def do_POST(self):
+                if self.path != "/events":
+                    return self._reply(404, {"success": False, "message": "Not found"})
+                if not server.authorized(self.headers.get("Authorization")):
+                    return self._reply(401, {"success": False, "message": "Unauthorized"})
+                try:
+                    length = int(self.headers.get("Content-Length") or 0)
+                except ValueError:
+                    length = 0
+                if length <= 0 or length > MAX_BODY_BYTES:
+                    return self._reply(400, {"success": False, "message": "Missing or oversized body"})
+                try:
+                    payload = json.loads(self.rfile.read(length))
+                except ValueError:
+                    return self._reply(400, {"success": False, "message": "Body is not valid JSON"})
+                if not isinstance(payload, dict):
+                    return self._reply(400, {"success": False, "message": "Event must be a JSON object"})
+                self._reply(*server.handle(payload))
+
+            def log_message(self, format, *args):
+                pass  # Events are logged by goal_scraper instead
+
+        return Handler
@@ -0,0 +1,140 @@
+# fake_instagram.py
+
+"""
+Fake Instagram Backend
+A stand-in for instagrapi's Client, used by `mcp_server.py --fake-backend`
+so the full DM path (dm_sender -> MCP server -> "Instagram") can be load
+tested without an account and without sending anything.
+- Sends take a configurable latency and fail at a configurable rate.
+- Sent messages are kept in memory, so the read tools have something to return.
+"""
+
+import random
+import threading
+import time
+import zlib
+from datetime import datetime, timezone
+
+
+class FakeDirectMessage:
+    def __init__(self, message_id, thread_id, user_id, text):
+        self.id = str(message_id)
+        self.thread_id = str(thread_id)
+        self.user_id = str(user_id)
+        self.text = text
+        self.timestamp = datetime.now(timezone.utc)
+        self.item_type = "text"
+
+    def dict(self):
+        return {
+            "id": self.id,
+            "thread_id": self.thread_id,
+            "user_id": self.user_id,
+            "text": self.text,
+            "timestamp": self.timestamp.isoformat(),
+            "item_type": self.item_type,
+        }
+
+
+class FakeDirectThread:
+    def __init__(self, thread_id, user_id, username):
+        self.id = str(thread_id)
+        self.pk = str(thread_id)
+        self.users = [{"pk": str(user_id), "username": username, "full_name": username}]
+        self.thread_title = username
+        self.messages = []
+        self.last_activity_at = datetime.now(timezone.utc)
+
+    def dict(self):
+        return {
+            "id": self.id,
+            "pk": self.pk,
+            "users": self.users,
+            "thread_title": self.thread_title,
+            "messages": [m.dict() for m in reversed(self.messages)],
+            "last_activity_at": self.last_activity_at.isoformat(),
+        }
+
+
+class FakeInstagramClient:
+    def __init__(self, latency=0.05, error_rate=0.0, seed=None):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.threads = {}      # user_id -> FakeDirectThread
+        self.usernames = {}    # user_id -> username
+        self.next_message_id = 1
+
+    def _simulate_network(self):
+        time.sleep(self.latency * self.random.uniform(0.5, 1.5))
+        if self.random.random() < self.error_rate:
+            raise RuntimeError("Fake Instagram backend: simulated failure")
+
+    def user_id_from_username(self, username):
+        user_id = str(zlib.crc32(username.encode("utf-8")))
+        self.usernames[user_id] = username
+        return user_id
+
+    def username_from_user_id(self, user_id):
+        return self.usernames.get(str(user_id))
+
+    def direct_send(self, text, user_ids):
+        self._simulate_network()
+        with self.lock:
+            user_id = str(user_ids[0])
+            thread = self.threads.get(user_id)
+            if thread is None:
+                thread = FakeDirectThread(1000 + len(self.threads), user_id, self.usernames.get(user_id, user_id))
+                self.threads[user_id] = thread
+            message = FakeDirectMessage(self.next_message_id, thread.id, "0", text)
+            self.next_message_id += 1
+            thread.messages.append(message)
+            thread.last_activity_at = message.timestamp
+            return message
+
+    def direct_send_photo(self, path, user_ids):
+        return self.direct_send(f"[photo] {path}", user_ids)
+
+    def direct_threads(self, amount=20, selected_filter="", thread_message_limit=None):
+        with self.lock:
+            threads = sorted(self.threads.values(), key=lambda t: t.last_activity_at, reverse=True)
+            return threads[:amount]
+
+    def direct_pending_inbox(self, amount=20):
+        return []
+
+    def _thread_by_id(self, thread_id):
+        for thread in self.threads.values():
+            if thread.id == str(thread_id):
+                return thread
+        raise RuntimeError(f"Thread {thread_id} not found")
+
+    def direct_messages(self, thread_id, amount=20):
+        with self.lock:
+            return list(reversed(self._thread_by_id(thread_id).messages))[:amount]
+
+    def direct_thread(self, thread_id, amount=20):
+        with self.lock:
+            return self._thread_by_id(thread_id)
+
+    def direct_thread_page(self, thread_id, cursor=None, limit=20):
+        """Same contract as mcp_server.PagingClient.direct_thread_page; the cursor is an offset."""
+        with self.lock:
+            thread = self._thread_by_id(thread_id)
+            newest_first = list(reversed(thread.messages))
+            start = int(cursor or 0)
+            page = newest_first[start:start + limit]
+            older = str(start + limit) if start + limit < len(newest_first) else None
+            return thread, page, older
+
+    def direct_search(self, query):
+        with self.lock:
+            return [t for t in self.threads.values() if query.lower() in t.thread_title.lower()]
+
+    def direct_thread_by_participants(self, user_ids):
+        with self.lock:
+            thread = self.threads.get(str(user_ids[0]))
+            if thread is None:
+                raise RuntimeError("Thread not found")
+            return thread
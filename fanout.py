@@ -0,0 +1,268 @@
+# fanout.py
+
+"""
+Subscriber Fan-out
+Sends one event (a goal or a win) to every opted-in subscriber, not just the
+single fan page configured in rivals.py.
+- Subscribers live outside the code in a JSON file (SUBSCRIBERS_FILE), keyed by
+  the same player/team ID as rivals.py:
+      {"50": ["united_fan_1", "united_fan_2"], "154": ["cr7_fan_1"]}
+- Messages are personalized in batches (one model request per batch) and
+  pushed through a bounded queue to a small pool of workers, each holding one
+  long-lived MCP session.
+- A shared rate limiter keeps the total send rate under Instagram's limits.
+- Every subscriber's result is written to FANOUT_PROGRESS_DIR as soon as it
+  is known, so an interrupted fan-out resumes where it stopped.
+- One rate limiter per send rate is shared by every fan-out in the process,
+  so fan-outs running side by side stay under the limit together.
+"""
+
+import argparse
+import json
+import os
+import queue
+import threading
+
+import clock
+import dm_sender
+
+SUBSCRIBERS_FILE = os.getenv("SUBSCRIBERS_FILE", "subscribers.json")
+FANOUT_PROGRESS_DIR = os.getenv("FANOUT_PROGRESS_DIR", "fanout_progress")
+
+FANOUT_WORKERS = int(os.getenv("FANOUT_WORKERS", "3"))          # Parallel MCP sessions
+FANOUT_SENDS_PER_MINUTE = int(os.getenv("FANOUT_SENDS_PER_MINUTE", "30"))
+PERSONALIZE_BATCH_SIZE = 50
+FANOUT_LLM_PERSONALIZE = os.getenv("FANOUT_LLM_PERSONALIZE", "1") == "1"
+QUEUE_SIZE = 2 * PERSONALIZE_BATCH_SIZE                         # Bounds memory on huge lists
+
+
+def load_subscribers(path=SUBSCRIBERS_FILE):
+    """Loads the subscriber lists. Returns an empty dict if there is no file."""
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, "r") as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"  - Warning: Could not read subscribers file {path}: {e}")
+        return {}
+
+
+def get_subscribers(entity_id, path=SUBSCRIBERS_FILE):
+    """Returns the usernames subscribed to a player or team's events."""
+    return load_subscribers(path).get(str(entity_id), [])
+
+
+def personalize_batch(event, message, usernames):
+    """
+    Returns (username, message) pairs for a batch of subscribers.
+    With FANOUT_LLM_PERSONALIZE on, the whole batch is written by the model in one
+    request; any subscriber it misses gets the event message with a greeting.
+    """
+    from banter import generate_banter_batch, share_origin
+
+    generated = [None] * len(usernames)
+    if FANOUT_LLM_PERSONALIZE:
+        generated = generate_banter_batch([dict(event, recipient=u) for u in usernames], fallback=False)
+    return [(username, text or share_origin(f"Hey @{username}! {message}", message))
+            for username, text in zip(usernames, generated)]
+
+
+class RateLimiter:
+    """Spaces out calls so that at most per_minute happen in any minute, across threads."""
+    def __init__(self, per_minute):
+        self.interval = 60.0 / per_minute if per_minute > 0 else 0.0
+        self.next_slot = clock.now()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        with self.lock:
+            now = clock.now()
+            wait = self.next_slot - now
+            self.next_slot = max(now, self.next_slot) + self.interval
+        if wait > 0:
+            clock.sleep(wait)
+
+
+_rate_limiters = {}
+_rate_limiters_lock = threading.Lock()
+
+
+def shared_rate_limiter(per_minute):
+    """The process-wide RateLimiter for a send rate."""
+    with _rate_limiters_lock:
+        if per_minute not in _rate_limiters:
+            _rate_limiters[per_minute] = RateLimiter(per_minute)
+        return _rate_limiters[per_minute]
+
+
+class FanoutProgress:
+    """
+    Records which subscribers already got the DM for one event.
+    Every result is appended to a JSON-lines log as soon as it is known, so a
+    resumed fan-out skips everyone who was already messaged.
+    """
+    def __init__(self, event_key, directory=FANOUT_PROGRESS_DIR):
+        os.makedirs(directory, exist_ok=True)
+        self.path = os.path.join(directory, f"{event_key}.jsonl")
+        self.lock = threading.Lock()
+        self.state = {"sent": [], "skipped": [], "failed": {}}
+        self.log = None
+        if os.path.exists(self.path):
+            with open(self.path, "r") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue   # A line cut short by a crash
+                    self._apply(entry["user"], entry)
+        self.done = set(self.state["sent"]) | set(self.state["skipped"])
+
+    def _apply(self, username, result):
+        if result.get("success"):
+            self.state["sent"].append(username)
+            self.state["failed"].pop(username, None)
+        elif result.get("skipped"):
+            self.state["skipped"].append(username)
+        else:
+            self.state["failed"][username] = result.get("message", "Unknown error")
+
+    def is_done(self, username):
+        return username in self.done
+
+    def mark(self, username, result):
+        """Records and immediately persists one subscriber's result."""
+        entry = {"user": username, "success": bool(result.get("success")), "skipped": bool(result.get("skipped"))}
+        if not entry["success"]:
+            entry["message"] = result.get("message", "Unknown error")
+        with self.lock:
+            self._apply(username, entry)
+            if entry["success"] or entry["skipped"]:
+                self.done.add(username)
+            if self.log is None:
+                self.log = open(self.path, "a+")
+                if self.log.tell():
+                    self.log.seek(self.log.tell() - 1)
+                    if self.log.read(1) != "\n":
+                        self.log.write("\n")   # Don't append to a line cut short by a crash
+            self.log.write(json.dumps(entry) + "\n")
+            self.log.flush()
+
+    def close(self):
+        with self.lock:
+            if self.log is not None:
+                self.log.close()
+                self.log = None
+
+
+def _worker(work_queue, progress, limiter, worker_id, deadline=None):
+    """Drains the queue through one long-lived MCP session. Items left at the deadline are skipped."""
+    session = dm_sender.DMSession()
+    if not session.open():
+        print(f"❌ Fan-out worker {worker_id} could not open an MCP session")
+    try:
+        while True:
+            item = work_queue.get()
+            if item is None:
+                work_queue.task_done()
+                break
+            username, message, card_path = item
+            if deadline and clock.now() > deadline:
+                result = {"success": False, "skipped": True, "message": "Deadline passed."}
+            elif session.ready:
+                limiter.acquire()
+                result = session.send(username, message)
+                if card_path and result.get("success"):
+                    limiter.acquire()
+                    session.send_photo(username, card_path)
+            else:
+                result = {"success": False, "message": "MCP session not available"}
+            progress.mark(username, result)
+            work_queue.task_done()
+    finally:
+        session.close()
+
+
+def fan_out_event(entity_id, entity_name, supported_entity, current_count, entity_type,
+                  message=None, subscribers=None, workers=FANOUT_WORKERS,
+                  sends_per_minute=FANOUT_SENDS_PER_MINUTE, context=None, card_path=None, deadline=None,
+                  headline=None):
+    """
+    Sends the event to every subscriber of entity_id, followed by the image card
+    at card_path if one is given (the same file for every subscriber).
+    Subscribers not reached by deadline (a timestamp) are skipped: the news is stale.
+    headline is the burst a merged event leads with (see coalescer.py).
+    Safe to call again after an interruption: already-sent subscribers are skipped.
+    Returns a summary dictionary.
+    """
+    if subscribers is None:
+        subscribers = get_subscribers(entity_id)
+    event_key = f"{entity_id}-{entity_type}-{current_count}"
+    progress = FanoutProgress(event_key)
+    pending = [u for u in dict.fromkeys(subscribers) if not progress.is_done(u)]
+
+    print(f"\n📣 Fan-out {event_key}: {len(pending)} of {len(subscribers)} subscribers pending")
+    if not pending:
+        return {"success": True, "event": event_key, "sent": len(progress.state["sent"]), "pending": 0}
+
+    if message is None:
+        from banter import generate_banter_message
+        message = generate_banter_message(entity_name, supported_entity, current_count, entity_type, context=context,
+                                          headline=headline)
+
+    event = {"scorer_name": entity_name, "supported_entity": supported_entity,
+             "current_count": current_count, "entity_type": entity_type, "context": context,
+             "headline": headline}
+    work_queue = queue.Queue(maxsize=QUEUE_SIZE)
+    limiter = shared_rate_limiter(sends_per_minute)
+    threads = [
+        threading.Thread(target=_worker, args=(work_queue, progress, limiter, i, deadline), daemon=True)
+        for i in range(max(1, min(workers, len(pending))))
+    ]
+    for thread in threads:
+        thread.start()
+
+    started = clock.now()
+    try:
+        for i in range(0, len(pending), PERSONALIZE_BATCH_SIZE):
+            batch = pending[i:i + PERSONALIZE_BATCH_SIZE]
+            for username, text in personalize_batch(event, message, batch):
+                work_queue.put((username, text, card_path))  # Blocks while the workers catch up
+            print(f"  - Fan-out {event_key}: queued {min(i + PERSONALIZE_BATCH_SIZE, len(pending))}/{len(pending)}")
+    finally:
+        for _ in threads:
+            work_queue.put(None)
+        for thread in threads:
+            thread.join()
+        progress.close()
+
+    elapsed = clock.now() - started
+    summary = {
+        "success": not progress.state["failed"],
+        "event": event_key,
+        "sent": len(progress.state["sent"]),
+        "skipped": len(progress.state["skipped"]),
+        "failed": len(progress.state["failed"]),
+        "elapsed_seconds": round(elapsed, 1),
+    }
+    print(f"✅ Fan-out {event_key} finished: {summary}")
+    return summary
+
+
+if __name__ == "__main__":
+    # Resume or run a fan-out by hand, e.g. after an interruption:
+    #   python3 fanout.py --entity 50 --count 12
+    from rivals import find_rivalry, get_supported_entity
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--entity", required=True, help="Player/team ID from rivals.py")
+    parser.add_argument("--count", type=int, required=True, help="Goal/win count of the event")
+    parser.add_argument("--workers", type=int, default=FANOUT_WORKERS)
+    args = parser.parse_args()
+
+    rivalry = find_rivalry(args.entity)
+    if not rivalry:
+        print(f"❌ No rivalry configured for entity {args.entity}")
+        raise SystemExit(1)
+    fan_out_event(args.entity, rivalry["name"], get_supported_entity(args.entity),
+                  args.count, rivalry["type"], workers=args.workers)
@@ -1,11 +1,23 @@
 # goal_scraper.py
 import requests
+import threading
 import time
+import clock
 import os
 import json
 from dotenv import load_dotenv
-from rivals import RIVALRIES, get_fan_to_notify, get_rival_name, get_supported_entity, is_player, is_team
+from rivals import RIVALRIES, find_rivalry, get_fan_to_notify, get_league, get_rival_id, get_rival_name, get_supported_entity, get_priority, get_source, is_player, is_team, reload_rivalries
 import dm_sender # This is our other file
+import fanout
+from quota_manager import PRIORITY_WEIGHTS, QuotaManager
+from circuit_breaker import CircuitBreaker, CircuitOpenError
+# Banter generation lives in banter.py; re-exported here for existing callers
+from banter import generate_banter_batch, generate_banter_message, generate_fallback_message
+from season_stats import SEASON_DAYS, SeasonStats, describe
+from datetime import date
+from event_ingest import EventIngestServer
+from coalescer import PUSH_COALESCE_WINDOW, EventCoalescer
+from engagement import EngagementTracker
 import argparse
 
 # Load environment variables from .env file
@@ -16,9 +28,13 @@ load_dotenv()
 API_KEY = os.getenv("FOOTBALL_API_KEY", "39d9a4825a5975f6fd0f7b9969ad5fd7")  # Fallback to hardcoded if not in .env
 API_HOST = "v3.football.api-sports.io"
 
-# OpenAI Configuration - Add your OpenAI API key to .env file
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")  # Will load from .env file
-USE_OPENAI = True  # Set to False to use only fallback messages
+# How long a goal/win DM stays worth sending after detection (seconds). Goals
+# are stale once the match moves on; a win is still worth rubbing in later.
+DM_TTL = {"player": 30 * 60, "team": 3 * 60 * 60}
+
+# Send a rendered image card (card_renderer.py) next to each banter DM
+IMAGE_CARDS = os.getenv("DM_IMAGE_CARDS", "0") == "1"
+CARD_RENDERER = None    # Created on first use
 
 # The season you want to track. Update this as new seasons start.
 SEASON = "2024"  # Updated to 2024 season 
@@ -26,9 +42,110 @@ HEADERS = {
     'x-rapidapi-host': API_HOST,
     'x-rapidapi-key': API_KEY
 }
+# Daily request budget of your API-Football plan (the free plan allows 100/day).
+# The real figure is read from the response headers once the first call returns.
+API_DAILY_LIMIT = int(os.getenv("FOOTBALL_API_DAILY_LIMIT", "100"))
+QUOTA = QuotaManager(daily_limit=API_DAILY_LIMIT)
+
+# Upstream timeouts (seconds) and circuit breakers. While a dependency is
+# unhealthy its calls are skipped and the last good values are used instead.
+FOOTBALL_API_TIMEOUT = 10
+FOOTBALL_BREAKER = CircuitBreaker("api-football", reset_timeout=120)
+
+# Team wins come from one /standings call per league, shared by every tracked
+# team in it. Standings younger than this are reused (e.g. at startup), but
+# each poll cycle fetches fresh ones.
+STANDINGS_MAX_AGE = 30
+LEAGUE_STANDINGS = {}   # league_id -> (fetched_at, {team_id: wins}, {team_id: matches played})
+
+# How often to look for edits to the rivalry config file (rivals.json)
+RELOAD_CHECK_SECONDS = 5
+
+# Per-day season series for every entity, used for richer banter context.
+# The season is assumed to start on 1 July of the SEASON year; when SEASON is
+# long over (e.g. replaying an old season), the series starts today instead.
+SEASON_START = date(int(SEASON), 7, 1)
+if (clock.today() - SEASON_START).days >= SEASON_DAYS:
+    SEASON_START = clock.today()
+SEASON_STATS = SeasonStats(season_start=SEASON_START)
+
 # Simple in-memory "databases" to store the last known counts
 PLAYER_GOAL_STATE = {}  # For individual players (goals)
 TEAM_WIN_STATE = {}     # For teams (wins)
+STATE_LOCK = threading.Lock()  # Polling and pushed events both update the counts
+
+# Local endpoint for pushed events (see event_ingest.py); off unless INGEST_PORT or INGEST_SOCKET is set
+INGEST_SERVER = None
+
+# Bursts of events for the same fan page (a brace, both derbies at once) are
+# merged into one DM; see coalescer.py for the window (COALESCE_WINDOW)
+COALESCER = EventCoalescer(flush=lambda events: flush_events(events))
+SHUTDOWN_DRAIN_SECONDS = 60   # How long an exit waits for queued DMs to go out
+
+# Subscriber fan-outs run in the background (see start_fan_out)
+FANOUT_THREADS = []
+FANOUT_LOCK = threading.Lock()
+
+# Reply rate, reply latency and reactions per rivalry and template (see engagement.py)
+ENGAGEMENT = EngagementTracker()
+dm_sender.add_send_listener(ENGAGEMENT.record_sent)
+
+def api_get(url, params):
+    """
+    Sends a GET request to API-Football through the quota manager.
+    Every API-Football call must go through here so the daily budget stays accurate.
+    Retries once after backing off if the API answers with 429.
+    Raises CircuitOpenError without calling the API while it is unhealthy.
+    """
+    for attempt in range(2):
+        if not FOOTBALL_BREAKER.allow_request():
+            raise CircuitOpenError("API-Football circuit is open")
+        QUOTA.wait_for_slot()
+        try:
+            response = requests.get(url, headers=HEADERS, params=params, timeout=FOOTBALL_API_TIMEOUT)
+        except requests.exceptions.RequestException:
+            FOOTBALL_BREAKER.record_failure()
+            raise
+        QUOTA.update_from_response(response)
+        if response.status_code >= 500:
+            FOOTBALL_BREAKER.record_failure()
+        else:
+            FOOTBALL_BREAKER.record_success()
+        if response.status_code != 429:
+            break
+    response.raise_for_status() # Raises an error for bad responses (4xx or 5xx)
+    return response
+
+def poll_key(rivalry):
+    """
+    Returns the key an entity is scheduled under in the quota manager.
+    Players are polled one by one; all teams of a league share one standings call,
+    so they share one key as well.
+    """
+    if rivalry["type"] == "team":
+        return f"league:{get_league(rivalry['id'])}"
+    return rivalry["id"]
+
+def is_push_only(rivalry):
+    """True for entities whose events only arrive through the ingestion endpoint; they are never polled."""
+    return get_source(rivalry["id"]) == "push"
+
+def tracked_entities():
+    """
+    Returns (poll_key, priority) tuples, as the quota manager expects.
+    A league is polled with the highest priority of its tracked teams.
+    """
+    priorities = {}
+    for rivalry in RIVALRIES:
+        if is_push_only(rivalry):
+            continue
+        key = poll_key(rivalry)
+        priority = get_priority(rivalry["id"])
+        if priority not in PRIORITY_WEIGHTS:
+            priority = "normal"   # A typo in rivals.json must not stop the poll loop
+        if key not in priorities or PRIORITY_WEIGHTS[priority] > PRIORITY_WEIGHTS[priorities[key]]:
+            priorities[key] = priority
+    return list(priorities.items())
 
 def get_total_goals(player_id):
     """
@@ -38,8 +155,7 @@ def get_total_goals(player_id):
     params = {"id": player_id, "season": SEASON}
     
     try:
-        response = requests.get(url, headers=HEADERS, params=params)
-        response.raise_for_status() # Raises an error for bad responses (4xx or 5xx)
+        response = api_get(url, params)
         
         data = response.json()
         
@@ -48,232 +164,408 @@ def get_total_goals(player_id):
             return 0
 
         total_goals = 0
+        appearances = 0
         player_stats = data['response'][0]['statistics']
         for stats_by_league in player_stats:
             goals = stats_by_league['goals']['total']
             if goals is not None:
                 total_goals += goals
+            appearances += (stats_by_league.get('games') or {}).get('appearences') or 0  # Sic, API-Football's spelling
         
+        FOOTBALL_BREAKER.remember(("player", player_id), total_goals)
+        SEASON_STATS.record(player_id, "player", total_goals, played=appearances)
         return total_goals
         
-    except requests.exceptions.RequestException as e:
+    except (requests.exceptions.RequestException, CircuitOpenError) as e:
         print(f"  - Error fetching data from API: {e}")
-        return None # Return None to indicate the API call failed
+        # Serve the last good value, or None to indicate the API call failed
+        return FOOTBALL_BREAKER.stale(("player", player_id))
 
-def get_team_wins(team_id):
+def get_league_wins(league_id, max_age=STANDINGS_MAX_AGE):
     """
-    Calls the API and gets the total wins for a team in the Premier League for the season.
+    Calls the API once for a league's standings and returns {team_id: wins} for every team in it.
+    Standings fetched less than max_age seconds ago are reused.
+    Returns None if the API call failed.
     """
-    url = f"https://{API_HOST}/teams/statistics"
-    params = {"team": team_id, "season": SEASON, "league": "39"}  # Premier League
-    
+    cached = LEAGUE_STANDINGS.get(league_id)
+    if cached and clock.now() - cached[0] < max_age:
+        return cached[1]
+
+    url = f"https://{API_HOST}/standings"
+    params = {"league": league_id, "season": SEASON}
+
     try:
-        response = requests.get(url, headers=HEADERS, params=params)
-        response.raise_for_status()
-        
+        response = api_get(url, params)
+
         data = response.json()
-        print(f"  - Debug: Team {team_id} API response: {data}")  # Debug line
-        
+
         if not data['response']:
-            print(f"  - Warning: No data returned for team {team_id} for season {SEASON}.")
-            return 0
+            print(f"  - Warning: No standings returned for league {league_id} for season {SEASON}.")
+            wins, played = {}, {}
+        else:
+            # Leagues with groups (e.g. cups) return one table per group
+            wins, played = {}, {}
+            for group in data['response'][0]['league']['standings']:
+                for entry in group:
+                    wins[str(entry['team']['id'])] = entry['all']['win'] or 0
+                    played[str(entry['team']['id'])] = entry['all'].get('played') or 0
 
-        team_stats = data['response']
-        wins = team_stats['fixtures']['wins']['total']
-        
-        return wins if wins is not None else 0
-        
-    except requests.exceptions.RequestException as e:
-        print(f"  - Error fetching team data from API: {e}")
+        LEAGUE_STANDINGS[league_id] = (clock.now(), wins, played)
+        return wins
+
+    except (requests.exceptions.RequestException, CircuitOpenError) as e:
+        print(f"  - Error fetching standings for league {league_id} from API: {e}")
         return None
 
+def get_team_wins(team_id, max_age=STANDINGS_MAX_AGE):
+    """
+    Gets the total wins for a team in its league (see rivals.py) for the season,
+    from the league standings.
+    """
+    league_id = get_league(team_id)
+    standings = get_league_wins(league_id, max_age)
+    if standings is None:
+        # Serve the last good value, or None to indicate the API call failed
+        return FOOTBALL_BREAKER.stale(("team", team_id))
+
+    if team_id not in standings:
+        print(f"  - Warning: Team {team_id} is not in the league {league_id} standings for season {SEASON}.")
+        return 0
+
+    wins = standings[team_id]
+    played = LEAGUE_STANDINGS[league_id][2].get(team_id) if league_id in LEAGUE_STANDINGS else None
+    FOOTBALL_BREAKER.remember(("team", team_id), wins)
+    SEASON_STATS.record(team_id, "team", wins, played=played)
+    return wins
+
+def initialize_entity(rivalry):
+    """Fetches the baseline count for one player or team. Returns True on success."""
+    entity_id = rivalry["id"]
+    entity_name = rivalry["name"]
+    entity_type = rivalry["type"]
+
+    if entity_type == "player":
+        goals = get_total_goals(entity_id)
+        if goals is None:
+            return False
+        PLAYER_GOAL_STATE[entity_id] = goals
+        print(f"  - Initial goals for {entity_name} (player, {SEASON}): {goals}")
+    elif entity_type == "team":
+        wins = get_team_wins(entity_id)
+        if wins is None:
+            return False
+        TEAM_WIN_STATE[entity_id] = wins
+        print(f"  - Initial wins for {entity_name} (team, {SEASON}): {wins}")
+    QUOTA.mark_polled(poll_key(rivalry))
+    return True
+
+def has_baseline(entity_id, entity_type):
+    """True once an entity's initial count is known, so a change can be detected."""
+    if entity_type == "player":
+        return entity_id in PLAYER_GOAL_STATE
+    return entity_id in TEAM_WIN_STATE
+
 def initialize_states():
-    """Fills the initial state for all players and teams in our rivalry table."""
+    """Fills the initial state for all polled players and teams in our rivalry table."""
     print("Initializing player/team states...")
     for rivalry in RIVALRIES:
-        entity_id = rivalry["id"]
-        entity_name = rivalry["name"]
-        entity_type = rivalry["type"]
-        
-        if entity_type == "player":
-            goals = get_total_goals(entity_id)
-            if goals is not None:
-                PLAYER_GOAL_STATE[entity_id] = goals
-                print(f"  - Initial goals for {entity_name} (player, {SEASON}): {goals}")
-            else:
-                print(f"Could not fetch initial state for {entity_name}. Exiting.")
-                exit()
-        elif entity_type == "team":
-            wins = get_team_wins(entity_id)
-            if wins is not None:
-                TEAM_WIN_STATE[entity_id] = wins
-                print(f"  - Initial wins for {entity_name} (team, {SEASON}): {wins}")
-            else:
-                print(f"Could not fetch initial state for {entity_name}. Exiting.")
-                exit()
-        
-        time.sleep(5) # Add a small delay to be kind to the API
+        if is_push_only(rivalry):
+            continue
+        if not initialize_entity(rivalry):
+            print(f"Could not fetch initial state for {rivalry['name']}. Exiting.")
+            exit()
+    QUOTA.report()
 
-def generate_banter_message(scorer_name, supported_entity, current_count, entity_type):
+def forget_entity(entity_id):
+    """Drops all state kept for a player or team that is no longer tracked."""
+    PLAYER_GOAL_STATE.pop(entity_id, None)
+    TEAM_WIN_STATE.pop(entity_id, None)
+    QUOTA.last_polled.pop(entity_id, None)
+    QUOTA.live_until.pop(entity_id, None)
+    SEASON_STATS.forget(entity_id)   # Out of the leaderboards and rival deltas too
+    # League keys stay: other teams may still share them, and unused ones are harmless
+
+def apply_rivalry_changes():
     """
-    Generate a dynamic banter message using OpenAI API.
-    Falls back to pre-written messages if API fails.
+    Picks up edits to the rivalry config file while running.
+    Only newly added entities get a baseline fetch; removed ones are dropped.
+    Entities whose baseline fetch fails are retried on the next call.
+    Returns True if anything new was initialized.
     """
-    # Check if we should use OpenAI and if API key is configured
-    if not USE_OPENAI or not OPENAI_API_KEY:
-        print("  - Using fallback messages (OpenAI not configured)")
-        return generate_fallback_message(scorer_name, supported_entity, current_count, entity_type)
-    
-    try:
-        from openai import OpenAI
-        
-        client = OpenAI(api_key=OPENAI_API_KEY)
-        
-        activity = "goals" if entity_type == "player" else "wins"
-        activity_singular = "goal" if entity_type == "player" else "win"
-        
-        prompt = f"""Generate a fun, playful, and banterous social media message for football/soccer fans. 
-
-Context:
-- {scorer_name} just scored a {activity_singular} (now has {current_count} {activity} this season)
-- This message is being sent to fans of {supported_entity} (the rival team/player)
-- Keep it light-hearted, funny, and engaging - good-natured trolling
-- Use emojis and make it social media friendly
-- Include relevant hashtags
-- Maximum 280 characters to fit social media limits
-- Don't be mean-spirited, keep it playful and fun
-- The tone should be like friendly banter between football fans at a pub - cheeky but not nasty
-
-Generate ONLY the message text, no explanations or quotes around it."""
-
-        response = client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=[{"role": "user", "content": prompt}],
-            max_tokens=150,
-            temperature=0.8
-        )
-        
-        message_content = response.choices[0].message.content
-        if message_content:
-            message = message_content.strip()
-            print(f"  - Generated OpenAI message: {message[:50]}...")
-            return message
+    added, removed = reload_rivalries()
+    for rivalry in removed:
+        forget_entity(rivalry["id"])
+        print(f"  - Rivalry removed: {rivalry['name']} ({rivalry['type']})")
+    for rivalry in added:
+        print(f"  - Rivalry added: {rivalry['name']} ({rivalry['type']})")
+
+    initialized = False
+    missing = [r for r in RIVALRIES if not is_push_only(r) and not has_baseline(r["id"], r["type"])]
+    if not missing:
+        return False  # The usual case, checked every few seconds
+    all_entities = tracked_entities()
+    priorities = dict(all_entities)
+    for rivalry in missing:
+        key = poll_key(rivalry)
+        # Failed fetches are retried on the entity's normal poll schedule
+        if not QUOTA.is_due(key, priorities[key], all_entities):
+            continue
+        if initialize_entity(rivalry):
+            initialized = True
         else:
-            print("  - OpenAI returned empty response. Using fallback message.")
-            return generate_fallback_message(scorer_name, supported_entity, current_count, entity_type)
-        
-    except ImportError:
-        print("  - OpenAI package not installed. Using fallback messages.")
-        return generate_fallback_message(scorer_name, supported_entity, current_count, entity_type)
-    except Exception as e:
-        print(f"  - OpenAI API failed: {e}. Using fallback message.")
-        return generate_fallback_message(scorer_name, supported_entity, current_count, entity_type)
-
-def generate_fallback_message(scorer_name, supported_entity, current_count, entity_type):
+            QUOTA.mark_polled(key)
+            print(f"  - Could not fetch initial state for {rivalry['name']}. Will retry.")
+    return initialized
+
+def poll_engagement():
+    """Reads the fans' new replies every ENGAGEMENT_POLL_SECONDS and reports the engagement figures."""
+    summary = ENGAGEMENT.maybe_poll(lambda tool, arguments: dm_sender.get_supervisor().call(tool, arguments))
+    if summary and summary["threads"]:
+        ENGAGEMENT.report(top=5)
+
+def shutdown():
+    """Sends the events still held for merging and the queued DMs before the scraper exits."""
+    print("\n🛑 Shutting down: sending held events and queued DMs...")
+    COALESCER.flush_all()
+    deadline = time.time() + SHUTDOWN_DRAIN_SECONDS   # Real time: this waits on actual sends
+    if not dm_sender.drain_outbound(timeout=SHUTDOWN_DRAIN_SECONDS):
+        print("  - Warning: Some DMs were still queued at shutdown")
+    with FANOUT_LOCK:
+        fanouts = list(FANOUT_THREADS)
+    for thread in fanouts:
+        thread.join(max(0, deadline - time.time()))
+    if any(t.is_alive() for t in fanouts):
+        print("  - Warning: Fan-outs still running at shutdown; resume them with fanout.py")
+    ENGAGEMENT.save()
+
+def wait_for_next_cycle(delay):
+    """Sleeps until the next cycle, applying rivalry config changes as they happen."""
+    deadline = clock.now() + delay
+    while clock.now() < deadline:
+        clock.sleep(min(RELOAD_CHECK_SECONDS, max(0, deadline - clock.now())))
+        if apply_rivalry_changes():
+            return  # New entities are due right away
+
+def rival_pairs():
+    """Returns (entity_id, rival_entity_id) tuples for every rivalry whose rival is tracked too."""
+    pairs = []
+    for rivalry in RIVALRIES:
+        rival_id = get_rival_id(rivalry["id"])
+        if rival_id:
+            pairs.append((rivalry["id"], rival_id))
+    return pairs
+
+def add_season_context(events):
+    """Adds a season stats phrase to each event, from one vectorized pass over all entities."""
+    if not events:
+        return
+    context = SEASON_STATS.compute(rival_pairs())
+    for event in events:
+        event["context"] = describe(context.get(event["entity_id"]), event["entity_type"],
+                                    get_rival_name(event["entity_id"]))
+
+def render_card(event):
+    """Returns the path of the event's image card, or None if cards are off or rendering failed."""
+    global CARD_RENDERER
+    if not IMAGE_CARDS:
+        return None
+    rivalry = find_rivalry(event["entity_id"])
+    if not rivalry:
+        return None
+    try:
+        if CARD_RENDERER is None:
+            from card_renderer import CardRenderer
+            CARD_RENDERER = CardRenderer()
+        return CARD_RENDERER.render(rivalry, event["current_count"], event["supported_entity"])
+    except (OSError, ValueError) as e:
+        print(f"  - Warning: Could not render image card: {e}")
+        return None
+
+def start_fan_out(*args, **kwargs):
     """
-    Enhanced fallback messages with more variety and randomness.
+    Runs fanout.fan_out_event on its own thread: at FANOUT_SENDS_PER_MINUTE a big
+    fan-out takes minutes, and the coalescer must not wait for it to flush other
+    fan pages' events.
     """
-    import random
-    
-    if entity_type == "team":
-        # Team banter messages with more variety
-        banter_templates = [
-            "🔥 {scorer} just bagged WIN #{count}! 📈\n\nMeanwhile {rival} fans are probably {action} 😅\n\nTime to step up! 💪⚽\n\n{hashtags}",
-            
-            "🚨 BREAKING: {scorer} Alert! 🚨\n\n{scorer}: {count} wins ✅\n{rival} fans: {status} ⏰\n\n{encouragement} 😂🏆\n\n{hashtags}",
-            
-            "📊 STATS UPDATE 📊\n\n{scorer} wins: {count} 🔥\n{rival} fans' {emotion}: {trend} 📉\n\n{consolation} 💙❤️\n\n{hashtags}",
-            
-            "🎯 {scorer} just hit WIN #{count}! 🎉\n\n{rival} fans are probably {reaction} 📱💔\n\n{message} ⚽✨\n\n{hashtags}"
-        ]
-        
-        # Random elements for variety
-        actions = ["stress-eating", "refreshing the table", "checking if VAR exists", "googling 'how to support a winning team'"]
-        statuses = ["Still waiting...", "Still dreaming...", "Still hoping...", "Still believing..."]
-        encouragements = ["Don't worry, there's always next season!", "At least you tried!", "Better luck next time!", "The hope is admirable!"]
-        emotions = ["hopes", "dreams", "confidence", "expectations"]
-        trends = ["Declining", "Fading", "Vanishing", "Disappearing"]
-        consolations = ["But hey, at least you've got passion!", "At least the memes are good!", "The banter makes it worth it!", "You'll always have the memories!"]
-        reactions = ["googling 'how to delete Twitter'", "checking if this is a simulation", "wondering if they're still dreaming", "looking for the unsubscribe button"]
-        messages = ["Stay strong, rivals! Football is beautiful!", "The banter makes football amazing!", "Rivalry makes the game special!", "This is why we love football!"]
-        
+    def run():
+        try:
+            fanout.fan_out_event(*args, **kwargs)
+        except Exception as e:
+            print(f"  - Error in fan-out: {e}")
+    thread = threading.Thread(target=run, name=f"fanout-{args[0]}", daemon=True)
+    with FANOUT_LOCK:
+        FANOUT_THREADS[:] = [t for t in FANOUT_THREADS if t.is_alive()] + [thread]
+    thread.start()
+
+def notify_events(events):
+    """
+    Generates banter for the detected events and sends the DMs.
+    Several events share one batch generation request.
+    """
+    if not events:
+        return
+    if len(events) == 1:
+        e = events[0]
+        messages = [generate_banter_message(e["scorer_name"], e["supported_entity"], e["current_count"], e["entity_type"],
+                                            context=e.get("context"), headline=e.get("headline"))]
     else:
-        # Player banter messages
-        banter_templates = [
-            "🐐 {scorer} just scored GOAL #{count}! 🔥⚽\n\n{rival} fans are like '{reaction}' 😂\n\n{message} ☕⚽\n\n{hashtags}",
-            
-            "🚀 {scorer} STRIKES AGAIN! 🚀\n\n{scorer}: {count} goals 📈\n{rival} fans: {excuse} 🤷‍♂️\n\n{comment} 😄⚽\n\n{hashtags}",
-            
-            "📈 STONKS! 📈\n\n{scorer} goals: {count} ↗️\n{rival} confidence: {status} ↘️\n\n{suggestion} 🎮😂\n\n{hashtags}",
-            
-            "🎪 {scorer} goal #{count}! 🎯\n\n{rival} fans: {gymnastics} 🤸‍♂️\n\n{quote} 😂\n\nLove you really! ❤️⚽\n\n{hashtags}"
-        ]
-        
-        reactions = ["Wait, football is still happening?", "Is this real life?", "Did someone say football?", "Oh right, there's a game on!"]
-        excuses = ["Still making excuses", "Blaming the weather", "Questioning the referee", "Checking the offside rule"]
-        comments = ["Football is beautiful, isn't it?", "The beautiful game continues!", "This is why we love football!", "Poetry in motion!"]
-        statuses = ["Declining", "Fading", "Evaporating", "In freefall"]
-        suggestions = ["Don't worry, there's always FIFA!", "At least you have video games!", "YouTube highlights are free!", "There's always next season!"]
-        gymnastics = ["Performing mental gymnastics", "Doing backflips to explain this", "In full denial mode", "Rewriting the rulebook"]
-        quotes = ['"It was offside!" "The grass was too long!"', '"The ball was too round!"', '"It\'s all rigged!"', '"That doesn\'t count because..."']
-        
-        actions = reactions
-        encouragements = comments
-        consolations = suggestions
-        messages = comments
-    
-    # Select random template and elements
-    template = random.choice(banter_templates)
-    
-    # Common hashtags
-    hashtags_options = [
-        "#Football #Banter #Rivalry",
-        "#BanterFC #Football #Reality", 
-        "#FootballBanter #Rivalry #Love",
-        "#Goals #Football #BanterTime",
-        "#ManchesterDerby #Football #Banter" if "Manchester" in scorer_name or "Manchester" in supported_entity else "#Football #Banter #Rivalry"
-    ]
-    
-    # Fill in the template
-    message = template.format(
-        scorer=scorer_name,
-        rival=supported_entity,
-        count=current_count,
-        action=random.choice(actions) if 'action' in template else '',
-        status=random.choice(statuses) if 'status' in template else '',
-        encouragement=random.choice(encouragements) if 'encouragement' in template else '',
-        emotion=random.choice(emotions) if 'emotion' in template else '',
-        trend=random.choice(trends) if 'trend' in template else '',
-        consolation=random.choice(consolations) if 'consolation' in template else '',
-        reaction=random.choice(reactions) if 'reaction' in template else '',
-        message=random.choice(messages) if 'message' in template else '',
-        excuse=random.choice(excuses) if 'excuse' in template else '',
-        comment=random.choice(comments) if 'comment' in template else '',
-        suggestion=random.choice(suggestions) if 'suggestion' in template else '',
-        gymnastics=random.choice(gymnastics) if 'gymnastics' in template else '',
-        quote=random.choice(quotes) if 'quote' in template else '',
-        hashtags=random.choice(hashtags_options)
-    )
-    
-    return message
+        # The fan page is addressed generically, so cached variants can be reused
+        messages = generate_banter_batch([dict(e, recipient=None) for e in events])
+
+    # Queue all fan page DMs first, so derbies jump ahead of everything else
+    queued = []
+    for event, message in zip(events, messages):
+        card_path = render_card(event)
+        lane = "derby" if get_priority(event["entity_id"]) == "derby" else "normal"
+        deadline = event.get("detected_at", clock.now()) + DM_TTL[event["entity_type"]]
+
+        # Call the DM sender (near-duplicates of recent DMs get regenerated).
+        # A derby DM that goes stale in the queue is rewritten rather than dropped.
+        dm_sender.queue_rival_dm(
+            recipient_username=event["recipient"],
+            message=message,
+            regenerate=lambda e=event: generate_banter_message(e["scorer_name"], e["supported_entity"], e["current_count"], e["entity_type"],
+                                                               use_cache=False, context=e.get("context"), headline=e.get("headline")),
+            lane=lane,
+            ttl=max(1, deadline - clock.now()),
+            card_path=card_path,
+            on_expiry="regenerate" if lane == "derby" else "drop",
+        )
+        queued.append((event, message, card_path, deadline))
+
+    # Notify every opted-in subscriber as well (of every entity in a merged event)
+    for event, message, card_path, deadline in queued:
+        members = event.get("members") or [event["entity_id"]]
+        subscribers = list(dict.fromkeys(u for member in members for u in fanout.get_subscribers(member)))
+        if subscribers:
+            start_fan_out(event["entity_id"], event["scorer_name"], event["supported_entity"],
+                          event["current_count"], event["entity_type"],
+                          message=message, subscribers=subscribers, context=event.get("context"),
+                          card_path=card_path, deadline=deadline, headline=event.get("headline"))
+    dm_sender.get_outbound().report()
+
+def advance_count(entity_id, entity_type, current_count):
+    """
+    Stores a new count for an entity if it is higher than the last known one.
+    Returns how many goals/wins are new (0 if none), so each goal/win is
+    notified once whether it was polled or pushed.
+    """
+    state = PLAYER_GOAL_STATE if entity_type == "player" else TEAM_WIN_STATE
+    with STATE_LOCK:
+        return _advance_locked(state, entity_id, current_count)
+
+def _advance_locked(state, entity_id, current_count):
+    """advance_count for a caller that already holds STATE_LOCK."""
+    known = entity_id in state
+    previous = state.get(entity_id, 0)
+    if current_count <= previous:
+        return 0
+    state[entity_id] = current_count
+    return current_count - previous if known else 1  # Without a baseline only this event is known to be new
+
+def build_event(rivalry, current_count, gained=1):
+    """Returns the event dictionary notify_events expects for gained new goals/wins."""
+    entity_id = rivalry["id"]
+    return {
+        "entity_id": entity_id,
+        "scorer_name": rivalry["name"],
+        "supported_entity": get_supported_entity(entity_id),
+        "current_count": current_count,
+        "entity_type": rivalry["type"],
+        "recipient": get_fan_to_notify(entity_id),
+        "detected_at": clock.now(),
+        "gained": gained,
+    }
+
+def ingest_event(payload):
+    """
+    Validates one pushed event (see event_ingest.py) and records its count.
+    payload: {"entity_id", optional "count" (new season total), optional "event_id"}.
+    Without a count the event is one more goal/win than last known; such events
+    need an event_id so retries are not counted twice.
+    Returns a result dictionary, with the event to notify under "event" if it is new.
+    """
+    rivalry = find_rivalry(payload.get("entity_id"))
+    if not rivalry:
+        return {"success": False, "status": 404, "message": f"Unknown entity {payload.get('entity_id')!r}"}
+    entity_id = rivalry["id"]
+    entity_type = rivalry["type"]
+    state = PLAYER_GOAL_STATE if entity_type == "player" else TEAM_WIN_STATE
+
+    count = payload.get("count")
+    if count is None:
+        if payload.get("event_id") is None:
+            return {"success": False, "message": "Events without a count need an event_id"}
+    elif isinstance(count, bool) or not isinstance(count, int) or count < 0:
+        return {"success": False, "message": "count must be a non-negative integer"}
+
+    with STATE_LOCK:
+        if count is None:
+            # Read and store in one go: two concurrent pushes must not both claim the same next count
+            count = state.get(entity_id, 0) + 1
+        gained = _advance_locked(state, entity_id, count)
+    if not gained:
+        return {"success": True, "message": f"{rivalry['name']} already at {state.get(entity_id, 0)}, nothing new"}
+
+    activity_word = "goal" if entity_type == "player" else "win"
+    print(f"  >>> {activity_word.upper()} PUSHED for {rivalry['name']} ({entity_type})! (Current: {count})")
+    SEASON_STATS.record(entity_id, entity_type, count)
+    if not is_push_only(rivalry):
+        QUOTA.mark_live(poll_key(rivalry))
+    event = build_event(rivalry, count, gained)
+    if not event["recipient"]:
+        return {"success": True, "message": "Recorded; no fan page to notify"}
+    return {"success": True, "message": "Queued for notification", "event": event}
+
+def process_pushed_event(event):
+    """Runs a pushed event through the same coalescing, banter and DM path as polled ones."""
+    COALESCER.add([event], window=PUSH_COALESCE_WINDOW)
+
+def flush_events(events):
+    """Coalescer callback: notifies the merged events of the fan pages whose window closed."""
+    add_season_context(events)
+    notify_events(events)
+    for event in events:
+        print(f"  - {event['scorer_name']} queued for {event['recipient']} "
+              f"{clock.now() - event['detected_at']:.1f}s after detection")
+
+def start_ingest_server():
+    """Starts the push-ingestion endpoint if it is configured."""
+    global INGEST_SERVER
+    server = EventIngestServer(accept=ingest_event, process=process_pushed_event)
+    if server.start():
+        INGEST_SERVER = server
 
 def check_for_new_activity():
     """The main function to check for new goals/wins and trigger DMs."""
-    print(f"\n[{time.ctime()}] Checking for new activity...")
+    print(f"\n[{clock.ctime()}] Checking for new activity...")
+    all_entities = tracked_entities()
+    # Only poll entities whose share of the daily budget allows it right now.
+    # A due league brings all of its tracked teams along, at the cost of one call.
+    due = {key for key, priority in all_entities if QUOTA.is_due(key, priority, all_entities)}
+    for key in due:
+        QUOTA.mark_polled(key)
+    LEAGUE_STANDINGS.clear()  # Fresh standings once per league per cycle
+    events = []  # Detected events, handed to the coalescer together at the end of the cycle
     for rivalry in RIVALRIES:
         entity_id = rivalry["id"]
         entity_name = rivalry["name"]
         entity_type = rivalry["type"]
+
+        # Entities added by a config reload wait for their baseline first
+        if is_push_only(rivalry) or not has_baseline(entity_id, entity_type):
+            continue
+
+        if poll_key(rivalry) not in due:
+            continue
         
         # Get current count based on entity type
         if entity_type == "player":
             current_count = get_total_goals(entity_id)
-            last_known_count = PLAYER_GOAL_STATE.get(entity_id, 0)
             activity_word = "goal"
             activity_plural = "goals"
         elif entity_type == "team":
-            current_count = get_team_wins(entity_id)
-            last_known_count = TEAM_WIN_STATE.get(entity_id, 0)
+            current_count = get_team_wins(entity_id, max_age=float("inf"))
             activity_word = "win"
             activity_plural = "wins"
         else:
@@ -284,33 +576,21 @@ def check_for_new_activity():
             print(f"  - Skipping check for {entity_name} due to API error.")
             continue
 
-        if current_count > last_known_count:
+        # IMPORTANT: Update the state with the new count (unless a pushed event already did)
+        gained = advance_count(entity_id, entity_type, current_count)
+        if gained:
             print(f"  >>> {activity_word.upper()} DETECTED for {entity_name} ({entity_type})!")
+            QUOTA.mark_live(poll_key(rivalry))  # A match is probably on, poll this entity more often
             
-            fan_to_notify = get_fan_to_notify(entity_id)
-            
-            if fan_to_notify:
-                # Generate a dynamic banter message
-                message = generate_banter_message(entity_name, get_supported_entity(entity_id), current_count, entity_type)
-                
-                # Call the DM sender
-                dm_sender.send_rival_dm_sync(
-                    recipient_username=fan_to_notify,
-                    message=message
-                )
-            
-            # IMPORTANT: Update the state with the new count
-            if entity_type == "player":
-                PLAYER_GOAL_STATE[entity_id] = current_count
-            elif entity_type == "team":
-                TEAM_WIN_STATE[entity_id] = current_count
+            event = build_event(rivalry, current_count, gained)
+            if event["recipient"]:
+                events.append(event)
         else:
             activity_type = activity_plural if entity_type == "player" else activity_plural
             print(f"  - No new {activity_type} for {entity_name} ({entity_type}). (Current: {current_count})")
 
-        # Be respectful of the API's rate limits.
-        # Free plans are often limited per minute or per day.
-        time.sleep(10) # 10-second delay between checking each entity
+    COALESCER.add(events)
+    QUOTA.report()
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
@@ -318,6 +598,7 @@ if __name__ == "__main__":
     args = parser.parse_args()
 
     initialize_states()
+    start_ingest_server()
 
     if args.simulate_goal:
         # Simulate activity for both players and teams
@@ -331,15 +612,23 @@ if __name__ == "__main__":
             if entity_type == "player" and entity_id in PLAYER_GOAL_STATE:
                 # Decrease goal count by 1 to simulate a new goal being detected
                 PLAYER_GOAL_STATE[entity_id] = max(0, PLAYER_GOAL_STATE[entity_id] - 1)
+                QUOTA.last_polled.pop(poll_key(rivalry), None)  # Make sure the first cycle re-checks it
                 print(f"[TEST MODE] Simulated a new goal for {entity_name} (player).")
             elif entity_type == "team" and entity_id in TEAM_WIN_STATE:
                 # Decrease win count by 1 to simulate a new win being detected
                 TEAM_WIN_STATE[entity_id] = max(0, TEAM_WIN_STATE[entity_id] - 1)
+                QUOTA.last_polled.pop(poll_key(rivalry), None)
                 print(f"[TEST MODE] Simulated a new win for {entity_name} (team).")
 
-    while True:
-        check_for_new_activity()
-        # Check every 5 minutes. 100 requests/day allows for checks every ~15 mins.
-        # Adjust as needed based on your API plan.
-        print("\n--- Waiting for next check cycle ---")
-        time.sleep(300)
\ No newline at end of file
+    try:
+        while True:
+            check_for_new_activity()
+            poll_engagement()
+            # The quota manager spreads the remaining daily budget over the tracked
+            # entities, so the wait adapts to the API plan and to live matches.
+            delay = QUOTA.next_cycle_delay(tracked_entities())
+            print(f"\n--- Waiting {delay:.0f}s for next check cycle ---")
+            wait_for_next_cycle(delay)
+    finally:
+        # Held events were already counted by advance_count: they would never be detected again
+        shutdown()
\ No newline at end of file
@@ -0,0 +1,321 @@
+# inbox_mirror.py
+
+"""
+Local Inbox Mirror
+Keeps a SQLite copy of the Instagram DM inbox so the MCP server's read tools
+can answer locally instead of calling Instagram every time.
+- A background thread syncs periodically, newest activity first, and stops at
+  the first thread that has not changed since the last sync.
+- A thread with more new messages than one sync fetches is paged back to the
+  newest message already mirrored; if that is too far back, its older mirrored
+  messages are dropped rather than served with a hole in between.
+- Errors go to stderr: stdout is the MCP server's JSON-RPC channel.
+- Threads and messages are stored as the JSON that the tools would return.
+- A full-text index (SQLite FTS5) covers message text and participant names.
+"""
+
+import json
+import sqlite3
+import sys
+import threading
+import time
+
+SYNC_INTERVAL_SECONDS = 60
+SYNC_THREADS = 20          # Threads fetched per sync
+SYNC_MESSAGES = 20         # Messages fetched per thread per sync
+GAP_PAGES = 5              # Extra pages fetched to close the gap to the mirrored messages
+STALE_AFTER_SECONDS = 5 * SYNC_INTERVAL_SECONDS
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS threads (
+    thread_id TEXT PRIMARY KEY,
+    last_activity_at TEXT,
+    history_complete INTEGER NOT NULL DEFAULT 0,
+    data TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS messages (
+    message_id TEXT PRIMARY KEY,
+    thread_id TEXT NOT NULL,
+    timestamp TEXT,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS messages_by_thread ON messages (thread_id, timestamp);
+CREATE VIRTUAL TABLE IF NOT EXISTS search_index USING fts5 (
+    thread_id UNINDEXED,
+    message_id UNINDEXED,
+    body
+);
+"""
+
+
+def _to_dict(obj):
+    return obj if isinstance(obj, dict) else obj.dict()
+
+
+def _dumps(data):
+    return json.dumps(data, default=str)
+
+
+def _fts_query(query):
+    """Turns free text into a safe FTS5 prefix query."""
+    terms = [t.replace('"', '') for t in query.split()]
+    return " ".join(f'"{t}"*' for t in terms if t)
+
+
+class InboxMirror:
+    def __init__(self, client, db_path):
+        self.client = client
+        self.db = sqlite3.connect(db_path, check_same_thread=False)
+        self.db.executescript(SCHEMA)
+        self.lock = threading.Lock()
+        self.last_sync_at = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    # --- Sync engine ---
+
+    def start(self, interval=SYNC_INTERVAL_SECONDS):
+        """Starts the background sync thread."""
+        def run():
+            while not self._stop.is_set():
+                try:
+                    self.sync_once()
+                except Exception as e:
+                    print(f"Inbox mirror sync failed: {e}", file=sys.stderr)
+                self._stop.wait(interval)
+        self._thread = threading.Thread(target=run, name="inbox-mirror", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def sync_once(self):
+        """Fetches the newest threads and stores the ones that changed. Returns the number stored."""
+        threads = self.client.direct_threads(SYNC_THREADS, "", SYNC_MESSAGES)
+        stored = 0
+        for thread in threads:
+            t = _to_dict(thread)
+            if self._stored_activity(t.get("id")) == str(t.get("last_activity_at")):
+                break  # Threads come newest first: everything after this is unchanged too
+            self._close_gap(t)
+            self.store_thread(t)
+            stored += 1
+        self.last_sync_at = time.time()
+        return stored
+
+    def is_fresh(self):
+        return self.last_sync_at is not None and time.time() - self.last_sync_at < STALE_AFTER_SECONDS
+
+    # --- Writes ---
+
+    def _stored_activity(self, thread_id):
+        with self.lock:
+            row = self.db.execute(
+                "SELECT last_activity_at FROM threads WHERE thread_id = ?", (str(thread_id),)
+            ).fetchone()
+        return row[0] if row else None
+
+    def _is_stored(self, message_id):
+        with self.lock:
+            return self.db.execute("SELECT 1 FROM messages WHERE message_id = ?", (str(message_id),)).fetchone() is not None
+
+    def _close_gap(self, t):
+        """
+        Makes sure a synced thread's messages join up with the mirrored ones.
+        When all SYNC_MESSAGES fetched messages are new, older pages are added to
+        t["messages"] until a mirrored message is reached; if it isn't within
+        GAP_PAGES, the thread's older mirrored messages are dropped instead.
+        """
+        thread_id = str(t.get("id"))
+        messages = [_to_dict(m) for m in t.get("messages") or []]
+        if len(messages) < SYNC_MESSAGES or self._stored_activity(thread_id) is None:
+            return  # Every new message was fetched, or nothing older is mirrored yet
+        if any(self._is_stored(m.get("id")) for m in messages):
+            return
+
+        fetch_page = getattr(self.client, "direct_thread_page", None)
+        if fetch_page is not None:
+            seen = {str(m.get("id")) for m in messages}
+            cursor = None
+            for _ in range(GAP_PAGES):
+                _, page, cursor = fetch_page(thread_id, cursor, SYNC_MESSAGES)
+                for m in map(_to_dict, page):
+                    if str(m.get("id")) in seen:
+                        continue
+                    if self._is_stored(m.get("id")):
+                        t["messages"] = messages
+                        return
+                    seen.add(str(m.get("id")))
+                    messages.append(m)
+                if cursor is None:
+                    t["messages"] = messages
+                    return  # Reached the start of the thread
+
+        # Still not joined up: keep only the contiguous newest messages
+        oldest = min(str(m.get("timestamp")) for m in messages)
+        with self.lock, self.db:
+            self.db.execute("DELETE FROM search_index WHERE message_id IN "
+                            "(SELECT message_id FROM messages WHERE thread_id = ? AND timestamp < ?)", (thread_id, oldest))
+            self.db.execute("DELETE FROM messages WHERE thread_id = ? AND timestamp < ?", (thread_id, oldest))
+            self.db.execute("UPDATE threads SET history_complete = 0 WHERE thread_id = ?", (thread_id,))
+        t["messages"] = messages
+
+    def store_thread(self, thread):
+        """Stores a thread (dict or instagrapi object) and the messages it carries."""
+        t = _to_dict(thread)
+        thread_id = str(t.get("id"))
+        messages = t.get("messages") or []
+        data = {k: v for k, v in t.items() if k != "messages"}
+        names = " ".join(
+            f"{u.get('username') or ''} {u.get('full_name') or ''}" for u in (t.get("users") or [])
+        )
+        with self.lock, self.db:
+            self.db.execute(
+                "INSERT INTO threads (thread_id, last_activity_at, data) VALUES (?, ?, ?) "
+                "ON CONFLICT (thread_id) DO UPDATE SET last_activity_at = excluded.last_activity_at, data = excluded.data",
+                (thread_id, str(t.get("last_activity_at")), _dumps(data)),
+            )
+            self.db.execute("DELETE FROM search_index WHERE thread_id = ? AND message_id IS NULL", (thread_id,))
+            self.db.execute(
+                "INSERT INTO search_index (thread_id, message_id, body) VALUES (?, NULL, ?)",
+                (thread_id, f"{t.get('thread_title') or ''} {names}"),
+            )
+            self._store_messages(thread_id, messages)
+
+    def store_messages(self, thread_id, messages, complete=False):
+        """
+        Stores messages fetched outside a sync (e.g. by list_messages).
+        complete=True records that the thread has no older messages than these.
+        """
+        with self.lock, self.db:
+            self._store_messages(str(thread_id), messages)
+            if complete:
+                self.db.execute("UPDATE threads SET history_complete = 1 WHERE thread_id = ?", (str(thread_id),))
+
+    def _store_messages(self, thread_id, messages):
+        for message in messages:
+            m = _to_dict(message)
+            message_id = str(m.get("id"))
+            self.db.execute(
+                "INSERT OR REPLACE INTO messages (message_id, thread_id, timestamp, data) VALUES (?, ?, ?, ?)",
+                (message_id, thread_id, str(m.get("timestamp")), _dumps(m)),
+            )
+            self.db.execute("DELETE FROM search_index WHERE message_id = ?", (message_id,))
+            if m.get("text"):
+                self.db.execute(
+                    "INSERT INTO search_index (thread_id, message_id, body) VALUES (?, ?, ?)",
+                    (thread_id, message_id, m["text"]),
+                )
+
+    # --- Reads ---
+
+    def thread_count(self):
+        with self.lock:
+            return self.db.execute("SELECT COUNT(*) FROM threads").fetchone()[0]
+
+    def list_threads(self, amount, message_limit=None):
+        """Returns up to amount thread dicts, most recent activity first."""
+        with self.lock:
+            rows = self.db.execute(
+                "SELECT thread_id, data FROM threads ORDER BY last_activity_at DESC LIMIT ?", (amount,)
+            ).fetchall()
+        threads = []
+        for thread_id, data in rows:
+            t = json.loads(data)
+            t["messages"] = self._newest_messages(thread_id, message_limit or SYNC_MESSAGES)
+            threads.append(t)
+        return threads
+
+    def get_thread(self, thread_id, amount):
+        """Returns a thread dict with its newest messages, or None if it is not mirrored."""
+        with self.lock:
+            row = self.db.execute("SELECT data FROM threads WHERE thread_id = ?", (str(thread_id),)).fetchone()
+        if not row:
+            return None
+        messages = self.list_messages(thread_id, amount)
+        if messages is None:
+            return None
+        t = json.loads(row[0])
+        t["messages"] = messages
+        return t
+
+    def _newest_messages(self, thread_id, amount):
+        with self.lock:
+            rows = self.db.execute(
+                "SELECT data FROM messages WHERE thread_id = ? ORDER BY timestamp DESC LIMIT ?",
+                (str(thread_id), amount),
+            ).fetchall()
+        return [json.loads(r[0]) for r in rows]
+
+    def list_messages(self, thread_id, amount):
+        """
+        Returns the newest amount messages of a thread, newest first, or None
+        if the mirror cannot answer fully (the caller should fetch from Instagram).
+        """
+        messages = self._newest_messages(thread_id, amount)
+        if len(messages) < amount:
+            with self.lock:
+                row = self.db.execute(
+                    "SELECT history_complete FROM threads WHERE thread_id = ?", (str(thread_id),)
+                ).fetchone()
+            if not row or not row[0]:
+                return None
+        return messages
+
+    def _message_timestamp(self, thread_id, message_id):
+        with self.lock:
+            row = self.db.execute(
+                "SELECT timestamp FROM messages WHERE thread_id = ? AND message_id = ?", (str(thread_id), str(message_id))
+            ).fetchone()
+        return row[0] if row else None
+
+    def messages_since(self, thread_id, message_id, amount):
+        """
+        Returns the messages newer than message_id, newest first, or None if the
+        mirror does not know message_id or may be missing some of the newer ones.
+        """
+        timestamp = self._message_timestamp(thread_id, message_id)
+        if timestamp is None:
+            return None
+        with self.lock:
+            rows = self.db.execute(
+                "SELECT data FROM messages WHERE thread_id = ? AND timestamp > ? ORDER BY timestamp DESC LIMIT ?",
+                (str(thread_id), timestamp, SYNC_MESSAGES),
+            ).fetchall()
+        if len(rows) >= SYNC_MESSAGES or len(rows) > amount:
+            return None  # More arrived than one sync stores: there may be a gap
+        return [json.loads(r[0]) for r in rows]
+
+    def messages_before(self, thread_id, message_id, amount):
+        """
+        Returns up to amount messages older than message_id, newest first, or None
+        if the mirror cannot answer fully.
+        """
+        timestamp = self._message_timestamp(thread_id, message_id)
+        if timestamp is None:
+            return None
+        with self.lock:
+            rows = self.db.execute(
+                "SELECT data FROM messages WHERE thread_id = ? AND timestamp < ? ORDER BY timestamp DESC LIMIT ?",
+                (str(thread_id), timestamp, amount),
+            ).fetchall()
+            if len(rows) < amount:
+                row = self.db.execute(
+                    "SELECT history_complete FROM threads WHERE thread_id = ?", (str(thread_id),)
+                ).fetchone()
+                if not row or not row[0]:
+                    return None
+        return [json.loads(r[0]) for r in rows]
+
+    def search(self, query, limit=20):
+        """Full-text search over message text and participant names. Returns thread dicts."""
+        fts = _fts_query(query)
+        if not fts:
+            return []
+        with self.lock:
+            rows = self.db.execute(
+                "SELECT DISTINCT t.data FROM search_index s JOIN threads t ON t.thread_id = s.thread_id "
+                "WHERE search_index MATCH ? ORDER BY t.last_activity_at DESC LIMIT ?",
+                (fts, limit),
+            ).fetchall()
+        return [json.loads(r[0]) for r in rows]
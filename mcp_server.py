@@ -1,22 +1,224 @@
-from fastmcp import FastMCP
-from instagrapi import Client
+# fastmcp and instagrapi are imported in __main__ / create_client() rather than
+# here: they are the bulk of the server's start-up time, and a --fake-backend
+# run never needs instagrapi at all.
 import argparse
+import base64
+import json
+import os
+import threading
 from typing import Optional, List, Dict, Any
 from pathlib import Path
+from inbox_mirror import InboxMirror
+from server_stats import ServerStats
 
 INSTRUCTIONS = """
 This server is used to send messages to a user on Instagram.
 """
 
-client = Client()
+# Page sizes used when looking for new messages: most calls only need the first, small page
+NEW_MESSAGE_PAGE_SIZES = [5, 20]
+MAX_PAGE_SIZE = 20          # Instagram's own page size for thread messages
+MAX_AMOUNT = 100            # Upper bound on messages returned by one call
+MAX_SCAN_PAGES = 10         # Pages searched for a cursor's position before giving up
+
+# send_photo only sends files from here (card_renderer.py's output directory)
+CARD_DIR = Path(os.getenv("CARD_DIR", "cards")).resolve()
+
+
+def create_client():
+    """Creates the instagrapi client, importing instagrapi on first use."""
+    from instagrapi import Client
+    from instagrapi.extractors import extract_direct_thread
+
+    class PagingClient(Client):
+        def direct_thread_page(self, thread_id, cursor=None, limit=MAX_PAGE_SIZE):
+            """
+            Fetches one page of a thread, newest messages first, in a single request.
+            Returns (thread, messages, older_cursor); older_cursor is None at the start of the thread.
+            """
+            params = {
+                "visual_message_return_type": "unseen",
+                "direction": "older",
+                "seq_id": "40065",
+                "limit": str(limit),
+            }
+            if cursor:
+                params["cursor"] = cursor
+            result = self.private_request(f"direct_v2/threads/{thread_id}/", params=params)
+            raw = result["thread"]
+            older_cursor = raw.get("oldest_cursor") if raw.get("has_older", True) else None
+            thread = extract_direct_thread(raw)
+            return thread, thread.messages, older_cursor
+
+    return PagingClient()
+
+
+class SerializedClient:
+    """
+    Lets one thread at a time use the client. instagrapi keeps per-request state
+    on the client (headers, last_json), so the inbox mirror's sync thread and a
+    tool call running at the same time could read each other's responses.
+    """
+    def __init__(self, client):
+        object.__setattr__(self, "_client", client)
+        object.__setattr__(self, "_lock", threading.RLock())
+
+    def __getattr__(self, name):
+        value = getattr(self._client, name)
+        if not callable(value) or name.startswith("_"):
+            return value
+        def locked(*args, **kwargs):
+            with self._lock:
+                return value(*args, **kwargs)
+        return locked
+
+    def __setattr__(self, name, value):
+        setattr(self._client, name, value)
+
+
+# The Instagram client (or the fake backend), set up in __main__
+client = None
+
+# Tool functions, registered with FastMCP in __main__
+TOOLS = []
+
+
+def tool(func):
+    TOOLS.append(func)
+    return func
+
+
+# Per-tool and per-Instagram-call metrics, read with the server_stats tool
+STATS = ServerStats()
+
+# Local SQLite copy of the inbox, enabled with --mirror. Read tools answer from
+# it while it is fresh and fall back to Instagram otherwise.
+mirror: Optional[InboxMirror] = None
+
+
+def mirror_ready() -> bool:
+    return mirror is not None and mirror.is_fresh()
 
-mcp_server = FastMCP(
-   name="Instagram DMs",
-   instructions=INSTRUCTIONS
-)
 
+def as_dict(obj):
+    """Converts an instagrapi object (or an already-plain dict) for the tool response."""
+    if isinstance(obj, dict):
+        return obj
+    return obj.dict() if hasattr(obj, 'dict') else str(obj)
 
-@mcp_server.tool()
+def encode_cursor(thread_id, page_cursor, before_id):
+    """
+    Opaque cursor for the messages older than before_id. page_cursor is the
+    Instagram cursor of the page that contains them (None: start from the newest).
+    """
+    data = json.dumps({"thread_id": str(thread_id), "page": page_cursor, "before": str(before_id)})
+    return base64.urlsafe_b64encode(data.encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor, thread_id):
+    try:
+        data = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    except ValueError:
+        raise ValueError("Invalid cursor.")
+    if data.get("thread_id") != str(thread_id):
+        raise ValueError("Cursor belongs to another thread.")
+    return data
+
+
+def message_id(message) -> str:
+    return str(as_dict(message).get("id"))
+
+
+def fetch_newer(thread_id, since_message_id, amount):
+    """
+    Pages through a thread from the newest message until since_message_id, growing the page size.
+    Returns (thread, messages newer than since_message_id, older_cursor, found).
+    older_cursor continues below the oldest returned message; found is False if
+    since_message_id was not reached within amount messages.
+    """
+    messages = []
+    page_cursor = None
+    sizes = iter(NEW_MESSAGE_PAGE_SIZES)
+    size = next(sizes)
+    while True:
+        thread, page, next_cursor = client.direct_thread_page(int(thread_id), page_cursor, size)
+        for message in page:
+            if message_id(message) == str(since_message_id):
+                return thread, messages, None, True
+            messages.append(message)
+            if len(messages) >= amount:
+                return thread, messages, encode_cursor(thread_id, page_cursor, message_id(message)), False
+        if not next_cursor:
+            return thread, messages, None, False
+        page_cursor = next_cursor
+        size = next(sizes, MAX_PAGE_SIZE)
+
+
+def fetch_older(thread_id, cursor, amount):
+    """
+    Returns (thread, up to amount messages older than the cursor's message, older_cursor).
+    Resumes on the cursor's page and skips what was already returned, so pages
+    of a different size than the caller's amount are handled.
+    """
+    page_cursor, before = cursor.get("page"), cursor["before"]
+    messages = []
+    passed_before = False
+    scanned = 0
+    while True:
+        thread, page, next_cursor = client.direct_thread_page(int(thread_id), page_cursor, MAX_PAGE_SIZE)
+        for message in page:
+            if not passed_before:
+                passed_before = message_id(message) == before
+                continue
+            messages.append(message)
+            if len(messages) >= amount:
+                return thread, messages, encode_cursor(thread_id, page_cursor, message_id(message))
+        scanned += 1
+        if not next_cursor:
+            return thread, messages, None
+        if not passed_before and scanned >= MAX_SCAN_PAGES:
+            raise ValueError("The cursor's message is no longer in the thread.")
+        page_cursor = next_cursor
+
+
+def read_messages(thread_id, amount, since_message_id=None, cursor=None):
+    """
+    Shared by list_messages and get_thread_details when a since_message_id or cursor is given.
+    Returns (thread or None, result dict without the thread).
+    """
+    amount = max(1, min(amount, MAX_AMOUNT))
+    if cursor:
+        position = decode_cursor(cursor, thread_id)
+        if mirror_ready():
+            messages = mirror.messages_before(thread_id, position["before"], amount)
+            if messages is not None:
+                older = encode_cursor(thread_id, position.get("page"), messages[-1]["id"]) if len(messages) == amount else None
+                return None, {"success": True, "messages": messages, "older_cursor": older}
+        thread, messages, older = fetch_older(thread_id, position, amount)
+        if mirror is not None:
+            mirror.store_messages(thread_id, messages, complete=older is None)
+        return thread, {"success": True, "messages": [as_dict(m) for m in messages], "older_cursor": older}
+
+    if mirror_ready():
+        messages = mirror.messages_since(thread_id, since_message_id, amount)
+        if messages is not None:
+            return None, {"success": True, "messages": messages, "gap": False,
+                          "newest_message_id": messages[0]["id"] if messages else str(since_message_id)}
+    thread, messages, older, found = fetch_newer(thread_id, since_message_id, amount)
+    if mirror is not None:
+        mirror.store_messages(thread_id, messages)
+    return thread, {
+        "success": True,
+        "messages": [as_dict(m) for m in messages],
+        "newest_message_id": message_id(messages[0]) if messages else str(since_message_id),
+        # More new messages than amount: page the rest with older_cursor until since_message_id
+        "gap": not found and older is not None,
+        "older_cursor": older,
+    }
+
+
+@tool
+@STATS.track
 def send_message(username: str, message: str) -> Dict[str, Any]:
     """Send an Instagram direct message to a user by username.
 
@@ -24,7 +226,8 @@ def send_message(username: str, message: str) -> Dict[str, Any]:
         username: Instagram username of the recipient.
         message: The message text to send.
     Returns:
-        A dictionary with success status and a status message.
+        A dictionary with success status and a status message, plus the sent message's
+        direct_message_id and thread_id and the recipient's user_id.
     """
     if not username or not message:
         return {"success": False, "message": "Username and message must be provided."}
@@ -35,14 +238,47 @@ def send_message(username: str, message: str) -> Dict[str, Any]:
         # Convert user_id to int as required by instagrapi direct_send method
         dm = client.direct_send(message, [int(user_id)])
         if dm:
-            return {"success": True, "message": "Message sent to user.", "direct_message_id": getattr(dm, 'id', None)}
+            return {"success": True, "message": "Message sent to user.", "direct_message_id": getattr(dm, 'id', None),
+                    "thread_id": getattr(dm, 'thread_id', None), "user_id": str(user_id)}
         else:
             return {"success": False, "message": "Failed to send message."}
     except Exception as e:
         return {"success": False, "message": str(e)}
 
 
-@mcp_server.tool()
+@tool
+@STATS.track
+def send_photo(username: str, image_path: str) -> Dict[str, Any]:
+    """Send an image (e.g. a goal card) as an Instagram direct message to a user by username.
+
+    Args:
+        username: Instagram username of the recipient.
+        image_path: Path of a JPEG/PNG file in the server's card directory (CARD_DIR).
+    Returns:
+        A dictionary with success status and a status message.
+    """
+    if not username or not image_path:
+        return {"success": False, "message": "Username and image path must be provided."}
+    path = Path(image_path).resolve()
+    if not path.is_relative_to(CARD_DIR):
+        return {"success": False, "message": f"Image '{image_path}' is outside the card directory."}
+    if not path.is_file():
+        return {"success": False, "message": f"Image '{image_path}' not found."}
+    try:
+        user_id = client.user_id_from_username(username)
+        if not user_id:
+            return {"success": False, "message": f"User '{username}' not found."}
+        dm = client.direct_send_photo(path, [int(user_id)])
+        if dm:
+            return {"success": True, "message": "Photo sent to user.", "direct_message_id": getattr(dm, 'id', None)}
+        else:
+            return {"success": False, "message": "Failed to send photo."}
+    except Exception as e:
+        return {"success": False, "message": str(e)}
+
+
+@tool
+@STATS.track
 def list_chats(
     amount: int = 20,
     selected_filter: str = "",
@@ -85,9 +321,15 @@ def list_chats(
         return {field: t.get(field) for field in fields}
 
     try:
-        threads = client.direct_threads(amount, selected_filter, thread_message_limit)
+        if mirror_ready() and not selected_filter and mirror.thread_count() >= amount:
+            threads = mirror.list_threads(amount, thread_message_limit)
+        else:
+            threads = client.direct_threads(amount, selected_filter, thread_message_limit)
+            if mirror is not None:
+                for t in threads:
+                    mirror.store_thread(t)
         if full:
-            return {"success": True, "threads": [t.dict() if hasattr(t, 'dict') else str(t) for t in threads]}
+            return {"success": True, "threads": [as_dict(t) for t in threads]}
         elif fields:
             return {"success": True, "threads": [filter_fields(t, fields) for t in threads]}
         else:
@@ -96,27 +338,52 @@ def list_chats(
         return {"success": False, "message": str(e)}
 
 
-@mcp_server.tool()
-def list_messages(thread_id: str, amount: int = 20) -> Dict[str, Any]:
-    """Get messages from a specific Instagram Direct Message thread by thread ID, with an optional limit.
+@tool
+@STATS.track
+def list_messages(
+    thread_id: str,
+    amount: int = 20,
+    since_message_id: Optional[str] = None,
+    cursor: Optional[str] = None,
+) -> Dict[str, Any]:
+    """Get messages from a specific Instagram Direct Message thread by thread ID, newest first, with an optional limit.
+
+    To follow a conversation, pass the newest_message_id of the previous call as since_message_id:
+    only newer messages are returned. To read older history in chunks of amount, pass the
+    older_cursor of the previous call as cursor.
 
     Args:
         thread_id: The thread ID to fetch messages from.
-        amount: Number of messages to fetch (default 20).
+        amount: Number of messages to fetch (default 20, at most 100).
+        since_message_id: If given, return only messages newer than this message.
+        cursor: If given, return the messages before this older_cursor from a previous call.
     Returns:
-        A dictionary with success status and the list of messages or error message.
+        A dictionary with success status and the list of messages or error message. With
+        since_message_id or cursor it also has newest_message_id / older_cursor (None when the
+        start of the thread is reached) and "gap" (more new messages than amount: page the
+        rest with older_cursor).
     """
     if not thread_id:
         return {"success": False, "message": "Thread ID must be provided."}
     try:
+        if since_message_id or cursor:
+            _, result = read_messages(thread_id, amount, since_message_id, cursor)
+            return result
+        if mirror_ready():
+            messages = mirror.list_messages(thread_id, amount)
+            if messages is not None:
+                return {"success": True, "messages": messages}
         # Convert thread_id to int as required by instagrapi direct_messages method
         messages = client.direct_messages(int(thread_id), amount)
-        return {"success": True, "messages": [m.dict() if hasattr(m, 'dict') else str(m) for m in messages]}
+        if mirror is not None:
+            mirror.store_messages(thread_id, messages, complete=len(messages) < amount)
+        return {"success": True, "messages": [as_dict(m) for m in messages]}
     except Exception as e:
         return {"success": False, "message": str(e)}
 
 
-@mcp_server.tool()
+@tool
+@STATS.track
 def list_pending_chats(amount: int = 20) -> Dict[str, Any]:
     """Get Instagram Direct Message threads (chats) from the user's pending inbox.
 
@@ -132,7 +399,8 @@ def list_pending_chats(amount: int = 20) -> Dict[str, Any]:
         return {"success": False, "message": str(e)}
 
 
-@mcp_server.tool()
+@tool
+@STATS.track
 def search_threads(query: str) -> Dict[str, Any]:
     """Search Instagram Direct Message threads by username or keyword.
 
@@ -144,13 +412,19 @@ def search_threads(query: str) -> Dict[str, Any]:
     if not query:
         return {"success": False, "message": "Query must be provided."}
     try:
+        if mirror_ready():
+            # Full-text search over mirrored message text and participant names
+            results = mirror.search(query)
+            if results:
+                return {"success": True, "results": results}
         results = client.direct_search(query)
         return {"success": True, "results": [r.dict() if hasattr(r, 'dict') else str(r) for r in results]}
     except Exception as e:
         return {"success": False, "message": str(e)}
 
 
-@mcp_server.tool()
+@tool
+@STATS.track
 def get_thread_by_participants(user_ids: List[int]) -> Dict[str, Any]:
     """Get an Instagram Direct Message thread by participant user IDs.
 
@@ -168,27 +442,54 @@ def get_thread_by_participants(user_ids: List[int]) -> Dict[str, Any]:
         return {"success": False, "message": str(e)}
 
 
-@mcp_server.tool()
-def get_thread_details(thread_id: str, amount: int = 20) -> Dict[str, Any]:
+@tool
+@STATS.track
+def get_thread_details(
+    thread_id: str,
+    amount: int = 20,
+    since_message_id: Optional[str] = None,
+    cursor: Optional[str] = None,
+) -> Dict[str, Any]:
     """Get details and messages for a specific Instagram Direct Message thread by thread ID, with an optional message limit.
 
+    since_message_id and cursor work as in list_messages: only messages newer than
+    since_message_id, or the next chunk of older history before cursor.
+
     Args:
         thread_id: The thread ID to fetch details for.
         amount: Number of messages to fetch (default 20).
+        since_message_id: If given, include only messages newer than this message.
+        cursor: If given, include the messages before this older_cursor from a previous call.
     Returns:
         A dictionary with success status and the thread details or error message.
     """
     if not thread_id:
         return {"success": False, "message": "Thread ID must be provided."}
     try:
+        if since_message_id or cursor:
+            thread, result = read_messages(thread_id, amount, since_message_id, cursor)
+            if thread is None:
+                thread = mirror.get_thread(thread_id, 0) if mirror is not None else None
+            if thread is None:
+                thread, _, _ = client.direct_thread_page(int(thread_id), None, 1)
+            details = {k: v for k, v in as_dict(thread).items() if k != "messages"}
+            details["messages"] = result.pop("messages")
+            return {**result, "thread": details}
+        if mirror_ready():
+            thread = mirror.get_thread(thread_id, amount)
+            if thread is not None:
+                return {"success": True, "thread": thread}
         # Convert thread_id to int as required by instagrapi direct_thread method
         thread = client.direct_thread(int(thread_id), amount)
-        return {"success": True, "thread": thread.dict() if hasattr(thread, 'dict') else str(thread)}
+        if mirror is not None:
+            mirror.store_thread(thread)
+        return {"success": True, "thread": as_dict(thread)}
     except Exception as e:
         return {"success": False, "message": str(e)}
 
 
-@mcp_server.tool()
+@tool
+@STATS.track
 def get_user_id_from_username(username: str) -> Dict[str, Any]:
     """Get the Instagram user ID for a given username.
 
@@ -209,7 +510,8 @@ def get_user_id_from_username(username: str) -> Dict[str, Any]:
         return {"success": False, "message": str(e)}
 
 
-@mcp_server.tool()
+@tool
+@STATS.track
 def get_username_from_user_id(user_id: str) -> Dict[str, Any]:
     """Get the Instagram username for a given user ID.
 
@@ -230,20 +532,81 @@ def get_username_from_user_id(user_id: str) -> Dict[str, Any]:
         return {"success": False, "message": str(e)}
 
 
+@tool
+def server_stats(reset: bool = False, top: int = 20) -> Dict[str, Any]:
+    """Get the server's own metrics: per-tool call counts, errors, latency percentiles, payload sizes
+    (while profiling), Instagram call counts/errors (also per tool), and the CPU/allocation profiles if profiling is on.
+
+    Args:
+        reset: If True, clear the counters after reading them.
+        top: Number of entries in the profile listings (default 20).
+    Returns:
+        A dictionary with success status and the stats.
+    """
+    stats = STATS.report(top)
+    if reset:
+        STATS.reset()
+    return {"success": True, "stats": stats}
+
+
+@tool
+def set_profiling(cpu: Optional[bool] = None, allocations: Optional[bool] = None) -> Dict[str, Any]:
+    """Switch the sampling CPU profiler and/or allocation tracing on or off while the server runs.
+    Results appear in server_stats. Both add overhead, so switch them off when done.
+
+    Args:
+        cpu: True to start the CPU sampler (clears its previous results), False to stop it.
+        allocations: True to start tracing allocations (tracemalloc), False to stop.
+    Returns:
+        A dictionary with success status and the current profiling state.
+    """
+    STATS.set_profiling(cpu=cpu, allocations=allocations)
+    return {"success": True, "cpu": STATS.profiler.running, "allocations": STATS.allocation_report(0)["running"]}
+
+
 if __name__ == "__main__":
    parser = argparse.ArgumentParser()
    parser.add_argument("--username", type=str, required=True)
    parser.add_argument("--password", type=str, required=True)
+   parser.add_argument("--mirror", action="store_true", help="Keep a local SQLite mirror of the inbox for fast reads.")
+   parser.add_argument("--fake-backend", action="store_true",
+                       help="Use an in-memory fake Instagram (no login, nothing is sent). For load tests.")
+   parser.add_argument("--fake-latency", type=float, default=0.05, help="Fake backend send latency in seconds.")
+   parser.add_argument("--fake-error-rate", type=float, default=0.0, help="Fake backend send failure rate (0-1).")
+   parser.add_argument("--profile", action="store_true",
+                       help="Start with CPU sampling and allocation tracing on (see the set_profiling tool).")
    args = parser.parse_args()
 
-   # CRITICAL FIX: Re-added session file handling
-   # Without this, Instagram login hangs due to rate limiting and security measures
-   # Session files allow Instagram to recognize the client and avoid fresh authentication
-   # This was the root cause of the MCP server hanging after "🚀 Attempting to send DM"
-   SESSION_FILE = Path(f"{args.username}_session.json")
-   if SESSION_FILE.exists():
-       client.load_settings(SESSION_FILE)
-   client.login(args.username, args.password)
-   client.dump_settings(SESSION_FILE)
-
+   from fastmcp import FastMCP
+
+   if args.fake_backend:
+       from fake_instagram import FakeInstagramClient
+       client = FakeInstagramClient(latency=args.fake_latency, error_rate=args.fake_error_rate)
+   else:
+       # CRITICAL FIX: Re-added session file handling
+       # Without this, Instagram login hangs due to rate limiting and security measures
+       # Session files allow Instagram to recognize the client and avoid fresh authentication
+       # This was the root cause of the MCP server hanging after "🚀 Attempting to send DM"
+       client = create_client()
+       SESSION_FILE = Path(f"{args.username}_session.json")
+       if SESSION_FILE.exists():
+           client.load_settings(SESSION_FILE)
+       client.login(args.username, args.password)
+       client.dump_settings(SESSION_FILE)
+
+   # Count and time every Instagram call the tools (and the mirror) make, one call at a time
+   client = SerializedClient(STATS.instrument(client))
+   if args.profile:
+       STATS.set_profiling(cpu=True, allocations=True)
+
+   if args.mirror:
+       mirror = InboxMirror(client, f"{args.username}_inbox.db")
+       mirror.start()
+
+   mcp_server = FastMCP(
+      name="Instagram DMs",
+      instructions=INSTRUCTIONS
+   )
+   for func in TOOLS:
+      mcp_server.tool()(func)
    mcp_server.run(transport="stdio")
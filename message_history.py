@@ -0,0 +1,103 @@
+# message_history.py
+
+"""
+Per-recipient Message History
+Remembers fingerprints of the messages recently sent to each fan page so the
+same (or almost the same) banter is not sent twice.
+- Fingerprints are 64-bit SimHashes of the normalized message text, so numbers,
+  emojis and punctuation changes do not make a repeat look new.
+- Entries older than the time-to-live are evicted.
+- The history is persisted to a JSON file so it survives restarts.
+"""
+
+import hashlib
+import json
+import os
+import re
+import threading
+
+import clock
+
+HISTORY_FILE = os.getenv("MESSAGE_HISTORY_FILE", "message_history.json")
+HISTORY_TTL_SECONDS = 7 * 24 * 60 * 60   # Forget messages after a week
+MAX_ENTRIES_PER_RECIPIENT = 200
+NEAR_DUPLICATE_BITS = 6                  # Max differing SimHash bits to count as a repeat
+
+
+def _normalize(text):
+    """Lowercases, masks digits and drops everything that is not a word."""
+    text = text.lower()
+    text = re.sub(r"\d+", "#", text)
+    return re.findall(r"[a-z#']+", text)
+
+
+def fingerprint(text):
+    """Returns a 64-bit SimHash of the message, built from word bigrams."""
+    words = _normalize(text)
+    shingles = [" ".join(words[i:i + 2]) for i in range(max(1, len(words) - 1))]
+    weights = [0] * 64
+    for shingle in shingles:
+        h = int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest(), "big")
+        for bit in range(64):
+            weights[bit] += 1 if h >> bit & 1 else -1
+    value = 0
+    for bit in range(64):
+        if weights[bit] > 0:
+            value |= 1 << bit
+    return value
+
+
+def _hamming(a, b):
+    return bin(a ^ b).count("1")
+
+
+class MessageHistory:
+    def __init__(self, path=HISTORY_FILE, ttl_seconds=HISTORY_TTL_SECONDS):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.entries = {}   # recipient -> list of [timestamp, fingerprint]
+        self._lock = threading.Lock()  # Fan-out workers share one history
+        self._load()
+
+    def _load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r") as f:
+                self.entries = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"  - Warning: Could not read message history ({e}). Starting fresh.")
+            self.entries = {}
+
+    def _save(self):
+        if not self.path:
+            return
+        try:
+            with open(self.path, "w") as f:
+                json.dump(self.entries, f)
+        except OSError as e:
+            print(f"  - Warning: Could not save message history: {e}")
+
+    def _evict(self, recipient):
+        cutoff = clock.now() - self.ttl_seconds
+        kept = [e for e in self.entries.get(recipient, []) if e[0] >= cutoff]
+        kept = kept[-MAX_ENTRIES_PER_RECIPIENT:]
+        if kept:
+            self.entries[recipient] = kept
+        else:
+            self.entries.pop(recipient, None)
+
+    def is_near_duplicate(self, recipient, message):
+        """True if a message like this one was sent to the recipient recently."""
+        fp = fingerprint(message)
+        with self._lock:
+            self._evict(recipient)
+            return any(_hamming(fp, old_fp) <= NEAR_DUPLICATE_BITS for _, old_fp in self.entries.get(recipient, []))
+
+    def record(self, recipient, message):
+        """Remembers a message that was sent to the recipient."""
+        fp = fingerprint(message)
+        with self._lock:
+            self._evict(recipient)
+            self.entries.setdefault(recipient, []).append([clock.now(), fp])
+            self._save()
@@ -0,0 +1,224 @@
+# quota_manager.py
+
+"""
+API-Football Quota Manager
+Tracks the daily and per-minute request budget reported by API-Football and
+decides how often each tracked entity can be polled.
+- The daily budget is read from the 'x-ratelimit-requests-*' response headers.
+- The per-minute budget is read from the 'X-RateLimit-*' response headers.
+- Entities are polled in proportion to their priority weight (live > derby > normal).
+- 429 responses trigger an exponential backoff.
+"""
+
+from datetime import datetime, timedelta, timezone
+
+import clock
+
+# Relative polling weight for each priority class.
+PRIORITY_WEIGHTS = {
+    "live": 4,    # An entity whose count changed recently (a match is probably on)
+    "derby": 2,   # Rivalries marked as derbies in rivals.py
+    "normal": 1,
+}
+
+# How long an entity stays "live" after its count last changed.
+LIVE_WINDOW_SECONDS = 3 * 60 * 60
+
+# Keep a few requests in reserve so we never hit the daily cap mid-derby.
+DAILY_RESERVE = 5
+
+MIN_POLL_INTERVAL = 60           # Never poll a single entity more often than this
+MAX_BACKOFF_SECONDS = 15 * 60
+
+
+def _seconds_until_utc_midnight(now=None):
+    """API-Football resets the daily quota at 00:00 UTC."""
+    now = now or datetime.fromtimestamp(clock.now(), timezone.utc)
+    tomorrow = (now + timedelta(days=1)).replace(hour=0, minute=0, second=0, microsecond=0)
+    return max(1.0, (tomorrow - now).total_seconds())
+
+
+def _utc_day():
+    return datetime.fromtimestamp(clock.now(), timezone.utc).date()
+
+
+def _int_header(headers, name):
+    value = headers.get(name)
+    try:
+        return int(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+class QuotaManager:
+    def __init__(self, daily_limit=100):
+        self.daily_limit = daily_limit
+        self.daily_remaining = daily_limit
+        self.minute_limit = None
+        self.minute_remaining = None
+        self.minute_window_start = clock.now()
+        self.requests_today = 0
+        self.day_started_at = clock.now()
+        self.quota_day = _utc_day()   # UTC day the daily counters belong to
+        self.backoff_until = 0.0
+        self.backoff_seconds = 0.0
+        self.last_polled = {}    # entity_id -> timestamp of the last poll
+        self.live_until = {}     # entity_id -> timestamp until which it counts as live
+
+    # --- Header / response bookkeeping ---
+
+    def update_from_response(self, response):
+        """Reads the rate-limit headers from an API-Football response."""
+        headers = response.headers
+        self.roll_day()
+
+        daily_limit = _int_header(headers, "x-ratelimit-requests-limit")
+        daily_remaining = _int_header(headers, "x-ratelimit-requests-remaining")
+        if daily_limit is not None:
+            self.daily_limit = daily_limit
+        if daily_remaining is None:
+            self.record_request()
+        else:
+            # A jump upwards means the quota was reset at midnight.
+            if daily_remaining > self.daily_remaining:
+                self.requests_today = max(0, self.daily_limit - daily_remaining)
+                self.day_started_at = clock.now()
+            else:
+                self.requests_today += 1
+            self.daily_remaining = daily_remaining
+
+        minute_limit = _int_header(headers, "X-RateLimit-Limit")
+        minute_remaining = _int_header(headers, "X-RateLimit-Remaining")
+        if minute_limit is not None:
+            self.minute_limit = minute_limit
+        if minute_remaining is not None:
+            self.minute_remaining = minute_remaining
+
+        if response.status_code == 429:
+            retry_after = _int_header(headers, "Retry-After")
+            self.on_rate_limited(retry_after)
+        else:
+            self.backoff_seconds = 0.0
+
+    def roll_day(self):
+        """
+        Resets the daily counters once the UTC day changes. Without this an
+        exhausted budget would never recover: no request is sent, so no
+        response headers arrive to report the reset.
+        """
+        today = _utc_day()
+        if today == self.quota_day:
+            return
+        self.quota_day = today
+        self.daily_remaining = self.daily_limit
+        self.requests_today = 0
+        self.day_started_at = clock.now()
+
+    def record_request(self):
+        """Counts a request locally when the response carries no quota headers."""
+        self.roll_day()
+        self.requests_today += 1
+        self.daily_remaining = max(0, self.daily_remaining - 1)
+        if self.minute_remaining is not None:
+            self.minute_remaining = max(0, self.minute_remaining - 1)
+
+    def on_rate_limited(self, retry_after=None):
+        """Exponential backoff after a 429, honouring Retry-After when given."""
+        self.backoff_seconds = min(MAX_BACKOFF_SECONDS, max(30.0, self.backoff_seconds * 2))
+        delay = max(self.backoff_seconds, retry_after or 0)
+        self.backoff_until = clock.now() + delay
+        print(f"  - Rate limited by API-Football. Backing off for {delay:.0f}s.")
+
+    # --- Scheduling ---
+
+    def wait_for_slot(self):
+        """Blocks until a request may be sent without breaking the per-minute limit."""
+        now = clock.now()
+        if now < self.backoff_until:
+            clock.sleep(self.backoff_until - now)
+
+        if self.minute_remaining is not None and self.minute_remaining <= 0:
+            # Wait for the per-minute window to roll over.
+            elapsed = clock.now() - self.minute_window_start
+            wait = max(1.0, 60 - elapsed)
+            print(f"  - Per-minute API limit reached. Waiting {wait:.0f}s.")
+            clock.sleep(wait)
+            self.minute_window_start = clock.now()
+            self.minute_remaining = self.minute_limit
+
+    def can_spend(self):
+        """True while there is daily budget left above the reserve."""
+        self.roll_day()
+        return self.daily_remaining > DAILY_RESERVE
+
+    def mark_live(self, entity_id):
+        """Boosts an entity's priority after its count changed."""
+        self.live_until[entity_id] = clock.now() + LIVE_WINDOW_SECONDS
+
+    def priority_of(self, entity_id, base_priority="normal"):
+        if self.live_until.get(entity_id, 0) > clock.now():
+            return "live"
+        return base_priority if base_priority in PRIORITY_WEIGHTS else "normal"
+
+    def poll_interval(self, entity_id, base_priority, all_entities):
+        """
+        Seconds between polls for one entity.
+        The remaining daily budget is spread over the rest of the day, weighted
+        by the priority of every tracked entity.
+        all_entities is a list of (entity_id, base_priority) tuples.
+        """
+        spendable = max(1, self.daily_remaining - DAILY_RESERVE)
+        seconds_left = _seconds_until_utc_midnight()
+
+        total_weight = sum(PRIORITY_WEIGHTS[self.priority_of(eid, prio)] for eid, prio in all_entities) or 1
+        weight = PRIORITY_WEIGHTS[self.priority_of(entity_id, base_priority)]
+
+        polls_for_entity = spendable * weight / total_weight
+        return max(MIN_POLL_INTERVAL, seconds_left / polls_for_entity)
+
+    def is_due(self, entity_id, base_priority, all_entities):
+        """True if the entity should be polled in this cycle."""
+        if not self.can_spend():
+            return False
+        last = self.last_polled.get(entity_id)
+        if last is None:
+            return True
+        return clock.now() - last >= self.poll_interval(entity_id, base_priority, all_entities)
+
+    def mark_polled(self, entity_id):
+        self.last_polled[entity_id] = clock.now()
+
+    def next_cycle_delay(self, all_entities):
+        """Seconds until the next entity becomes due."""
+        if not self.can_spend():
+            return _seconds_until_utc_midnight()
+        now = clock.now()
+        delays = []
+        for entity_id, priority in all_entities:
+            last = self.last_polled.get(entity_id)
+            if last is None:
+                return MIN_POLL_INTERVAL
+            delays.append(last + self.poll_interval(entity_id, priority, all_entities) - now)
+        delay = min(delays) if delays else MIN_POLL_INTERVAL
+        return max(MIN_POLL_INTERVAL, delay, self.backoff_until - now)
+
+    # --- Reporting ---
+
+    def predicted_exhaustion(self):
+        """Predicts when the daily quota runs out at the current consumption rate."""
+        elapsed = max(1.0, clock.now() - self.day_started_at)
+        if self.requests_today == 0:
+            return None
+        rate = self.requests_today / elapsed
+        seconds_to_empty = self.daily_remaining / rate
+        if seconds_to_empty >= _seconds_until_utc_midnight():
+            return None  # Budget lasts until the daily reset
+        return datetime.fromtimestamp(clock.now()) + timedelta(seconds=seconds_to_empty)
+
+    def report(self):
+        """Prints a one-line summary of the quota state."""
+        exhaustion = self.predicted_exhaustion()
+        exhaustion_str = exhaustion.strftime("%H:%M") if exhaustion else "after daily reset"
+        minute_str = f", {self.minute_remaining}/{self.minute_limit} this minute" if self.minute_limit else ""
+        print(f"  - API quota: {self.daily_remaining}/{self.daily_limit} left today{minute_str}. "
+              f"Predicted exhaustion: {exhaustion_str}")
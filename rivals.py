@@ -7,10 +7,26 @@ This file defines the rivalries and their target recipients.
 - 'name' is the player's name for display.
 - 'rival_name' is the name of their rival.
 - 'fan_instagram_username' is who gets the DM when this player scores.
+- 'priority' (optional) is "derby" for rivalries that deserve more frequent polling.
+- 'league' (teams only, optional) is the API-Football league ID whose standings
+  hold the team's wins. Defaults to the Premier League (39).
+- 'colors' (optional) is a pair of hex colours for the image card, e.g. ["#6CABDD", "#DA291C"].
+- 'source' (optional) is "push" for entities whose events are pushed to the
+  ingestion endpoint (event_ingest.py) only; they are never polled.
+
+The list below is the built-in default. If RIVALRIES_FILE (rivals.json by default)
+exists, its JSON list of rivalries is used instead, and reload_rivalries() picks
+up edits to it while the scraper is running.
 """
 
+import json
+import os
+
+RIVALRIES_FILE = os.getenv("RIVALRIES_FILE", "rivals.json")
+DEFAULT_LEAGUE = "39"  # Premier League
+
 # Rivalry configurations
-RIVALRIES = [
+DEFAULT_RIVALRIES = [
     # Individual player rivalries
     {
         "id": "85",  # Ronaldo
@@ -36,7 +52,10 @@ RIVALRIES = [
         "type": "team",
         "rival_name": "Manchester United", 
         "supported_team": "Manchester United",  # This is who we support/motivate for
-        "target_username": "manutd_fans_official"  # Fan page gets notified when Man United wins
+        "target_username": "manutd_fans_official",  # Fan page gets notified when Man United wins
+        "league": "39",
+        "colors": ["#6CABDD", "#DA291C"],
+        "priority": "derby"
     },
     {
         "id": "33",  # Manchester United
@@ -44,10 +63,74 @@ RIVALRIES = [
         "type": "team",
         "rival_name": "Manchester City",
         "supported_team": "Manchester City",  # This is who we support/motivate for
-        "target_username": "mancity_supporters_official"  # Fan page gets notified when Man City wins
+        "target_username": "mancity_supporters_official",  # Fan page gets notified when Man City wins
+        "league": "39",
+        "colors": ["#DA291C", "#6CABDD"],
+        "priority": "derby"
     }
 ]
 
+# The live configuration. Always mutated in place so that modules which did
+# `from rivals import RIVALRIES` see reloads.
+RIVALRIES = list(DEFAULT_RIVALRIES)
+_loaded_mtime = None
+
+# Keys the scraper reads from every rivalry; a reloaded file missing one is rejected
+REQUIRED_KEYS = ("id", "name", "type", "rival_name", "target_username")
+
+def _read_rivalries_file(path):
+    with open(path, "r") as f:
+        rivalries = json.load(f)
+    if not isinstance(rivalries, list):
+        raise ValueError("expected a list of rivalries")
+    for rivalry in rivalries:
+        if not isinstance(rivalry, dict):
+            raise ValueError(f"expected a rivalry object, got {rivalry!r}")
+        missing = [key for key in REQUIRED_KEYS if not rivalry.get(key)]
+        if missing:
+            raise ValueError(f"Rivalry {rivalry.get('id', rivalry.get('name', '?'))} is missing {', '.join(missing)}")
+        rivalry["id"] = str(rivalry["id"])
+        if "league" in rivalry:
+            rivalry["league"] = str(rivalry["league"])
+        if rivalry.get("type") not in ("player", "team"):
+            raise ValueError(f"Rivalry {rivalry['id']} has invalid type {rivalry.get('type')!r}")
+    return rivalries
+
+def reload_rivalries(path=None):
+    """
+    Re-reads the rivalry config file if it changed since the last load.
+    Returns (added, removed): lists of rivalry dicts that appeared or disappeared.
+    Rivalries whose ID stays the same are updated in place.
+    A broken file is reported and ignored, keeping the current configuration.
+    """
+    global _loaded_mtime
+    path = path or RIVALRIES_FILE
+    if not os.path.exists(path):
+        if _loaded_mtime is not None:
+            print(f"  - Warning: {path} was removed. Keeping current rivalries.")
+            _loaded_mtime = None
+        return [], []
+    mtime = os.path.getmtime(path)
+    if mtime == _loaded_mtime:
+        return [], []
+    try:
+        new_rivalries = _read_rivalries_file(path)
+    except (OSError, ValueError, KeyError) as e:
+        print(f"  - Warning: Could not load {path}: {e}. Keeping current rivalries.")
+        _loaded_mtime = mtime
+        return [], []
+    _loaded_mtime = mtime
+
+    old_ids = {r["id"] for r in RIVALRIES}
+    new_ids = {r["id"] for r in new_rivalries}
+    added = [r for r in new_rivalries if r["id"] not in old_ids]
+    removed = [r for r in RIVALRIES if r["id"] not in new_ids]
+    RIVALRIES[:] = new_rivalries
+    return added, removed
+
+# Use the external config from the start if there is one
+reload_rivalries()
+
 # Helper function to find rivalry by ID
 def find_rivalry(entity_id):
     """Find rivalry configuration by player or team ID."""
@@ -70,6 +153,14 @@ def get_rival_name(entity_id):
         return None
     return rivalry.get("rival_name")
 
+def get_rival_id(entity_id):
+    """Returns the ID of the rival, if the rival is tracked as well."""
+    rival_name = get_rival_name(entity_id)
+    for rivalry in RIVALRIES:
+        if rivalry["name"] == rival_name:
+            return rivalry["id"]
+    return None
+
 def get_supported_entity(entity_id):
     """Returns who the fan supports (used for motivation messages)."""
     rivalry = find_rivalry(entity_id)
@@ -81,6 +172,27 @@ def get_supported_entity(entity_id):
     else:  # team
         return rivalry.get("supported_team")
 
+def get_priority(entity_id):
+    """Returns the polling priority class for a given player or team."""
+    rivalry = find_rivalry(entity_id)
+    if not rivalry:
+        return "normal"
+    return rivalry.get("priority", "normal")
+
+def get_league(entity_id):
+    """Returns the league ID whose standings are used for a team's wins."""
+    rivalry = find_rivalry(entity_id)
+    if not rivalry:
+        return DEFAULT_LEAGUE
+    return rivalry.get("league", DEFAULT_LEAGUE)
+
+def get_source(entity_id):
+    """Returns where a player or team's events come from: "poll" (API-Football) or "push"."""
+    rivalry = find_rivalry(entity_id)
+    if not rivalry:
+        return "poll"
+    return rivalry.get("source", "poll")
+
 def is_player(entity_id):
     """Check if the entity is a player."""
     rivalry = find_rivalry(entity_id)
@@ -0,0 +1,188 @@
+# season_stats.py
+
+"""
+Season Stats Store
+Compact, array-backed history of every tracked entity's season total, one
+column per day of the season, filled from the API responses goal_scraper
+already fetches.
+- series[row, day] holds the cumulative goals (players) or wins (teams) seen on
+  that day; days without an observation are forward-filled.
+- played[row, day] holds the cumulative matches played from the same
+  responses, so each entity's own matchdays are known.
+- compute() derives rivalry deltas, scoring/winning streaks and leaderboards
+  for all entities in one vectorized NumPy pass per poll cycle, so richer
+  banter costs no extra API calls.
+"""
+
+import threading
+
+import numpy as np
+
+import clock
+
+SEASON_DAYS = 400   # A season fits comfortably, including pre-season friendlies
+
+
+class SeasonStats:
+    def __init__(self, season_start, capacity=16):
+        self.season_start = season_start
+        self.index = {}           # entity_id -> row
+        self.ids = []             # row -> entity_id
+        self.types = []           # row -> "player" / "team"
+        self.series = np.zeros((capacity, SEASON_DAYS), dtype=np.int32)
+        self.observed = np.zeros((capacity, SEASON_DAYS), dtype=bool)
+        self.played = np.zeros((capacity, SEASON_DAYS), dtype=np.int32)   # 0 where unknown
+        self.lock = threading.Lock()   # Pushed events are recorded from another thread
+
+    def _row(self, entity_id, entity_type):
+        row = self.index.get(entity_id)
+        if row is not None:
+            return row
+        row = len(self.ids)
+        if row == self.series.shape[0]:
+            # Double the capacity, like a list would
+            self.series = np.vstack([self.series, np.zeros_like(self.series)])
+            self.observed = np.vstack([self.observed, np.zeros_like(self.observed)])
+            self.played = np.vstack([self.played, np.zeros_like(self.played)])
+        self.index[entity_id] = row
+        self.ids.append(entity_id)
+        self.types.append(entity_type)
+        return row
+
+    def _day(self, when=None):
+        day = ((when or clock.today()) - self.season_start).days
+        return min(max(day, 0), SEASON_DAYS - 1)
+
+    def record(self, entity_id, entity_type, count, when=None, played=None):
+        """
+        Stores the season total seen for an entity on a given day (today by default),
+        and the matches it has played so far when the response says.
+        """
+        with self.lock:
+            row = self._row(entity_id, entity_type)
+            day = self._day(when)
+            self.series[row, day] = count
+            self.observed[row, day] = True
+            if played is not None:
+                self.played[row, day] = played
+
+    def forget(self, entity_id):
+        """Drops an entity's history, e.g. when its rivalry is removed. The last row moves into its place."""
+        with self.lock:
+            row = self.index.pop(entity_id, None)
+            if row is None:
+                return
+            last = len(self.ids) - 1
+            if row != last:
+                moved = self.ids[last]
+                self.series[row] = self.series[last]
+                self.observed[row] = self.observed[last]
+                self.played[row] = self.played[last]
+                self.ids[row] = moved
+                self.types[row] = self.types[last]
+                self.index[moved] = row
+            self.series[last] = 0
+            self.observed[last] = False
+            self.played[last] = 0
+            self.ids.pop()
+            self.types.pop()
+
+    def compute(self, rival_pairs, when=None):
+        """
+        Computes context for every entity in one vectorized pass.
+        rival_pairs is a list of (entity_id, rival_entity_id) tuples.
+        Returns {entity_id: {"count", "rival_delta", "rival_id", "streak", "rank", "of", "last_7_days"}}.
+        """
+        with self.lock:
+            n = len(self.ids)
+            if n == 0:
+                return {}
+            today = self._day(when)
+            observed = self.observed[:n, :today + 1].copy()
+            values = np.where(observed, self.series[:n, :today + 1], 0)
+            played = self.played[:n, :today + 1].copy()
+            ids = list(self.ids)
+            types = np.array(self.types)
+            index = dict(self.index)
+
+        # Forward-fill: season totals never go down
+        filled = np.maximum.accumulate(values, axis=1)
+        current = filled[:, -1]
+        increments = np.diff(filled, axis=1, prepend=0)
+        # An entity's first observation is a baseline, not a new goal/win
+        seen_before = np.zeros_like(observed)
+        seen_before[:, 1:] = np.logical_or.accumulate(observed, axis=1)[:, :-1]
+        increments = np.where(seen_before, increments, 0)
+        last_7_days = increments[:, -7:].sum(axis=1)
+
+        # Each entity's own matchdays: days its matches played went up (a goal/win implies one too)
+        played_filled = np.maximum.accumulate(played, axis=1)
+        new_matches = np.diff(played_filled, axis=1, prepend=0) > 0
+        new_matches[:, 0] = False   # The first day's total is a baseline
+        first_match = np.argmax(played_filled > 0, axis=1)
+        new_matches[np.arange(n), first_match] = False
+        active = increments > 0
+        matchdays = new_matches | active
+        # Trailing run of matchdays with a goal/win: everything after the last matchday without one
+        misses = matchdays & ~active
+        days = misses.shape[1]
+        last_miss = np.where(misses.any(axis=1), days - 1 - np.argmax(misses[:, ::-1], axis=1), -1)
+        after_last_miss = np.arange(days) > last_miss[:, None]
+        streak = (active & after_last_miss).sum(axis=1)
+        # Without matches played there is no telling a blank matchday from a day off
+        streak = np.where(played_filled[:, -1] > 0, streak, 0)
+
+        rank = np.zeros(n, dtype=np.int32)
+        of = np.zeros(n, dtype=np.int32)
+        for entity_type in ("player", "team"):
+            rows = np.flatnonzero(types == entity_type)
+            if rows.size == 0:
+                continue
+            # Leaderboard position (1 = most goals/wins) within the type
+            order = np.argsort(-current[rows], kind="stable")
+            rank[rows[order]] = np.arange(1, rows.size + 1)
+            of[rows] = rows.size
+
+        rival_delta = {}
+        pairs = [(index[a], index[b]) for a, b in rival_pairs if a in index and b in index]
+        if pairs:
+            a_rows, b_rows = np.array(pairs).T
+            deltas = current[a_rows] - current[b_rows]
+            for a_row, b_row, delta in zip(a_rows, b_rows, deltas):
+                rival_delta[ids[a_row]] = (int(delta), ids[b_row])
+
+        context = {}
+        for row, entity_id in enumerate(ids):
+            delta, rival_id = rival_delta.get(entity_id, (None, None))
+            context[entity_id] = {
+                "count": int(current[row]),
+                "rival_delta": delta,
+                "rival_id": rival_id,
+                "streak": int(streak[row]),
+                "rank": int(rank[row]),
+                "of": int(of[row]),
+                "last_7_days": int(last_7_days[row]),
+            }
+        return context
+
+
+def describe(context, entity_type, rival_name=None):
+    """Turns one entity's computed context into a short phrase for the banter prompt."""
+    if not context:
+        return None
+    activity = "goals" if entity_type == "player" else "wins"
+    parts = []
+    delta = context.get("rival_delta")
+    if delta is not None and rival_name:
+        if delta > 0:
+            parts.append(f"now {delta} {activity} ahead of {rival_name}")
+        elif delta < 0:
+            parts.append(f"still {-delta} {activity} behind {rival_name}")
+        else:
+            parts.append(f"level with {rival_name} on {context['count']} {activity}")
+    if context.get("streak", 0) >= 2:
+        verb = "scored" if entity_type == "player" else "won"
+        parts.append(f"{verb} in {context['streak']} straight matchdays")
+    if context.get("of", 0) > 1:
+        parts.append(f"#{context['rank']} of {context['of']} tracked {'players' if entity_type == 'player' else 'teams'}")
+    return ", ".join(parts) or None
@@ -0,0 +1,272 @@
+# server_stats.py
+
+"""
+MCP Server Stats and Profiling
+In-process instrumentation for mcp_server.py, read through its server_stats tool.
+- Per tool: call count, errors and latency percentiles, plus response payload
+  sizes while profiling is on (measuring them serializes every response).
+- Per instagrapi method: call count, errors and latency, also broken down by
+  the tool that made the call (calls made outside a tool, e.g. by the inbox
+  mirror, count under "background").
+- A sampling CPU profiler (a thread that samples the server's stacks every few
+  milliseconds) and allocation tracing (tracemalloc) can be switched on and
+  off while the server is running.
+"""
+
+import functools
+import json
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter, deque
+
+LATENCY_SAMPLES = 1000      # Recent samples kept per tool for the percentiles
+SAMPLE_INTERVAL = 0.005     # Seconds between CPU profiler samples
+STACK_DEPTH = 8             # Frames kept per sampled stack
+
+
+def percentile(ordered, pct):
+    """Nearest-rank percentile of an already sorted list of numbers."""
+    if not ordered:
+        return 0.0
+    index = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+
+def _summary(samples):
+    ordered = sorted(samples)
+    return {
+        "p50": round(percentile(ordered, 50), 4),
+        "p95": round(percentile(ordered, 95), 4),
+        "p99": round(percentile(ordered, 99), 4),
+        "max": round(ordered[-1], 4) if ordered else 0.0,
+    }
+
+
+class _CallStats:
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.latencies = deque(maxlen=LATENCY_SAMPLES)
+        self.payload_bytes = deque(maxlen=LATENCY_SAMPLES)
+
+    def report(self):
+        report = {"calls": self.calls, "errors": self.errors, "latency_seconds": _summary(self.latencies)}
+        if self.payload_bytes:
+            report["payload_bytes"] = {**_summary(self.payload_bytes), "total": sum(self.payload_bytes)}
+        return report
+
+
+class SamplingProfiler:
+    """Samples every other thread's stack at a fixed interval and counts where time goes."""
+    def __init__(self, interval=SAMPLE_INTERVAL):
+        self.interval = interval
+        self.functions = Counter()   # "function (file:line)" -> samples it was on top
+        self.stacks = Counter()      # innermost-last stack -> samples
+        self.samples = 0
+        self.started_at = None
+        self.lock = threading.Lock()   # The counters are read by the server_stats tool while sampling
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        if self.running:
+            return
+        with self.lock:
+            self.functions.clear()
+            self.stacks.clear()
+            self.samples = 0
+        self.started_at = time.time()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name="cpu-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+
+    def _loop(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own:
+                    continue
+                stack = []
+                while frame is not None and len(stack) < STACK_DEPTH:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({code.co_filename.rsplit('/', 1)[-1]}:{frame.f_lineno})")
+                    frame = frame.f_back
+                # Idle threads waiting on locks/sockets would drown out real work
+                if stack and stack[0].startswith(("wait ", "select ", "_wait_for_tstate_lock ", "read ", "readline ")):
+                    continue
+                with self.lock:
+                    self.functions[stack[0]] += 1
+                    self.stacks[" <- ".join(stack)] += 1
+                    self.samples += 1
+
+    def report(self, top=20):
+        with self.lock:
+            samples = self.samples
+            functions = self.functions.most_common(top)
+            stacks = self.stacks.most_common(top)
+        return {
+            "running": self.running,
+            "seconds": round(time.time() - self.started_at, 1) if self.started_at else 0,
+            "samples": samples,
+            "top_functions": [{"where": k, "samples": v} for k, v in functions],
+            "top_stacks": [{"stack": k, "samples": v} for k, v in stacks],
+        }
+
+
+class ServerStats:
+    def __init__(self):
+        self.tools = {}              # tool name -> _CallStats
+        self.upstream = {}           # instagrapi method -> _CallStats
+        self.upstream_by_tool = {}   # tool name -> Counter of instagrapi methods
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.started_at = time.time()
+        self.profiler = SamplingProfiler()
+
+    def _stats(self, table, name):
+        stats = table.get(name)
+        if stats is None:
+            stats = table[name] = _CallStats()
+        return stats
+
+    def track(self, func):
+        """Decorator for tool functions: records latency and errors per call, and payload size while profiling."""
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            outer_tool = getattr(self.local, "tool", None)
+            self.local.tool = func.__name__
+            started = time.perf_counter()
+            failed = True
+            result = None
+            try:
+                result = func(*args, **kwargs)
+                failed = isinstance(result, dict) and result.get("success") is False
+                return result
+            finally:
+                elapsed = time.perf_counter() - started
+                self.local.tool = outer_tool
+                size = None
+                if self.profiling:
+                    size = len(json.dumps(result, default=str)) if result is not None else 0
+                with self.lock:
+                    stats = self._stats(self.tools, func.__name__)
+                    stats.calls += 1
+                    stats.errors += failed
+                    stats.latencies.append(elapsed)
+                    if size is not None:
+                        stats.payload_bytes.append(size)
+        return wrapper
+
+    @property
+    def profiling(self):
+        return self.profiler.running or tracemalloc.is_tracing()
+
+    def instrument(self, client):
+        """
+        Returns a proxy of an instagrapi client that counts and times every method call.
+        The client's raw HTTP request methods are wrapped as well, so one tool call
+        shows how many requests it really cost ("http:private_request", ...).
+        """
+        for name in ("private_request", "public_request"):
+            method = getattr(client, name, None)
+            if callable(method):
+                setattr(client, name, self._timed(f"http:{name}", method))
+        return _InstrumentedClient(client, self)
+
+    def _timed(self, name, method):
+        @functools.wraps(method)
+        def timed(*args, **kwargs):
+            started = time.perf_counter()
+            failed = True
+            try:
+                result = method(*args, **kwargs)
+                failed = False
+                return result
+            finally:
+                self.record_upstream(name, time.perf_counter() - started, failed)
+        return timed
+
+    def record_upstream(self, method, elapsed, failed):
+        tool = getattr(self.local, "tool", None) or "background"
+        with self.lock:
+            stats = self._stats(self.upstream, method)
+            stats.calls += 1
+            stats.errors += failed
+            stats.latencies.append(elapsed)
+            self.upstream_by_tool.setdefault(tool, Counter())[method] += 1
+
+    def set_profiling(self, cpu=None, allocations=None):
+        """Switches the CPU sampler and/or allocation tracing on or off. None leaves it as it is."""
+        if cpu is True:
+            self.profiler.start()
+        elif cpu is False:
+            self.profiler.stop()
+        if allocations is True and not tracemalloc.is_tracing():
+            tracemalloc.start(STACK_DEPTH)
+        elif allocations is False and tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+    def allocation_report(self, top=20):
+        if not tracemalloc.is_tracing():
+            return {"running": False}
+        current, peak = tracemalloc.get_traced_memory()
+        snapshot = tracemalloc.take_snapshot().filter_traces([
+            tracemalloc.Filter(False, tracemalloc.__file__),
+        ])
+        return {
+            "running": True,
+            "current_bytes": current,
+            "peak_bytes": peak,
+            "top_lines": [
+                {"where": str(stat.traceback[0]), "bytes": stat.size, "blocks": stat.count}
+                for stat in snapshot.statistics("lineno")[:top]
+            ],
+        }
+
+    def report(self, top=20):
+        with self.lock:
+            report = {
+                "uptime_seconds": round(time.time() - self.started_at, 1),
+                "tools": {name: stats.report() for name, stats in sorted(self.tools.items())},
+                "instagram_calls": {name: stats.report() for name, stats in sorted(self.upstream.items())},
+                "instagram_calls_by_tool": {tool: dict(counts) for tool, counts in sorted(self.upstream_by_tool.items())},
+            }
+        if self.profiler.running or self.profiler.samples:
+            report["cpu_profile"] = self.profiler.report(top)
+        if tracemalloc.is_tracing():
+            report["allocations"] = self.allocation_report(top)
+        return report
+
+    def reset(self):
+        with self.lock:
+            self.tools.clear()
+            self.upstream.clear()
+            self.upstream_by_tool.clear()
+            self.started_at = time.time()
+
+
+class _InstrumentedClient:
+    """Forwards attribute access to the real client, timing method calls."""
+    def __init__(self, client, stats):
+        object.__setattr__(self, "_client", client)
+        object.__setattr__(self, "_stats", stats)
+
+    def __getattr__(self, name):
+        value = getattr(self._client, name)
+        if not callable(value) or name.startswith("_") or name.startswith(("private_request", "public_request")):
+            return value
+        return self._stats._timed(name, value)
+
+    def __setattr__(self, name, value):
+        setattr(self._client, name, value)
@@ -2,193 +2,383 @@
 """
 Setup Verification Script for DMotivator
 Helps users verify their installation and configuration before running the bot.
+
+All checks run concurrently, each with its own deadline, and report how long
+the services took to answer (API-Football round trip, OpenAI first token,
+MCP server cold start and handshake, Instagram session).
+Use --json for machine-readable output and --baseline to fail when a latency
+goes above a limit, e.g. in deployment tooling:
+
+    python3 setup_verification.py --json --baseline perf_baseline.json
+
+where perf_baseline.json maps metric names to maximum seconds:
+
+    {"football_api_rtt_seconds": 2.0, "openai_first_token_seconds": 3.0}
 """
 
+import argparse
+import contextlib
+import json
 import os
 import sys
+import threading
+import time
 from dotenv import load_dotenv
 
-def check_dependencies():
+# Seconds each check may take before it is reported as timed out
+CHECK_TIMEOUTS = {
+    "dependencies": 30,
+    "env": 5,
+    "openai": 30,
+    "football_api": 20,
+    "rivalries": 5,
+    "mcp_server": 180,   # Includes the Instagram login
+}
+
+
+class CheckReport:
+    """Collects the output and latency metrics of one check."""
+    def __init__(self, name):
+        self.name = name
+        self.lines = []
+        self.metrics = {}
+
+    def log(self, line=""):
+        self.lines.append(line)
+
+    def metric(self, name, seconds):
+        self.metrics[name] = round(seconds, 3)
+        self.log(f"  ⏱️  {name}: {seconds * 1000:.0f} ms")
+
+
+def check_dependencies(report):
     """Check if all required packages are installed."""
-    print("🔍 Checking dependencies...")
+    report.log("🔍 Checking dependencies...")
     required_packages = [
-        'requests', 'openai', 'instagrapi', 'fastmcp', 
-        'dotenv', 'pydantic'
+        'requests', 'openai', 'instagrapi', 'fastmcp',
+        'dotenv', 'pydantic', 'numpy', 'PIL'
     ]
-    
+
     missing_packages = []
     for package in required_packages:
         try:
             __import__(package.replace('-', '_'))
-            print(f"  ✅ {package}")
+            report.log(f"  ✅ {package}")
         except ImportError:
-            print(f"  ❌ {package} - MISSING")
+            report.log(f"  ❌ {package} - MISSING")
             missing_packages.append(package)
-    
+
     if missing_packages:
-        print(f"\n❌ Missing packages: {', '.join(missing_packages)}")
-        print("Run: pip3 install -r requirements.txt")
+        report.log(f"\n❌ Missing packages: {', '.join(missing_packages)}")
+        report.log("Run: pip3 install -r requirements.txt")
         return False
-    
-    print("✅ All dependencies installed!")
+
+    report.log("✅ All dependencies installed!")
     return True
 
-def check_env_file():
+def check_env_file(report):
     """Check if .env file exists and has required variables."""
-    print("\n🔍 Checking .env configuration...")
-    
+    report.log("🔍 Checking .env configuration...")
+
     if not os.path.exists('.env'):
-        print("❌ .env file not found!")
-        print("Create a .env file with:")
-        print("OPENAI_API_KEY=your-openai-key")
-        print("FOOTBALL_API_KEY=your-football-api-key")
-        print("INSTAGRAM_USERNAME=your-instagram-username")
-        print("INSTAGRAM_PASSWORD=your-instagram-password")
+        report.log("❌ .env file not found!")
+        report.log("Create a .env file with:")
+        report.log("OPENAI_API_KEY=your-openai-key")
+        report.log("FOOTBALL_API_KEY=your-football-api-key")
+        report.log("INSTAGRAM_USERNAME=your-instagram-username")
+        report.log("INSTAGRAM_PASSWORD=your-instagram-password")
         return False
-    
-    load_dotenv()
-    
+
     required_vars = [
         'OPENAI_API_KEY',
-        'FOOTBALL_API_KEY', 
+        'FOOTBALL_API_KEY',
         'INSTAGRAM_USERNAME',
         'INSTAGRAM_PASSWORD'
     ]
-    
+
     missing_vars = []
     for var in required_vars:
         value = os.getenv(var)
         if not value or value == 'your-openai-api-key-here':
-            print(f"  ❌ {var} - MISSING or placeholder")
+            report.log(f"  ❌ {var} - MISSING or placeholder")
             missing_vars.append(var)
         else:
-            print(f"  ✅ {var} - Set")
-    
+            report.log(f"  ✅ {var} - Set")
+
     if missing_vars:
-        print(f"\n❌ Missing environment variables: {', '.join(missing_vars)}")
+        report.log(f"\n❌ Missing environment variables: {', '.join(missing_vars)}")
         return False
-    
-    print("✅ Environment configuration complete!")
+
+    report.log("✅ Environment configuration complete!")
     return True
 
-def test_openai_connection():
-    """Test OpenAI API connection."""
-    print("\n🔍 Testing OpenAI connection...")
-    
+def test_openai_connection(report):
+    """Test OpenAI API connection and measure time to the first token."""
+    report.log("🔍 Testing OpenAI connection...")
+
     try:
         from openai import OpenAI
-        load_dotenv()
-        
+
         api_key = os.getenv('OPENAI_API_KEY')
         if not api_key:
-            print("❌ OpenAI API key not found in .env")
+            report.log("❌ OpenAI API key not found in .env")
             return False
-        
-        client = OpenAI(api_key=api_key)
-        
-        # Simple test request
-        response = client.chat.completions.create(
+
+        client = OpenAI(api_key=api_key, timeout=CHECK_TIMEOUTS["openai"], max_retries=0)
+
+        # Simple streamed test request, so the first token can be timed
+        started = time.perf_counter()
+        stream = client.chat.completions.create(
             model="gpt-3.5-turbo",
             messages=[{"role": "user", "content": "Say 'OpenAI connection test successful!'"}],
-            max_tokens=10
+            max_tokens=10,
+            stream=True
         )
-        
-        if response.choices[0].message.content:
-            print("✅ OpenAI connection successful!")
+        content = ""
+        for chunk in stream:
+            delta = chunk.choices[0].delta.content if chunk.choices else None
+            if delta:
+                if not content:
+                    report.metric("openai_first_token_seconds", time.perf_counter() - started)
+                content += delta
+        report.metric("openai_total_seconds", time.perf_counter() - started)
+
+        if content:
+            report.log("✅ OpenAI connection successful!")
             return True
         else:
-            print("❌ OpenAI returned empty response")
+            report.log("❌ OpenAI returned empty response")
             return False
-            
+
     except Exception as e:
-        print(f"❌ OpenAI connection failed: {e}")
+        report.log(f"❌ OpenAI connection failed: {e}")
         return False
 
-def test_football_api():
-    """Test Football API connection."""
-    print("\n🔍 Testing Football API connection...")
-    
+def test_football_api(report):
+    """Test Football API connection and measure the round-trip time."""
+    report.log("🔍 Testing Football API connection...")
+
     try:
         import requests
-        load_dotenv()
-        
+
         api_key = os.getenv('FOOTBALL_API_KEY')
         if not api_key:
-            print("❌ Football API key not found in .env")
+            report.log("❌ Football API key not found in .env")
             return False
-        
+
         headers = {
             'x-rapidapi-host': 'v3.football.api-sports.io',
             'x-rapidapi-key': api_key
         }
-        
+
         # Test with a simple request
+        started = time.perf_counter()
         response = requests.get(
             "https://v3.football.api-sports.io/players",
             headers=headers,
             params={"id": "154", "season": "2024"},
             timeout=10
         )
-        
+        report.metric("football_api_rtt_seconds", time.perf_counter() - started)
+        remaining = response.headers.get("x-ratelimit-requests-remaining")
+        if remaining is not None:
+            report.log(f"  📊 Daily requests remaining: {remaining}/{response.headers.get('x-ratelimit-requests-limit')}")
+
         if response.status_code == 200:
             data = response.json()
             if data.get('response'):
-                print("✅ Football API connection successful!")
+                report.log("✅ Football API connection successful!")
                 return True
             else:
-                print("❌ Football API returned no data")
+                report.log("❌ Football API returned no data")
                 return False
         else:
-            print(f"❌ Football API error: {response.status_code}")
+            report.log(f"❌ Football API error: {response.status_code}")
             return False
-            
+
     except Exception as e:
-        print(f"❌ Football API connection failed: {e}")
+        report.log(f"❌ Football API connection failed: {e}")
         return False
 
-def test_rivalry_config():
+def test_rivalry_config(report):
     """Test rivalry configuration."""
-    print("\n🔍 Testing rivalry configuration...")
-    
+    report.log("🔍 Testing rivalry configuration...")
+
     try:
         from rivals import RIVALRIES, get_fan_to_notify, get_supported_entity
-        
+
         if not RIVALRIES:
-            print("❌ No rivalries configured")
+            report.log("❌ No rivalries configured")
             return False
-        
-        print(f"✅ Found {len(RIVALRIES)} rivalries:")
+
+        report.log(f"✅ Found {len(RIVALRIES)} rivalries:")
         for rivalry in RIVALRIES:
             name = rivalry.get('name', 'Unknown')
             target = rivalry.get('target_username', 'Unknown')
             entity_type = rivalry.get('type', 'Unknown')
-            print(f"  - {name} ({entity_type}) → @{target}")
-        
+            report.log(f"  - {name} ({entity_type}) → @{target}")
+
         return True
-        
+
+    except Exception as e:
+        report.log(f"❌ Rivalry configuration error: {e}")
+        return False
+
+def test_mcp_server(report):
+    """Start the MCP server and time its cold start, handshake and Instagram session."""
+    report.log("🔍 Testing MCP server and Instagram session...")
+
+    try:
+        from dm_sender import MCPClient, build_server_command, tool_payload
+
+        client = MCPClient(build_server_command())
+        started = time.perf_counter()
+        if not client.start_server():
+            report.log("❌ MCP server could not be started")
+            return False
+        try:
+            # The server only answers after it has logged in to Instagram
+            if not client.initialize_mcp():
+                report.log("❌ MCP initialize handshake failed")
+                return False
+            report.metric("mcp_cold_start_seconds", time.perf_counter() - started)
+
+            ping_started = time.perf_counter()
+            if not client.ping():
+                report.log("❌ MCP server did not answer a ping")
+                return False
+            report.metric("mcp_ping_seconds", time.perf_counter() - ping_started)
+
+            # A cheap authenticated call proves the Instagram session is valid
+            session_started = time.perf_counter()
+            username = os.getenv("INSTAGRAM_USERNAME", "")
+            result = client.call_tool("get_user_id_from_username", {"username": username})
+            payload = tool_payload(result) or {}
+            report.metric("instagram_session_seconds", time.perf_counter() - session_started)
+            if not payload.get("success"):
+                report.log(f"❌ Instagram session invalid: {payload.get('message') or result.get('message')}")
+                return False
+        finally:
+            client.stop_server()
+
+        report.log("✅ MCP server and Instagram session OK!")
+        return True
+
     except Exception as e:
-        print(f"❌ Rivalry configuration error: {e}")
+        report.log(f"❌ MCP server check failed: {e}")
         return False
 
+CHECKS = [
+    ("dependencies", check_dependencies),
+    ("env", check_env_file),
+    ("openai", test_openai_connection),
+    ("football_api", test_football_api),
+    ("rivalries", test_rivalry_config),
+    ("mcp_server", test_mcp_server),
+]
+
+def run_checks(names):
+    """
+    Runs the named checks concurrently, each in a daemon thread with its own deadline.
+    A hung check is reported as timed out and does not block the others.
+    """
+    results = {}
+
+    def run(name, check, report):
+        started = time.perf_counter()
+        try:
+            ok = check(report)
+            status = "pass" if ok else "fail"
+        except Exception as e:
+            report.log(f"❌ {name} check crashed: {e}")
+            status = "error"
+        results[name] = (status, time.perf_counter() - started)
+
+    started = time.perf_counter()
+    running = []
+    for name, check in CHECKS:
+        if name not in names:
+            continue
+        report = CheckReport(name)
+        thread = threading.Thread(target=run, args=(name, check, report), daemon=True)
+        thread.start()
+        running.append((name, thread, report))
+
+    outcomes = []
+    for name, thread, report in running:
+        deadline = started + CHECK_TIMEOUTS[name]
+        thread.join(max(0, deadline - time.perf_counter()))
+        if name in results:
+            status, seconds = results[name]
+        else:
+            status, seconds = "timeout", CHECK_TIMEOUTS[name]
+            report.log(f"❌ {name} check timed out after {CHECK_TIMEOUTS[name]}s")
+        outcomes.append({
+            "name": name,
+            "status": status,
+            "seconds": round(seconds, 3),
+            "metrics": report.metrics,
+            "log": report.lines,
+        })
+    return outcomes
+
+def check_baseline(outcomes, baseline):
+    """Returns a list of metrics that exceed their baseline limit."""
+    violations = []
+    for outcome in outcomes:
+        for metric, value in outcome["metrics"].items():
+            limit = baseline.get(metric)
+            if limit is not None and value > limit:
+                violations.append({"metric": metric, "value": value, "limit": limit})
+    return violations
+
 def main():
     """Run all verification checks."""
-    print("🏆 DMotivator Setup Verification")
-    print("=" * 50)
-    
-    checks = [
-        check_dependencies,
-        check_env_file,
-        test_openai_connection,
-        test_football_api,
-        test_rivalry_config
-    ]
-    
-    all_passed = True
-    for check in checks:
-        if not check():
-            all_passed = False
-    
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--json", action="store_true", help="Print machine-readable results.")
+    parser.add_argument("--baseline", help="JSON file mapping metric names to maximum seconds.")
+    parser.add_argument("--skip", action="append", default=[], choices=[name for name, _ in CHECKS],
+                        help="Skip a check (repeatable), e.g. --skip mcp_server to avoid an Instagram login.")
+    args = parser.parse_args()
+
+    load_dotenv()
+    names = [name for name, _ in CHECKS if name not in args.skip]
+
+    if not args.json:
+        print("🏆 DMotivator Setup Verification")
+        print("=" * 50)
+
+    started = time.perf_counter()
+    # Keep stdout clean for the JSON document; progress output goes to stderr
+    with contextlib.redirect_stdout(sys.stderr) if args.json else contextlib.nullcontext():
+        outcomes = run_checks(names)
+    total_seconds = time.perf_counter() - started
+
+    violations = []
+    if args.baseline:
+        with open(args.baseline, "r") as f:
+            violations = check_baseline(outcomes, json.load(f))
+
+    all_passed = all(o["status"] == "pass" for o in outcomes) and not violations
+
+    if args.json:
+        print(json.dumps({
+            "passed": all_passed,
+            "total_seconds": round(total_seconds, 3),
+            "checks": outcomes,
+            "baseline_violations": violations,
+        }, indent=2))
+        sys.exit(0 if all_passed else 1)
+
+    for outcome in outcomes:
+        print()
+        for line in outcome["log"]:
+            print(line)
+    for violation in violations:
+        print(f"\n❌ {violation['metric']} = {violation['value']}s exceeds baseline {violation['limit']}s")
+
     print("\n" + "=" * 50)
+    print(f"⏱️  All checks finished in {total_seconds:.1f}s")
     if all_passed:
         print("🎉 All checks passed! Your DMotivator is ready to run!")
         print("\nNext steps:")
@@ -200,4 +390,4 @@ def main():
         sys.exit(1)
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    main()
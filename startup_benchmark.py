@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""
+Startup Benchmark
+Measures what every entry point costs before it can do any work, and fails
+when that goes above the budget, so a heavy import that creeps back into a
+start-up path is caught as a regression:
+
+    python3 startup_benchmark.py                   # check against startup_budget.json
+    python3 startup_benchmark.py --breakdown 10    # also list the slowest imports
+    python3 startup_benchmark.py --write-budget    # store the current times, with headroom
+
+- import_<module>_seconds is the module's cumulative import time from
+  `python -X importtime`, measured in a fresh interpreter RUNS times, keeping
+  the fastest run (the others mostly measure a busy machine).
+- mcp_server_ready_seconds is the time from spawning `mcp_server.py
+  --fake-backend` until it answers MCP initialize: what dm_sender waits for
+  before its first DM.
+The budget file maps metric names to maximum seconds, like the
+setup_verification.py baseline.
+"""
+
+import argparse
+import contextlib
+import json
+import math
+import os
+import subprocess
+import sys
+import time
+
+BUDGET_FILE = os.getenv("STARTUP_BUDGET_FILE", "startup_budget.json")
+ENTRY_POINTS = ["goal_scraper", "mcp_server", "dm_sender", "demo_simulator", "fanout", "banter", "setup_verification"]
+RUNS = 5
+BUDGET_HEADROOM = 1.5   # --write-budget allows this factor over the measured time...
+BUDGET_MIN_SLACK = 0.05 # ...and at least this many seconds: import times jitter by 10ms+ between runs
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def import_profile(module):
+    """
+    Imports module in a fresh interpreter with -X importtime.
+    Returns (cumulative seconds, {imported module: self seconds}).
+    """
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                            cwd=HERE, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{result.stderr.strip()[-2000:]}")
+    total = None
+    self_times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        fields = line[len("import time:"):].split("|")
+        try:
+            self_us, cumulative_us = int(fields[0]), int(fields[1])
+        except ValueError:
+            continue   # The header line
+        name = fields[2].strip()
+        self_times[name] = self_us / 1e6
+        if fields[2].rstrip() == f" {module}":   # Top level, not a nested import of the same name
+            total = cumulative_us / 1e6
+    if total is None:
+        raise RuntimeError(f"No import time reported for {module}")
+    return total, self_times
+
+
+def mcp_server_ready():
+    """Seconds from spawning the MCP server (fake backend) to its initialize response."""
+    from dm_sender import MCPClient
+
+    command = [sys.executable, os.path.join(HERE, "mcp_server.py"), "--username", "benchmark",
+               "--password", "benchmark", "--fake-backend"]
+    client = MCPClient(command)
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        started = time.perf_counter()
+        ok = client.start_server() and client.initialize_mcp()
+        elapsed = time.perf_counter() - started
+        client.stop_server()
+    if not ok:
+        raise RuntimeError("MCP server did not answer initialize")
+    return elapsed
+
+
+def measure(runs=RUNS, breakdown=0):
+    """Returns {metric: seconds}, the fastest of runs for each."""
+    metrics = {}
+    for module in ENTRY_POINTS:
+        best, best_self_times = math.inf, {}
+        for _ in range(runs):
+            total, self_times = import_profile(module)
+            if total < best:
+                best, best_self_times = total, self_times
+        metrics[f"import_{module}_seconds"] = round(best, 4)
+        print(f"  - import {module}: {best * 1000:.1f}ms")
+        if breakdown:
+            slowest = sorted(best_self_times.items(), key=lambda item: item[1], reverse=True)[:breakdown]
+            for name, seconds in slowest:
+                print(f"      {seconds * 1000:7.1f}ms  {name}")
+
+    os.chdir(HERE)   # mcp_server.py and its session/state files are resolved from here
+    metrics["mcp_server_ready_seconds"] = round(min(mcp_server_ready() for _ in range(max(1, runs // 2))), 4)
+    print(f"  - mcp_server ready: {metrics['mcp_server_ready_seconds'] * 1000:.1f}ms")
+    return metrics
+
+
+def check_budget(metrics, budget):
+    """Returns the metrics that went over budget, as messages."""
+    failures = []
+    for name, limit in budget.items():
+        value = metrics.get(name)
+        if value is None:
+            failures.append(f"{name}: not measured")
+        elif value > limit:
+            failures.append(f"{name}: {value:.3f}s > {limit:.3f}s")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure entry point start-up cost against a budget.")
+    parser.add_argument("--budget", default=os.path.join(HERE, BUDGET_FILE), help="Budget JSON file.")
+    parser.add_argument("--runs", type=int, default=RUNS, help="Fresh interpreters per measurement.")
+    parser.add_argument("--breakdown", type=int, default=0, metavar="N",
+                        help="Show the N slowest imports (self time) of each entry point.")
+    parser.add_argument("--write-budget", action="store_true",
+                        help=f"Write the measured times x{BUDGET_HEADROOM} as the new budget.")
+    parser.add_argument("--json", action="store_true", help="Print the metrics as JSON.")
+    args = parser.parse_args()
+
+    print("⏱️  Measuring start-up cost...")
+    metrics = measure(args.runs, args.breakdown)
+    if args.json:
+        print(json.dumps(metrics, indent=2))
+
+    if args.write_budget:
+        budget = {name: round(max(value * BUDGET_HEADROOM, value + BUDGET_MIN_SLACK), 3)
+                  for name, value in metrics.items()}
+        with open(args.budget, "w") as f:
+            json.dump(budget, f, indent=2)
+            f.write("\n")
+        print(f"✅ Budget written to {args.budget}")
+        return 0
+
+    if not os.path.exists(args.budget):
+        print(f"❌ No budget file at {args.budget}. Create one with --write-budget.")
+        return 1
+    with open(args.budget, "r") as f:
+        budget = json.load(f)
+    failures = check_budget(metrics, budget)
+    if failures:
+        print("❌ Start-up budget exceeded:")
+        for failure in failures:
+            print(f"  - {failure}")
+        return 1
+    print("✅ Start-up within budget")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())